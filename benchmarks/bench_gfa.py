@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+This script compares Minipolish's old line-by-line GFA loader with load_gfa (eager and with lazy
+sequences) on a synthetic miniasm-style graph. Run it from Minipolish's root directory like this:
+`python3 benchmarks/bench_gfa.py [segment_count]`
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import contextlib
+import io
+import pathlib
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from minipolish.assembly_graph import AssemblyGraph, Segment, Link, load_gfa, \
+    parse_a_line  # noqa: E402
+
+
+def make_gfa(filename, segment_count):
+    """
+    Each segment is 50 kbp and made from 100 reads ('a' lines), roughly like a miniasm graph.
+    """
+    random.seed(0)
+    seq = ''.join(random.choice('ACGT') for _ in range(50000))
+    with open(filename, 'wt') as gfa:
+        for i in range(segment_count):
+            name = f'utg{i:06d}l'
+            gfa.write(f'S\t{name}\t{seq}\tLN:i:{len(seq)}\trc:i:100\n')
+            for j in range(100):
+                read_name = f'{random.getrandbits(128):032x}'
+                gfa.write(f'a\t{name}\t{j * 500}\t{read_name}:1-10000\t+\t500\n')
+        for i in range(segment_count - 1):
+            gfa.write(f'L\tutg{i:06d}l\t+\tutg{i + 1:06d}l\t-\t1000M\tSD:i:100\n')
+
+
+def old_load_gfa(filename):
+    graph = AssemblyGraph()
+    segment_reads = collections.defaultdict(list)
+    with open(filename, 'rt') as gfa:
+        for line in gfa:
+            if line.startswith('S\t'):
+                segment = Segment(line)
+                graph.segments[segment.name] = segment
+            if line.startswith('a\t'):
+                segment_name, read_name = parse_a_line(line)
+                segment_reads[segment_name].append(read_name)
+            if line.startswith('L\t'):
+                graph.add_link(Link(line))
+    graph.build_reverse_links()
+    for segment_name, read_names in segment_reads.items():
+        graph.segments[segment_name].read_names = read_names
+    return graph
+
+
+def main():
+    segment_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = pathlib.Path(tmp_dir) / 'graph.gfa'
+        make_gfa(filename, segment_count)
+        for name, function in [('old loader', old_load_gfa),
+                               ('load_gfa', load_gfa),
+                               ('load_gfa (lazy)', lambda f: load_gfa(f, lazy_sequences=True))]:
+            elapsed = float('inf')
+            for _ in range(3):  # best of three
+                start = time.perf_counter()
+                with contextlib.redirect_stderr(io.StringIO()):
+                    function(filename)
+                elapsed = min(elapsed, time.perf_counter() - start)
+            tracemalloc.start()
+            with contextlib.redirect_stderr(io.StringIO()):
+                graph = function(filename)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            del graph
+            print(f'{name:16s} {elapsed:7.2f} s  {peak / 1048576:7.1f} MB peak')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+This script measures the throughput of each available gzip decompression backend when reading
+a gzipped FASTQ file line by line (as Minipolish does). Run it from Minipolish's root directory
+like this: `python3 benchmarks/bench_gzip.py [reads.fastq.gz]`
+
+If no file is given, a synthetic one is made.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gzip
+import pathlib
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from minipolish import decompress  # noqa: E402
+
+
+def make_fastq_gz(filename, read_count=20000):
+    random.seed(0)
+    with gzip.open(filename, 'wt', compresslevel=6) as f:
+        for i in range(read_count):
+            seq = ''.join(random.choices('ACGT', k=random.randint(1000, 20000)))
+            f.write(f'@read_{i}\n{seq}\n+\n{"I" * len(seq)}\n')
+
+
+def get_available_backends():
+    backends = ['gzip']
+    if decompress.isal_gzip is not None:
+        backends.append('isal')
+    for name, command in decompress.EXTERNAL_DECOMPRESSORS.items():
+        if shutil.which(command[0]) is not None:
+            backends.append(name)
+    return backends
+
+
+def time_backend(backend, filename):
+    decompress.set_gzip_backend(backend)
+    start = time.perf_counter()
+    byte_count = 0
+    with decompress.open_gzip(filename, 'rb') as f:
+        for line in f:
+            byte_count += len(line)
+    return byte_count, time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if len(sys.argv) > 1:
+            filename = sys.argv[1]
+        else:
+            filename = pathlib.Path(tmp_dir) / 'reads.fastq.gz'
+            make_fastq_gz(filename)
+        for backend in get_available_backends():
+            byte_count, elapsed = time_backend(backend, filename)
+            print(f'{backend:6s} {elapsed:7.2f} s  {byte_count / elapsed / 1e6:8.1f} MB/s')
+
+
+if __name__ == '__main__':
+    main()
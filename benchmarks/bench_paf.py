@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+This script compares the per-line cost of parsing PAF alignments with the Alignment class and
+with iterate_paf_batches (only parsing the columns needed for depth calculation). Run it from
+Minipolish's root directory like this: `python3 benchmarks/bench_paf.py [line_count]`
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pathlib
+import random
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from minipolish.alignment import Alignment, iterate_paf_batches  # noqa: E402
+
+
+def make_paf_lines(count):
+    random.seed(0)
+    lines = []
+    for i in range(count):
+        read_length = random.randint(1000, 50000)
+        ref_length = random.randint(100000, 5000000)
+        ref_start = random.randint(0, ref_length - read_length)
+        lines.append(f'read_{i}\t{read_length}\t0\t{read_length}\t+\tutg{i % 100:06d}l\t'
+                     f'{ref_length}\t{ref_start}\t{ref_start + read_length}\t{read_length - 500}\t'
+                     f'{read_length}\t60\ttp:A:P\tcm:i:{read_length // 20}\ts1:i:{read_length}\t'
+                     f'dv:f:0.0123\trl:i:0\n')
+    return lines
+
+
+def bench_alignment_class(lines):
+    depths = {}
+    for line in lines:
+        a = Alignment(line)
+        depths[a.ref_name] = depths.get(a.ref_name, 0.0) + a.get_ref_depth_contribution()
+    return depths
+
+
+def bench_paf_batches(lines):
+    depths = {}
+    columns = ['ref_name', 'ref_length', 'ref_start', 'ref_end']
+    for batch in iterate_paf_batches(lines, columns):
+        for ref_name, ref_length, ref_start, ref_end in zip(*(batch[c] for c in columns)):
+            depths[ref_name] = depths.get(ref_name, 0.0) + (ref_end - ref_start) / ref_length
+    return depths
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    lines = make_paf_lines(count)
+    for name, function in [('Alignment class', bench_alignment_class),
+                           ('iterate_paf_batches', bench_paf_batches)]:
+        elapsed = float('inf')
+        for _ in range(3):  # best of three
+            start = time.perf_counter()
+            function(lines)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        print(f'{name:20s} {elapsed:7.2f} s  {1e9 * elapsed / count:7.0f} ns/line')
+
+
+if __name__ == '__main__':
+    main()
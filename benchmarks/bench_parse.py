@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+This script compares the per-read cost of parsing a FASTQ file line by line (Minipolish's old
+approach), with the iterate_fastq wrapper and with the block-based iterate_sequence_batches (with
+and without record positions, which ReadIndex needs). Run it from Minipolish's root
+directory like this: `python3 benchmarks/bench_parse.py [read_count]`
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from minipolish.misc import iterate_fastq, iterate_sequence_batches  # noqa: E402
+
+
+def make_fastq(filename, count):
+    random.seed(0)
+    with open(filename, 'wt') as fastq:
+        for i in range(count):
+            length = random.randint(100, 1000)
+            seq = ''.join(random.choice('ACGT') for _ in range(100))
+            seq = (seq * (length // 100 + 1))[:length]
+            fastq.write(f'@read_{i} runid=abc ch=1\n{seq}\n+\n{"I" * length}\n')
+
+
+def bench_line_based(filename):
+    base_count = 0
+    with open(filename, 'rt') as fastq:
+        for line in fastq:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if not line.startswith('@'):
+                continue
+            _ = line[1:].split()[0]
+            sequence = next(fastq).strip()
+            _ = next(fastq)
+            _ = next(fastq).strip()
+            base_count += len(sequence)
+    return base_count
+
+
+def bench_str_wrapper(filename):
+    return sum(len(seq) for _, seq, _ in iterate_fastq(filename))
+
+
+def bench_batches(filename):
+    return sum(sum(map(len, batch['sequence']))
+               for batch in iterate_sequence_batches(filename, 'FASTQ'))
+
+
+def bench_batches_with_positions(filename):
+    return sum(len(batch['start'])
+               for batch in iterate_sequence_batches(filename, 'FASTQ', positions=True))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = pathlib.Path(tmp_dir) / 'reads.fastq'
+        make_fastq(filename, count)
+        for name, function in [('line-based', bench_line_based),
+                               ('iterate_fastq', bench_str_wrapper),
+                               ('batches', bench_batches),
+                               ('with positions', bench_batches_with_positions)]:
+            elapsed = float('inf')
+            for _ in range(3):  # best of three
+                start = time.perf_counter()
+                function(filename)
+                elapsed = min(elapsed, time.perf_counter() - start)
+            print(f'{name:15s} {elapsed:7.2f} s  {1e9 * elapsed / count:7.0f} ns/read')
+
+
+if __name__ == '__main__':
+    main()
@@ -14,20 +14,30 @@ If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
 import collections
+import contextlib
 import pathlib
 import random
-import subprocess
 import sys
 import tempfile
 
-from .alignment import Alignment
+from .alignment import iterate_minimap2_output, iterate_paf_batches
 from .assembly_graph import load_gfa
+from .checkpoint import Checkpoint, get_fingerprint
+from .coverage import CoverageCounter, DEFAULT_BIN_SIZE, DEFAULT_LOW_COVERAGE
+from . import metrics
+from .index_cache import IndexCache
 from .help_formatter import MyParser, MyHelpFormatter
 from .log import log, warning, section_header, explanation
-from .misc import iterate_fastq, iterate_fasta, get_default_thread_count, count_reads, count_fasta_bases, \
-    weighted_average, racon_path_and_version, minimap2_path_and_version, get_sequence_file_type
-from .racon import run_racon
+from .misc import get_default_thread_count, weighted_average, \
+    racon_path_and_version, minimap2_path_and_version
+from .racon import run_racon, get_converged_sequences
+from .read_index import load_read_index
+from .read_splitter import ReadSplitter, CombinedReadWriter
+from .scheduler import allocate_threads, run_with_thread_budget
+from .scratch import choose_scratch_dir
+from .subsample import ReadSubsampler, save_read_subset
 from .version import __version__
+from .windowed_racon import run_windowed_racon, MIN_WINDOW_SIZE
 
 
 def get_arguments(args):
@@ -42,22 +52,43 @@ def get_arguments(args):
     setting_args = parser.add_argument_group('Settings')
     setting_args.add_argument('-t', '--threads', type=int, default=get_default_thread_count(),
                               help='Number of threads to use for alignment and polishing')
-    setting_args.add_argument('--rounds', type=int, default=2,
-                              help='Number of full Racon polishing rounds')
-    minimap_settings = setting_args.add_mutually_exclusive_group()
-    minimap_settings.add_argument('--minimap2-preset', type=str, default='map-ont',
-                                  choices=['map-ont', 'lr:hq', 'map-pb', 'map-hifi'],
-                                  help='minimap2 preset to use: '
-                                       '"map-ont" for Oxford Nanopore reads with <Q20 accuracy, '
-                                       '"lr:hq" for Oxford Nanopore reads with Q20+ accuracy, '
-                                       '"map-pb" for PacBio CLR or "map-hifi" for PacBio HiFi/CCS')
-    minimap_settings.add_argument('--pacbio', action='store_true',
-                                  help='Deprecated: equivalent to --minimap2-preset map-pb. '
-                                       'Retained for backwards compatibility.')
-    setting_args.add_argument('--skip_initial', action='store_true',
-                              help='Skip the initial polishing round - appropriate if the input '
-                                   'GFA does not have "a" lines (default: do the initial '
-                                   'polishing round)')
+    add_polishing_settings(setting_args)
+    setting_args.add_argument('--skip_tool_check', action='store_true',
+                              help='Don\'t run minimap2 and Racon to check them if they were '
+                                   'checked by a previous run and haven\'t changed since (default: '
+                                   'check the tools at the start of every run)')
+
+    output_args = parser.add_argument_group('Output')
+    output_args.add_argument('-o', '--output', type=str,
+                             help='Save the polished graph to this GFA file, gzipped if the '
+                                  'filename ends in .gz (default: print the graph to stdout)')
+    output_args.add_argument('--depth_paf', type=str,
+                             help='Save the read alignments used to calculate depth to this PAF '
+                                  'file (default: alignments are not saved)')
+    output_args.add_argument('--coverage', type=str,
+                             help='Also measure read depth along each contig (in bins) from the '
+                                  'depth alignments, and save it along with a depth histogram and '
+                                  'low-coverage regions to TSV files starting with this prefix '
+                                  '(default: only calculate mean depth)')
+    output_args.add_argument('--coverage_bin_size', type=int, default=DEFAULT_BIN_SIZE,
+                             help='Bin size (bp) for --coverage, 1 for per-base depth')
+    output_args.add_argument('--low_coverage', type=float, default=DEFAULT_LOW_COVERAGE,
+                             help='With --coverage, report regions with less than this fraction '
+                                  'of their contig\'s mean depth')
+
+    output_args.add_argument('--work_dir', type=str,
+                             help='Keep intermediate files and checkpoints in this directory, so '
+                                  'an interrupted run can be resumed (default: use a temporary '
+                                  'directory which is deleted at the end of the run)')
+    output_args.add_argument('--resume', action='store_true',
+                             help='Resume an interrupted run from the last checkpoint in '
+                                  '--work_dir (default: start from the beginning)')
+    add_tmp_dir_option(output_args)
+
+    output_args.add_argument('--metrics', type=str,
+                             help='Save timing, CPU and memory usage for each stage and each '
+                                  'minimap2/Racon run to this file (JSON format, or TSV if the '
+                                  'filename ends in .tsv)')
 
     other_args = parser.add_argument_group('Other')
     other_args.add_argument('-h', '--help', action='help', default=argparse.SUPPRESS,
@@ -71,45 +102,208 @@ def get_arguments(args):
     return args
 
 
+def add_polishing_settings(group):
+    """
+    Adds the settings which control how each assembly is polished (shared with batch mode).
+    """
+    group.add_argument('--rounds', type=int, default=2,
+                       help='Number of full Racon polishing rounds')
+    group.add_argument('--convergence', type=float,
+                       help='Leave a contig out of later full rounds once a round changes less '
+                            'than this fraction of its bases, and stop early when all contigs '
+                            'have converged, e.g. 0.0001 (default: always do all rounds on all '
+                            'contigs)')
+    minimap_settings = group.add_mutually_exclusive_group()
+    minimap_settings.add_argument('--minimap2-preset', type=str, default='map-ont',
+                                  choices=['map-ont', 'lr:hq', 'map-pb', 'map-hifi'],
+                                  help='minimap2 preset to use: '
+                                       '"map-ont" for Oxford Nanopore reads with <Q20 accuracy, '
+                                       '"lr:hq" for Oxford Nanopore reads with Q20+ accuracy, '
+                                       '"map-pb" for PacBio CLR or "map-hifi" for PacBio HiFi/CCS')
+    minimap_settings.add_argument('--pacbio', action='store_true',
+                                  help='Deprecated: equivalent to --minimap2-preset map-pb. '
+                                       'Retained for backwards compatibility.')
+    group.add_argument('--max_depth', type=float,
+                       help='Use all reads for the first full round, but only enough reads to '
+                            'give each contig this depth (longest alignments first) in later '
+                            'rounds - saves time with very deep read sets (default: use all '
+                            'reads in every round)')
+    group.add_argument('--window_size', type=int,
+                       help='In full rounds, polish contigs longer than this in overlapping '
+                            'windows of this size (bp), each with its own Racon job - bounds '
+                            'Racon\'s memory use and lets even one long contig use all threads '
+                            '(default: polish each contig whole)')
+    group.add_argument('--skip_initial', action='store_true',
+                       help='Skip the initial polishing round - appropriate if the input '
+                            'GFA does not have "a" lines (default: do the initial '
+                            'polishing round)')
+    group.add_argument('--batch_initial', action='store_true',
+                       help='Do the initial polishing round with a single minimap2 and '
+                            'Racon run for all segments - faster for graphs with many '
+                            'small segments (default: run minimap2 and Racon separately '
+                            'for each segment)')
+    group.add_argument('--stream_alignments', action='store_true',
+                       help='Pass alignments from minimap2 to Racon through a pipe instead '
+                            'of a temporary PAF file - saves disk space and I/O (default: '
+                            'save alignments to a temporary PAF file)')
+    group.add_argument('--lazy_load', action='store_true',
+                       help='Leave the assembly\'s sequences on disk until they are needed '
+                            '- lowers peak memory for large uncompressed GFAs (default: '
+                            'load all sequences at the start)')
+
+
+def add_tmp_dir_option(group):
+    group.add_argument('--tmp_dir', type=str,
+                       help='Put temporary files in this directory (default: /dev/shm if it has '
+                            'room, otherwise the system\'s temporary directory - if a run is '
+                            'killed, its files in /dev/shm use memory until deleted by hand)')
+
+
 def main(args=None):
     args = get_arguments(args)
-    check_for_required_tools()
-    random.seed(0)
-    graph = load_gfa(args.assembly)
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        tmp_dir = pathlib.Path(tmp_dir)
-        if not args.skip_initial:
-            initial_polish(graph, args.reads, args.threads, tmp_dir, args.minimap2_preset)
+    try:
+        run_minipolish(args)
+    finally:
+        if args.metrics is not None:
+            metrics.save_metrics(args.metrics)
+
+
+def run_minipolish(args, check_tools=True):
+    """
+    Polishes one assembly. Batch mode calls this once per assembly, having already checked for
+    the required tools.
+    """
+    if check_tools:
+        with metrics.stage('check_tools'):
+            check_for_required_tools(args.skip_tool_check)
+    scratch_dir = None if args.work_dir is not None else \
+        choose_scratch_dir(args.tmp_dir, args.reads, args.assembly, args.rounds, args.window_size)
+    with get_work_dir(args.work_dir, scratch_dir) as work_dir:
+        checkpoint = Checkpoint(None if args.work_dir is None else work_dir, get_fingerprint(args))
+        if args.resume:
+            with metrics.stage('resume'):
+                checkpoint.load()
+            graph, read_index = checkpoint.graph, checkpoint.read_index
+        else:
+            with metrics.stage('load_graph'):
+                graph = load_gfa(args.assembly, args.lazy_load)
+            with metrics.stage('index_reads'):
+                read_index = load_read_index(args.reads)
+        if not args.skip_initial and not checkpoint.is_done('initial'):
+            with metrics.stage('initial'):
+                if args.batch_initial:
+                    batched_initial_polish(graph, read_index, args.threads, work_dir,
+                                           args.minimap2_preset, args.stream_alignments)
+                else:
+                    initial_polish(graph, read_index, args.threads, work_dir,
+                                   args.minimap2_preset, args.stream_alignments)
+                checkpoint.save('initial', graph, read_index)
+        # A minimap2 index can only be reused when a resumed run aligns to the same sequences
+        # again, so indexes are only kept in a work directory. Otherwise minimap2 gets the FASTA.
+        index_cache = None if args.work_dir is None else IndexCache(work_dir / 'minimap2_indexes')
         if args.rounds > 0:
-            full_polish(graph, args.reads, args.threads, args.rounds, tmp_dir, args.minimap2_preset)
-        assign_depths(graph, args.reads, args.threads, tmp_dir, args.minimap2_preset)
-    graph.print_to_stdout()
+            full_polish(graph, read_index, args.threads, args.rounds, work_dir,
+                        args.minimap2_preset, args.stream_alignments, checkpoint, index_cache,
+                        args.convergence, args.window_size, args.max_depth)
+        if not checkpoint.is_done('depths'):
+            with metrics.stage('depths'):
+                assign_depths(graph, read_index, args.threads, work_dir, args.minimap2_preset,
+                              args.depth_paf, index_cache, args.coverage,
+                              args.coverage_bin_size, args.low_coverage)
+                checkpoint.save('depths', graph, read_index)
+    with metrics.stage('output'):
+        if args.output is None:
+            graph.print_to_stdout()
+        else:
+            graph.save_to_gfa(args.output, args.threads)
+
+
+@contextlib.contextmanager
+def get_work_dir(work_dir, scratch_dir=None):
+    """
+    Yields the user's work directory (which is kept) if they gave one, otherwise a temporary
+    directory (which is deleted afterward) in the scratch directory.
+    """
+    if work_dir is not None:
+        work_dir = pathlib.Path(work_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        yield work_dir
+    else:
+        with tempfile.TemporaryDirectory(dir=scratch_dir) as tmp_dir:
+            log(f'Temporary files: {tmp_dir}')
+            yield pathlib.Path(tmp_dir)
 
 
-def initial_polish(graph, read_filename, threads, tmp_dir, minimap2_preset):
+def initial_polish(graph, read_index, threads, tmp_dir, minimap2_preset,
+                   stream_alignments=False):
     section_header('Initial polishing round')
     explanation('The first round of polishing is done on a per-segment basis and only uses reads '
                 'which are definitely associated with the segment (because the GFA indicated that '
                 'they were used to make the segment).')
-    extension, read_count = save_per_segment_reads(graph, read_filename, tmp_dir)
+    extension, seg_read_counts = save_per_segment_reads(graph, read_index, tmp_dir)
+    if sum(seg_read_counts.values()) == 0:
+        warning('No matching per-segment reads ("a" lines) were found in the GFA. Skipping '
+                'initial polishing round. Use --skip_initial to suppress this warning.')
+        log()
+        return
+    # Segments are polished in parallel, with the thread budget shared out by segment size and
+    # read count.
+    segments = []
+    for segment in graph.segments.values():
+        if (tmp_dir / (segment.name + extension)).is_file():
+            segments.append(segment)
+        else:
+            warning(f'No per-segment reads found for {segment.name}. Keeping original sequence.')
+    costs = [s.get_length() * seg_read_counts[s.name] for s in segments]
+    jobs = [(t, polish_one_segment, (s, seg_read_counts[s.name], extension, tmp_dir,
+                                     minimap2_preset, stream_alignments))
+            for s, t in zip(segments, allocate_threads(costs, threads))]
+    fixed_seqs = dict(zip((s.name for s in segments),
+                          run_with_thread_budget(jobs, threads, costs)))
+
+    for segment in [s for s in graph.segments.values() if s.name in fixed_seqs]:
+        fixed_seq = fixed_seqs[segment.name]
+        if len(fixed_seq) > 0:
+            segment.sequence = fixed_seq
+        else:
+            graph.remove_segment(segment.name)
+    if graph.get_total_length() == 0:
+        sys.exit('Error: all segments were removed during initial polishing')
+    log()
+
+
+def batched_initial_polish(graph, read_index, threads, tmp_dir, minimap2_preset,
+                           stream_alignments=False):
+    section_header('Initial polishing round')
+    explanation('The first round of polishing only uses reads which are definitely associated '
+                'with each segment (because the GFA indicated that they were used to make the '
+                'segment). All segments are polished together in one Racon run, using only '
+                'alignments of reads to their own segments. minimap2 reports all secondary '
+                'alignments, so a read\'s own segment is used even if the read aligns better to '
+                'another segment.')
+    read_to_segments = get_read_to_segments(graph)
+    read_filename, read_count, seg_read_counts = save_initial_reads(read_to_segments, read_index,
+                                                                    tmp_dir)
     if read_count == 0:
         warning('No matching per-segment reads ("a" lines) were found in the GFA. Skipping '
                 'initial polishing round. Use --skip_initial to suppress this warning.')
         log()
         return
-    for segment in list(graph.segments.values()):
-        seg_read_filename = tmp_dir / (segment.name + extension)
-        if not seg_read_filename.is_file():
+    # Only segments with reads actually in the read file are polished - the others would get no
+    # alignments and be removed.
+    seg_names_with_reads = set(seg_read_counts.keys())
+    for segment in graph.segments.values():
+        if segment.name not in seg_names_with_reads:
             warning(f'No per-segment reads found for {segment.name}. Keeping original sequence.')
-            continue
-        seg_seq_filename = tmp_dir / (segment.name + '.fasta')
-        segment.save_to_fasta(seg_seq_filename)
-        fixed_seqs = run_racon(segment.name, seg_read_filename, seg_seq_filename, threads,
-                               tmp_dir, minimap2_preset)
-        try:
-            fixed_seq = fixed_seqs[segment.name]
-        except KeyError:
-            fixed_seq = ''
+    unpolished_filename = tmp_dir / 'initial.fasta'
+    graph.save_to_fasta(unpolished_filename, seg_names_with_reads)
+    fixed_seqs = run_racon('initial', read_filename, unpolished_filename, threads, tmp_dir,
+                           minimap2_preset, read_count=read_count,
+                           allowed_alignments=read_to_segments,
+                           stream_alignments=stream_alignments,
+                           unpolished_seqs=graph.get_sequences(seg_names_with_reads))
+    for segment in [s for s in graph.segments.values() if s.name in seg_names_with_reads]:
+        fixed_seq = fixed_seqs.get(segment.name, '')
         if len(fixed_seq) > 0:
             segment.sequence = fixed_seq
         else:
@@ -119,50 +313,144 @@ def initial_polish(graph, read_filename, threads, tmp_dir, minimap2_preset):
     log()
 
 
-def full_polish(graph, read_filename, threads, rounds, tmp_dir, minimap2_preset):
+def polish_one_segment(threads, segment, read_count, extension, tmp_dir, minimap2_preset,
+                       stream_alignments):
+    seg_read_filename = tmp_dir / (segment.name + extension)
+    seg_seq_filename = tmp_dir / (segment.name + '.fasta')
+    segment.save_to_fasta(seg_seq_filename)
+    fixed_seqs = run_racon(segment.name, seg_read_filename, seg_seq_filename, threads, tmp_dir,
+                           minimap2_preset, read_count=read_count,
+                           stream_alignments=stream_alignments,
+                           unpolished_seqs={segment.name: segment.sequence})
+    return fixed_seqs.get(segment.name, '')
+
+
+def full_polish(graph, read_index, threads, rounds, tmp_dir, minimap2_preset,
+                stream_alignments=False, checkpoint=None, index_cache=None, convergence=None,
+                window_size=None, max_depth=None):
+    """
+    If a convergence fraction is given, contigs which a round changes by less than that fraction
+    of their length are left out of later rounds, and the rounds stop once all have converged.
+
+    If a window size is given, contigs longer than that are polished in overlapping windows (see
+    windowed_racon.py).
+
+    If a maximum depth is given, the first round uses all of the reads, and later rounds only use
+    enough of them to give each contig that depth (see subsample.py).
+    """
     section_header('Full polishing rounds')
     explanation('The assembly graph is now polished using all of the reads. Multiple rounds of '
                 'polishing are done, and circular contigs are rotated between rounds.')
+    rng = random if checkpoint is None else checkpoint.rng
+    keep_files = checkpoint is not None and checkpoint.filename is not None  # i.e. --work_dir
+    converged = set() if checkpoint is None else checkpoint.converged
+    polish_reads = read_index
+    if checkpoint is not None and checkpoint.subsampled_reads is not None:
+        polish_reads = checkpoint.subsampled_reads
     for i in range(rounds):
         round_name = f'round_{i + 1}'
-        graph.rotate_circular_sequences()
-        unpolished_filename = tmp_dir / (round_name + '.fasta')
-        graph.save_to_fasta(unpolished_filename)
-        fixed_seqs = run_racon(round_name, read_filename, unpolished_filename, threads, tmp_dir,
-                               minimap2_preset)
-        graph.replace_sequences(fixed_seqs)
-
-
-def assign_depths(graph, read_filename, threads, tmp_dir, minimap2_preset):
+        if checkpoint is not None and checkpoint.is_done(round_name):
+            continue
+        to_polish = [n for n in graph.segments.keys() if n not in converged]
+        if not to_polish:
+            log('All contigs have converged - skipping the remaining polishing rounds')
+            log()
+            break
+        with metrics.stage(round_name):
+            graph.rotate_circular_sequences(rng)
+            unpolished_filename = tmp_dir / (round_name + '.fasta')
+            graph.save_to_fasta(unpolished_filename)
+            align_to = None
+            if converged:
+                # Reads are still aligned to every contig (so a converged contig keeps its own
+                # reads, instead of them landing on another copy of a repeat), but only the
+                # unconverged contigs are polished.
+                align_to = unpolished_filename
+                unpolished_filename = tmp_dir / (round_name + '_unconverged.fasta')
+                graph.save_to_fasta(unpolished_filename, to_polish)
+            unpolished_seqs = graph.get_sequences(to_polish)
+            read_subsampler = None
+            if max_depth is not None and polish_reads is read_index and i < rounds - 1:
+                read_subsampler = ReadSubsampler(max_depth)
+            if window_size is not None and \
+                    any(graph.get_segment_length(n) > window_size for n in to_polish):
+                fixed_seqs = run_windowed_racon(round_name, polish_reads, unpolished_filename,
+                                                threads, tmp_dir, minimap2_preset, window_size,
+                                                index_cache, read_subsampler,
+                                                unpolished_seqs=unpolished_seqs,
+                                                align_to=align_to, keep_files=keep_files)
+            else:
+                fixed_seqs = run_racon(round_name, polish_reads.filename, unpolished_filename,
+                                       threads, tmp_dir, minimap2_preset,
+                                       read_count=polish_reads.read_count,
+                                       stream_alignments=stream_alignments,
+                                       index_cache=index_cache, read_subsampler=read_subsampler,
+                                       unpolished_seqs=unpolished_seqs, align_to=align_to)
+            if convergence is not None:
+                newly_converged = get_converged_sequences(unpolished_seqs, fixed_seqs, convergence,
+                                                          threads)
+                log(f'Converged (changed by less than {100.0 * convergence:g}%): '
+                    f'{len(newly_converged):,} of {len(fixed_seqs):,} contigs')
+                log()
+                converged.update(newly_converged)
+            graph.replace_sequences(fixed_seqs)
+            if read_subsampler is not None:
+                polish_reads = save_read_subset(read_index, read_subsampler.choose_reads(),
+                                                tmp_dir)
+                if checkpoint is not None:
+                    checkpoint.subsampled_reads = polish_reads
+            if checkpoint is not None:
+                checkpoint.save(round_name, graph, read_index)
+
+
+def assign_depths(graph, read_index, threads, tmp_dir, minimap2_preset, depth_paf=None,
+                  index_cache=None, coverage=None, coverage_bin_size=DEFAULT_BIN_SIZE,
+                  low_coverage=DEFAULT_LOW_COVERAGE):
+    """
+    If a coverage prefix is given, each contig's depth along its length is also built up from the
+    same alignments (see coverage.py) and saved to files with that prefix.
+    """
     section_header('Assign read depths')
     explanation('The reads are aligned to the contigs one final time to calculate read depth '
                 'values.')
     log(f'Aligning reads:')
-    read_count = count_reads(read_filename)
-    log(f'  reads:      {read_filename} ({read_count:,} reads)')
+    read_filename = read_index.filename
+    log(f'  reads:      {read_filename} ({read_index.read_count:,} reads)')
 
     depth_filename = tmp_dir / 'depths.fasta'
     graph.save_to_fasta(depth_filename)
-    base_count = count_fasta_bases(depth_filename)
+    base_count = graph.get_total_length()
     log(f'  contigs:    {depth_filename} ({base_count:,} bp)')
 
-    command = ['minimap2', '-t', str(threads), '-x', minimap2_preset, depth_filename, read_filename]
-    alignments_filename = tmp_dir / 'depths.paf'
+    if index_cache is None:
+        minimap2_target = depth_filename
+    else:
+        minimap2_target = index_cache.get_index(depth_filename, minimap2_preset, threads)
+    command = ['minimap2', '-t', str(threads), '-x', minimap2_preset, minimap2_target,
+               read_filename]
     minimap2_log = tmp_dir / 'depths_minimap2.log'
-    with open(alignments_filename, 'wt') as stdout, open(minimap2_log, 'w') as stderr:
-        rc = subprocess.call(command, stdout=stdout, stderr=stderr)
-    if rc != 0:
-        sys.exit('Error: minimap2 failed')
-
-    alignments = []
-    with open(alignments_filename, 'rt') as alignments_file:
-        for line in alignments_file:
-            alignments.append(Alignment(line))
-    log(f'  alignments: {alignments_filename} ({len(alignments):,} alignments)')
-
+    minimap2_name = 'minimap2 (depths)'
     depth_per_contig = {name: 0.0 for name in graph.segments.keys()}
-    for a in alignments:
-        depth_per_contig[a.ref_name] += a.get_ref_depth_contribution()
+    coverage_counter = None
+    if coverage is not None:
+        coverage_counter = CoverageCounter({name: graph.get_segment_length(name)
+                                            for name in graph.segments.keys()}, coverage_bin_size)
+    alignment_count = 0
+    paf_lines = iterate_minimap2_output(command, minimap2_log, depth_paf, minimap2_name)
+    for batch in iterate_paf_batches(paf_lines, ['ref_name', 'ref_length', 'ref_start', 'ref_end']):
+        for ref_name, ref_length, ref_start, ref_end in zip(batch['ref_name'], batch['ref_length'],
+                                                            batch['ref_start'], batch['ref_end']):
+            depth_per_contig[ref_name] += (ref_end - ref_start) / ref_length
+        if coverage_counter is not None:
+            for ref_name, ref_start, ref_end in zip(batch['ref_name'], batch['ref_start'],
+                                                    batch['ref_end']):
+                coverage_counter.add_alignment(ref_name, ref_start, ref_end)
+        alignment_count += len(batch['ref_name'])
+    if depth_paf is None:
+        log(f'  alignments: {alignment_count:,} alignments')
+    else:
+        log(f'  alignments: {depth_paf} ({alignment_count:,} alignments)')
+
     graph.set_depths(depth_per_contig)
 
     segment_names = sorted(graph.segments.keys())
@@ -170,45 +458,64 @@ def assign_depths(graph, read_filename, threads, tmp_dir, minimap2_preset):
     lengths = [graph.get_segment_length(n) for n in segment_names]
     mean_depth = weighted_average(depths, lengths)
     log(f'  mean depth: {mean_depth:.3f}x')
+    if coverage_counter is not None:
+        regions = coverage_counter.save(coverage, low_coverage)
+        log(f'  coverage:   {coverage}_bins.tsv, {coverage}_histogram.tsv '
+            f'({coverage_bin_size:,} bp bins)')
+        log(f'  low depth:  {coverage}_low_coverage.tsv ({len(regions):,} regions, '
+            f'{sum(end - start for _, start, end, _ in regions):,} bp)')
     log()
 
 
-def save_per_segment_reads(graph, read_filename, tmp_dir):
-    read_to_segment = collections.defaultdict(list)
-    read_count = 0
+@metrics.timed
+def save_per_segment_reads(graph, read_index, tmp_dir):
+    """
+    Saves each segment's constituent reads to their own file in the temp directory. Returns the
+    file extension used and the number of reads saved for each segment.
+    """
+    read_to_segments = get_read_to_segments(graph)
+    extension = '_reads' + read_index.get_extension()
+    with ReadSplitter(tmp_dir, extension) as splitter:
+        for read_name, record in read_index.iterate_records():
+            for seg_name in read_to_segments.get(read_name, ()):
+                splitter.add_read(seg_name, record)
+    return splitter.extension, splitter.read_counts
+
+
+@metrics.timed
+def save_initial_reads(read_to_segments, read_index, tmp_dir):
+    """
+    Saves all reads which belong to any segment into one file (each read once, even if it belongs
+    to more than one segment), along with a manifest of each read's position in the file and its
+    segments. Returns the file's name, the number of reads saved and the number saved for each
+    segment.
+    """
+    initial_read_filename = tmp_dir / ('initial_reads' + read_index.get_extension())
+    manifest_filename = tmp_dir / 'initial_reads_manifest.tsv'
+    with CombinedReadWriter(initial_read_filename, manifest_filename) as writer:
+        for read_name, record in read_index.iterate_records():
+            if read_name in read_to_segments:
+                writer.add_read(read_name, read_to_segments[read_name], record)
+    return initial_read_filename, writer.read_count, writer.seg_read_counts
+
+
+def get_read_to_segments(graph):
+    """
+    Returns a dictionary of read name -> list of the segments that read was used to build.
+    """
+    read_to_segments = collections.defaultdict(list)
     for segment in graph.segments.values():
         for read_name in segment.read_names:
-            read_to_segment[read_name].append(segment.name)
-    if get_sequence_file_type(read_filename) == 'FASTQ':
-        extension = "_reads.fastq"
-        for read_name, seq, qual in iterate_fastq(read_filename):
-            if read_name not in read_to_segment:
-                continue
-            for seg_name in read_to_segment[read_name]:
-                seg_read_filename = tmp_dir / (seg_name + extension)
-                with open(seg_read_filename, 'at') as seg_read_file:
-                    seg_read_file.write(f'@{read_name}\n{seq}\n+\n{qual}\n')
-                    read_count += 1
-    elif get_sequence_file_type(read_filename) == 'FASTA':
-        extension = "_reads.fasta"
-        for read_name, seq in iterate_fasta(read_filename):
-            if read_name not in read_to_segment:
-                continue
-            for seg_name in read_to_segment[read_name]:
-                seg_read_filename = tmp_dir / (seg_name + extension)
-                with open(seg_read_filename, 'at') as seg_read_file:
-                    seg_read_file.write(f'>{read_name}\n{seq}\n')
-                    read_count += 1
-    else:
-        sys.exit('Error: {} is not FASTA/FASTQ format'.format(read_filename))
-    return extension, read_count
+            read_to_segments[read_name].append(segment.name)
+    return read_to_segments
 
 
-def check_for_required_tools():
+def check_for_required_tools(use_cache=False):
     section_header('Checking requirements')
     explanation('Minipolish requires Minimap2 and Racon to run, so it checks for these tools now.')
 
-    minimap2_path, minimap2_version, minimap2_status = minimap2_path_and_version('minimap2')
+    minimap2_path, minimap2_version, minimap2_status = minimap2_path_and_version('minimap2',
+                                                                               use_cache)
     if minimap2_status == 'good':
         log(f'Minimap2 found: {minimap2_path} (v{minimap2_version})')
     elif minimap2_status == 'not found':
@@ -217,7 +524,7 @@ def check_for_required_tools():
     elif minimap2_status == 'bad':
         sys.exit('Error: unable to determine minimap2 version')
 
-    racon_path, racon_version, racon_status = racon_path_and_version('racon')
+    racon_path, racon_version, racon_status = racon_path_and_version('racon', use_cache)
     if racon_status == 'good':
         log(f'Racon found:    {racon_path} (v{racon_version})')
     elif racon_status == 'not found':
@@ -233,6 +540,24 @@ def check_args(args):
         sys.exit(f'Error: reads file {args.reads} not found')
     if not pathlib.Path(args.assembly).is_file():
         sys.exit(f'Error: assembly file {args.assembly} not found')
+    if args.resume and args.work_dir is None:
+        sys.exit('Error: --resume requires --work_dir')
+    if args.tmp_dir is not None and args.work_dir is not None:
+        sys.exit('Error: --tmp_dir cannot be used with --work_dir')
+    if args.coverage_bin_size < 1:
+        sys.exit('Error: --coverage_bin_size must be at least 1')
+    if args.low_coverage < 0.0:
+        sys.exit('Error: --low_coverage cannot be negative')
+    check_polishing_settings(args)
+
+
+def check_polishing_settings(args):
+    if args.convergence is not None and not 0.0 <= args.convergence < 1.0:
+        sys.exit('Error: --convergence must be at least 0 and less than 1')
+    if args.max_depth is not None and args.max_depth <= 0.0:
+        sys.exit('Error: --max_depth must be greater than 0')
+    if args.window_size is not None and args.window_size < MIN_WINDOW_SIZE:
+        sys.exit(f'Error: --window_size must be at least {MIN_WINDOW_SIZE}')
     if args.pacbio:
         log()
         warning('--pacbio is deprecated. Using --minimap2-preset map-pb for backwards '
@@ -14,13 +14,29 @@ details. You should have received a copy of the GNU General Public License along
 If not, see <http://www.gnu.org/licenses/>.
 """
 
+import array
+import itertools
+import operator
+import subprocess
 import sys
+import time
+
+from .metrics import wait_for_process
+
+
+# PAF column name -> (column index, whether the column is an integer)
+PAF_COLUMNS = {'read_name': (0, False), 'read_length': (1, True), 'read_start': (2, True),
+               'read_end': (3, True), 'strand': (4, False), 'ref_name': (5, False),
+               'ref_length': (6, True), 'ref_start': (7, True), 'ref_end': (8, True),
+               'matching_bases': (9, True), 'num_bases': (10, True)}
 
 
 class Alignment(object):
+    __slots__ = ['read_name', 'read_length', 'read_start', 'read_end', 'strand',
+                 'ref_name', 'ref_length', 'ref_start', 'ref_end', 'matching_bases', 'num_bases']
 
     def __init__(self, paf_line):
-        line_parts = paf_line.strip().split('\t')
+        line_parts = paf_line.strip().split('\t', 11)
         if len(line_parts) < 11:
             sys.exit('Error: alignment file does not seem to be in PAF format')
 
@@ -37,7 +53,10 @@ class Alignment(object):
 
         self.matching_bases = int(line_parts[9])
         self.num_bases = int(line_parts[10])
-        self.percent_identity = 100.0 * self.matching_bases / self.num_bases
+
+    @property
+    def percent_identity(self):
+        return 100.0 * self.matching_bases / self.num_bases
 
     def get_ref_depth_contribution(self):
         """
@@ -45,3 +64,58 @@ class Alignment(object):
         side of that range if the alignment only covers a small part of the reference.
         """
         return (self.ref_end - self.ref_start) / self.ref_length
+
+
+def iterate_paf_batches(paf_lines, columns, batch_size=2000):
+    """
+    A lighter alternative to making an Alignment object for every PAF line: this only parses the
+    requested columns and yields them in batches, each a dictionary of column name -> values.
+    Integer columns are given as arrays and string columns as lists. Batches are kept fairly
+    small, as holding many split lines at once makes Python's garbage collector work harder.
+    """
+    indices = [PAF_COLUMNS[c][0] for c in columns]
+    max_split = max(indices) + 1
+    paf_lines = iter(paf_lines)
+    while True:
+        rows = [line.split('\t', max_split) for line in itertools.islice(paf_lines, batch_size)]
+        if not rows:
+            return
+        if any(len(row) < max_split for row in rows):
+            sys.exit('Error: alignment file does not seem to be in PAF format')
+        batch = {}
+        for c, i in zip(columns, indices):
+            if PAF_COLUMNS[c][1]:
+                batch[c] = array.array('q', map(int, map(operator.itemgetter(i), rows)))
+            else:
+                batch[c] = list(map(operator.itemgetter(i), rows))
+        yield batch
+
+
+def iterate_minimap2_output(command, log_filename, paf_filename=None, name='minimap2'):
+    """
+    Runs minimap2 and yields its PAF lines as they are produced, reading its output through a
+    pipe so the alignments are never all held in memory or written to disk. If a PAF filename is
+    given, the lines are also saved there.
+    """
+    paf_file = None if paf_filename is None else open(paf_filename, 'wt')
+    try:
+        with open(log_filename, 'w') as stderr:
+            start = time.perf_counter()
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr,
+                                       universal_newlines=True)
+            try:
+                for line in process.stdout:
+                    if paf_file is not None:
+                        paf_file.write(line)
+                    yield line
+            except BaseException:  # e.g. the caller stopped early, so minimap2 isn't needed
+                process.kill()
+                raise
+            finally:
+                process.stdout.close()
+                rc = wait_for_process(process, name, command, start)
+        if rc != 0:
+            sys.exit('Error: minimap2 failed')
+    finally:
+        if paf_file is not None:
+            paf_file.close()
@@ -13,41 +13,79 @@ If not, see <http://www.gnu.org/licenses/>.
 """
 
 import collections
+import os
 import random
 import sys
 
 from .log import log, section_header, explanation
-from .misc import get_open_func
+from .decompress import open_gzip, open_gzip_for_writing
+from .misc import get_compression_type
+
+
+GFA_READ_BUFFER_SIZE = 1048576
+GFA_WRITE_BUFFER_SIZE = 1048576
 
 
 class AssemblyGraph(object):
     def __init__(self):
         self.segments = {}  # dictionary of segment name -> segment object
         self.links = {}  # dictionary of segment names -> link object
+        self.segment_links = collections.defaultdict(set)  # segment name -> names of its links
 
     def add_link(self, link):
         names = (link.name_1 + link.strand_1, link.name_2 + link.strand_2)
         assert names not in self.links
         self.links[names] = link
+        self.segment_links[link.name_1].add(names)
+        self.segment_links[link.name_2].add(names)
 
     def remove_segment(self, seg_name):
         log(f'Removing empty segment: {seg_name}')
         del self.segments[seg_name]
-        for link_name in list(self.links.keys()):
-            link = self.links[link_name]
-            if link.name_1 == seg_name or link.name_2 == seg_name:
-                self.links.pop(link_name, None)
+        for link_name in self.segment_links.pop(seg_name, set()):
+            link = self.links.pop(link_name)
+            other_name = link.name_2 if link.name_1 == seg_name else link.name_1
+            if other_name != seg_name:
+                self.segment_links[other_name].discard(link_name)
         log()
 
+    def get_links(self, seg_name):
+        """
+        Returns the links (in either direction) which involve the given segment.
+        """
+        return [self.links[link_name] for link_name in sorted(self.segment_links.get(seg_name, ()))]
+
     def print_to_stdout(self):
-        segment_names = sorted(self.segments.keys())
-        for name in segment_names:
-            self.segments[name].print_gfa_line_to_stdout()
-        link_names = sorted(self.links.keys())
-        for name in link_names:
-            self.links[name].print_gfa_line_to_stdout()
+        sys.stdout.flush()
+        self.write_gfa(sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+
+    def save_to_gfa(self, filename, threads=1):
+        """
+        Saves the graph to a GFA file, which is gzipped if the filename ends in .gz.
+        """
+        if str(filename).endswith('.gz'):
+            with open_gzip_for_writing(filename, threads) as gfa:
+                self.write_gfa(gfa)
+        else:
+            with open(filename, 'wb', buffering=GFA_WRITE_BUFFER_SIZE) as gfa:
+                self.write_gfa(gfa)
 
-    def rotate_circular_sequences(self):
+    def write_gfa(self, out):
+        """
+        Writes the graph in GFA format to a binary stream. Sequences are written straight from
+        their segments' bytes, and the links are written as one block.
+        """
+        for name in sorted(self.segments.keys()):
+            self.segments[name].write_gfa_line(out)
+        out.write(''.join(self.links[name].get_gfa_line()
+                          for name in sorted(self.links.keys())).encode())
+
+    def rotate_circular_sequences(self, rng=random):
+        """
+        Rotates each circular contig by a random amount, using the given random number generator
+        (a random.Random object, or the random module itself).
+        """
         segment_names = sorted(self.segments.keys())
         for name in segment_names:
             if name.endswith('c'):
@@ -59,16 +97,26 @@ class AssemblyGraph(object):
                 assert self.links[negative_link].cigar == '0M'
                 segment = self.segments[name]
                 if segment.get_length() > 1:
-                    rotation = random.randint(1, segment.get_length() - 1)
+                    rotation = rng.randint(1, segment.get_length() - 1)
                     segment.rotate(rotation)
         log()
 
-    def save_to_fasta(self, filename):
-        segment_names = sorted(self.segments.keys())
-        with open(filename, 'wt') as fasta:
+    def save_to_fasta(self, filename, segment_names=None):
+        if segment_names is None:
+            segment_names = self.segments.keys()
+        segment_names = sorted(segment_names)
+        with open(filename, 'wb') as fasta:
             for name in segment_names:
-                segment = self.segments[name]
-                fasta.write(f'>{name}\n{segment.sequence}\n')
+                self.segments[name].write_fasta_record(fasta)
+
+    def get_sequences(self, segment_names=None):
+        """
+        Returns a dictionary of segment name -> sequence, in the same (sorted) order as
+        save_to_fasta writes them.
+        """
+        if segment_names is None:
+            segment_names = self.segments.keys()
+        return {name: self.segments[name].sequence for name in sorted(segment_names)}
 
     def replace_sequences(self, new_seqs):
         for seg_name, new_seq in new_seqs.items():
@@ -94,23 +142,13 @@ class AssemblyGraph(object):
         in the other direction (utg000002l+ -> utg000001l-). This function will build those
         corresponding links if they don't already exist.
         """
-        # Group links into their pairs.
-        str_to_links = collections.defaultdict(list)
-        for link in self.links.values():
-            str_to_links[link.get_canonical_link_str()].append(link)
-
-        # For each pair, make the other link if it doesn't already exist.
-        for _, links in str_to_links.items():
-            assert len(links) == 1 or len(links) == 2
-            if len(links) == 1:
-                self.add_link(make_reverse_link(links[0]))
+        for link in list(self.links.values()):
+            if get_reverse_link_names(link) not in self.links:
+                self.add_link(make_reverse_link(link))
 
         # Sanity check: all links should be paired now.
-        str_to_links = collections.defaultdict(list)
         for link in self.links.values():
-            str_to_links[link.get_canonical_link_str()].append(link)
-        for links in str_to_links.values():
-            assert len(links) == 2
+            assert get_reverse_link_names(link) in self.links
 
     def build_circularising_links(self):
         """
@@ -133,6 +171,16 @@ class AssemblyGraph(object):
 
 
 class Segment(object):
+    """
+    The sequence is stored as bytes along with a rotation offset, so rotating a circular contig
+    doesn't copy its sequence. The rotation is only applied when the sequence is written out
+    (as two memoryview slices, so still without a copy) or requested as a string. The string
+    isn't kept, so callers which need it more than once (e.g. get_sequences) should hold on to it
+    themselves - the segment only ever holds one copy of its sequence.
+
+    A segment can also be made with just the location of its sequence in the GFA file (see
+    load_gfa's lazy_sequences), in which case the sequence is read from disk on first use.
+    """
     def __init__(self, gfa_line):
         parts = gfa_line.strip().split('\t')
         assert parts[0] == 'S'
@@ -141,20 +189,66 @@ class Segment(object):
         self.depth = 0.0
         self.read_names = []
 
+    @classmethod
+    def from_fields(cls, name, sequence=b'', sequence_location=None):
+        """
+        Makes a segment without a GFA line to parse. If sequence_location is given, it is a
+        (filename, offset, length) tuple and the sequence isn't read until it's needed.
+        """
+        segment = cls.__new__(cls)
+        segment.name = name
+        segment.sequence = sequence
+        segment.sequence_location = sequence_location
+        segment.depth = 0.0
+        segment.read_names = []
+        return segment
+
+    @property
+    def sequence(self):
+        if self.rotation == 0:
+            return self.sequence_bytes.decode()
+        return b''.join(self.get_sequence_parts()).decode()
+
+    @sequence.setter
+    def sequence(self, sequence):
+        self._sequence_bytes = sequence.encode() if isinstance(sequence, str) else bytes(sequence)
+        self.sequence_location = None
+        self.rotation = 0
+
+    @property
+    def sequence_bytes(self):
+        if self.sequence_location is not None:
+            self._sequence_bytes = load_sequence(*self.sequence_location)
+            self.sequence_location = None
+        return self._sequence_bytes
+
+    def get_sequence_parts(self):
+        view = memoryview(self.sequence_bytes)
+        return view[self.rotation:], view[:self.rotation]
+
     def save_to_fasta(self, filename):
-        with open(filename, 'wt') as fasta:
-            fasta.write(f'>{self.name}\n{self.sequence}\n')
+        with open(filename, 'wb') as fasta:
+            self.write_fasta_record(fasta)
 
-    def print_gfa_line_to_stdout(self):
-        print(f'S\t{self.name}\t{self.sequence}\tdp:f:{self.depth:.3f}')
+    def write_fasta_record(self, out):
+        out.write(f'>{self.name}\n'.encode())
+        out.writelines(self.get_sequence_parts())
+        out.write(b'\n')
+
+    def write_gfa_line(self, out):
+        out.write(f'S\t{self.name}\t'.encode())
+        out.writelines(self.get_sequence_parts())
+        out.write(f'\tdp:f:{self.depth:.3f}\n'.encode())
 
     def get_length(self):
-        return len(self.sequence)
+        if self.sequence_location is not None:
+            return self.sequence_location[2]
+        return len(self._sequence_bytes)
 
     def rotate(self, rotation):
         assert self.name.endswith('c')  # Only circular contigs should be rotated
         log(f'Rotating {self.name} by {rotation:,} bp')
-        self.sequence = self.sequence[rotation:] + self.sequence[:rotation]
+        self.rotation = (self.rotation + rotation) % self.get_length()
 
 
 class Link(object):
@@ -167,8 +261,16 @@ class Link(object):
         self.strand_2 = parts[4]
         self.cigar = parts[5]
 
-    def print_gfa_line_to_stdout(self):
-        print(f'L\t{self.name_1}\t{self.strand_1}\t{self.name_2}\t{self.strand_2}\t{self.cigar}')
+    @classmethod
+    def from_fields(cls, name_1, strand_1, name_2, strand_2, cigar):
+        link = cls.__new__(cls)
+        link.name_1, link.strand_1 = name_1, strand_1
+        link.name_2, link.strand_2 = name_2, strand_2
+        link.cigar = cigar
+        return link
+
+    def get_gfa_line(self):
+        return f'L\t{self.name_1}\t{self.strand_1}\t{self.name_2}\t{self.strand_2}\t{self.cigar}\n'
 
     def get_forward_link_str(self):
         return self.name_1 + self.strand_1 + self.name_2 + self.strand_2
@@ -198,7 +300,14 @@ def flip_strand(strand):
     return '+'
 
 
-def load_gfa(filename):
+def load_gfa(filename, lazy_sequences=False):
+    """
+    Lines are read as bytes and dispatched on their first character, and only the needed fields
+    are split out. Segment and read names are interned, as each appears on many lines.
+
+    With lazy_sequences, segment sequences are left in the file (only their positions are
+    stored) until they are needed. This only works for uncompressed files.
+    """
     section_header('Loading graph')
     explanation('Loading the miniasm GFA graph into memory.')
     log(filename)
@@ -207,31 +316,54 @@ def load_gfa(filename):
     # The constituent reads for segments (GFA 'a' lines) will be stored in this dictionary and
     # then added to the segments at the end of this function. This is so we don't have to assume
     # that 'a' lines come after their corresponding 'S' line (though I expect they always do).
+    # Names are kept as bytes until then, so each 'a' line needs no decoding.
     segment_reads = collections.defaultdict(list)
 
-    with get_open_func(filename)(filename) as gfa:
+    compressed = get_compression_type(filename) == 'gz'
+    lazy_sequences = lazy_sequences and not compressed
+    abs_filename = os.path.abspath(filename)
+    intern = sys.intern
+    offset = 0
+    if compressed:
+        gfa = open_gzip(filename, 'rb')
+    else:  # a big buffer makes reading long S lines much faster
+        gfa = open(filename, 'rb', buffering=GFA_READ_BUFFER_SIZE)
+    with gfa:
         for line in gfa:
-            if line.startswith('S\t'):
-                segment = Segment(line)
+            first_char = line[:1]
+            if first_char == b'S':
+                _, name, rest = line.split(b'\t', 2)
+                seq_length = rest.find(b'\t')
+                if seq_length == -1:
+                    seq_length = len(rest.rstrip(b'\r\n'))
+                if lazy_sequences:
+                    location = (abs_filename, offset + len(name) + 3, seq_length)
+                    segment = Segment.from_fields(intern(name.decode()),
+                                                  sequence_location=location)
+                else:
+                    segment = Segment.from_fields(intern(name.decode()), rest[:seq_length])
                 if not (segment.name.endswith('l') or segment.name.endswith('c')):
                     sys.exit(f'Error: contig name ({segment.name}) does not appear to be in a '
                              f'miniasm format')
                 graph.segments[segment.name] = segment
-            if line.startswith('a\t'):
-                segment_name, read_name = parse_a_line(line)
-                segment_reads[segment_name].append(read_name)
-            if line.startswith('L\t'):
-                graph.add_link(Link(line))
+            elif first_char == b'a':
+                parts = line.split(b'\t', 4)
+                segment_reads[parts[1]].append(parts[3].rsplit(b':', 1)[0])
+            elif first_char == b'L':
+                parts = line.rstrip(b'\r\n').split(b'\t', 6)
+                graph.add_link(Link.from_fields(*(intern(p.decode()) for p in parts[1:6])))
+            offset += len(line)
 
     graph.build_reverse_links()
     graph.build_circularising_links()
 
     for segment_name, read_names in segment_reads.items():
+        segment_name = segment_name.decode()
         assert segment_name in graph.segments
-        graph.segments[segment_name].read_names = read_names
+        graph.segments[segment_name].read_names = list(map(intern, map(bytes.decode, read_names)))
 
     seg_count = len(graph.segments)
-    base_count = sum(len(s.sequence) for s in graph.segments.values())
+    base_count = graph.get_total_length()
     link_count = len(graph.links)
     log(f'  {seg_count:,} segments ({base_count:,} bp)')
     log(f'  {link_count:,} links')
@@ -247,10 +379,24 @@ def parse_a_line(line):
     return segment_name, read_name
 
 
+def get_reverse_link_names(link):
+    """
+    Returns the key (in AssemblyGraph.links) of the link going the other way. For a link which is
+    its own reverse (e.g. utg000001l+ -> utg000001l-), this is the link's own key.
+    """
+    return link.name_2 + flip_strand(link.strand_2), link.name_1 + flip_strand(link.strand_1)
+
+
+def load_sequence(filename, offset, length):
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
 def make_reverse_link(link):
     """
     This function returns a Link object which is the reverse direction of the given link object,
     using the same CIGAR.
     """
-    return Link(f'L\t{link.name_2}\t{flip_strand(link.strand_2)}\t'
-                f'{link.name_1}\t{flip_strand(link.strand_1)}\t{link.cigar}')
+    return Link.from_fields(link.name_2, flip_strand(link.strand_2),
+                            link.name_1, flip_strand(link.strand_1), link.cigar)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+This module contains Minipolish's batch mode (the minipolish-batch command), which polishes many
+assemblies in one process. The tools are checked once, and the assemblies share one thread
+budget, so small assemblies can be polished side by side instead of one after another.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+import time
+import traceback
+
+from .__main__ import add_polishing_settings, add_tmp_dir_option, check_polishing_settings, \
+    check_for_required_tools, run_minipolish
+from . import metrics
+from .coverage import DEFAULT_BIN_SIZE, DEFAULT_LOW_COVERAGE
+from .help_formatter import MyParser, MyHelpFormatter
+from .log import log, section_header, explanation, log_to_file, red
+from .misc import get_default_thread_count
+from .read_splitter import set_concurrent_runs
+from .scheduler import run_with_thread_budget
+from .version import __version__
+
+
+DEFAULT_JOB_THREADS = 4
+
+
+def get_arguments(args):
+    parser = MyParser(description='Minipolish batch mode', add_help=False,
+                      formatter_class=MyHelpFormatter)
+
+    required_args = parser.add_argument_group('Positional arguments')
+    required_args.add_argument('manifest', type=str,
+                               help='Tab-delimited file with one assembly per line: reads, '
+                                    'assembly (GFA) and output (GFA, gzipped if it ends in .gz) '
+                                    'filenames. Blank lines and lines starting with # are '
+                                    'ignored.')
+
+    setting_args = parser.add_argument_group('Settings')
+    setting_args.add_argument('-t', '--threads', type=int, default=get_default_thread_count(),
+                              help='Total number of threads to use, shared between the '
+                                   'assemblies')
+    setting_args.add_argument('--job_threads', type=int,
+                              help=f'Number of threads for each assembly, so up to '
+                                   f'THREADS/JOB_THREADS assemblies are polished at once '
+                                   f'(default: {DEFAULT_JOB_THREADS}, or THREADS if that is '
+                                   f'smaller)')
+    add_polishing_settings(setting_args)
+    setting_args.add_argument('--skip_tool_check', action='store_true',
+                              help='Don\'t run minimap2 and Racon to check them if they were '
+                                   'checked by a previous run and haven\'t changed since (default: '
+                                   'check the tools at the start of every run)')
+
+    output_args = parser.add_argument_group('Output')
+    output_args.add_argument('--log_dir', type=str,
+                             help='Save each assembly\'s log and metrics to this directory '
+                                  '(default: alongside its output file)')
+    add_tmp_dir_option(output_args)
+
+    other_args = parser.add_argument_group('Other')
+    other_args.add_argument('-h', '--help', action='help', default=argparse.SUPPRESS,
+                            help='Show this help message and exit')
+    other_args.add_argument('--version', action='version',
+                            version='Minipolish v' + __version__,
+                            help="Show program's version number and exit")
+
+    args = parser.parse_args(args)
+    check_args(args)
+    return args
+
+
+def main(args=None):
+    args = get_arguments(args)
+    samples = load_manifest(args.manifest, args.log_dir)
+    check_for_required_tools(args.skip_tool_check)
+
+    section_header('Polishing assemblies')
+    explanation(f'Polishing {len(samples)} assemblies, {args.job_threads} thread'
+                f'{"" if args.job_threads == 1 else "s"} each and up to {args.threads} threads '
+                f'in total. Each assembly\'s progress is written to its own log file, and a line '
+                f'is shown here as each one finishes.')
+    # The samples running at once share this process's open file limit.
+    set_concurrent_runs(max(1, min(len(samples), args.threads // args.job_threads)))
+    # Assemblies with the most reads are started first.
+    costs = [os.path.getsize(sample.reads) for sample in samples]
+    jobs = [(args.job_threads, polish_sample, (sample, args)) for sample in samples]
+    results = run_with_thread_budget(jobs, args.threads, costs)
+    log()
+
+    section_header('Summary')
+    failed = 0
+    for sample, (success, elapsed) in zip(samples, results):
+        status = 'done' if success else red('failed')
+        log(f'{sample.name}: {status} ({elapsed:.1f} s) - see {sample.log_filename}')
+        if not success:
+            failed += 1
+    log()
+    if failed:
+        sys.exit(f'Error: {failed} of {len(samples)} assemblies failed to polish')
+
+
+class BatchSample(object):
+    """
+    One line of the manifest: an assembly to polish, its reads and where to save the result. The
+    sample's name (used for its log and metrics files) is the output filename without its
+    extension.
+    """
+    def __init__(self, reads, assembly, output, log_dir=None):
+        self.reads = reads
+        self.assembly = assembly
+        self.output = output
+        self.name = get_sample_name(output)
+        log_dir = pathlib.Path(output).parent if log_dir is None else pathlib.Path(log_dir)
+        self.log_filename = log_dir / (self.name + '.log')
+        self.metrics_filename = log_dir / (self.name + '.metrics.json')
+
+    def get_args(self, threads, settings):
+        """
+        Returns the arguments for a normal (non-batch) Minipolish run on this sample.
+        """
+        return argparse.Namespace(reads=self.reads, assembly=self.assembly, output=self.output,
+                                  threads=threads, rounds=settings.rounds,
+                                  convergence=settings.convergence,
+                                  window_size=settings.window_size,
+                                  max_depth=settings.max_depth,
+                                  minimap2_preset=settings.minimap2_preset,
+                                  skip_initial=settings.skip_initial,
+                                  batch_initial=settings.batch_initial,
+                                  stream_alignments=settings.stream_alignments,
+                                  lazy_load=settings.lazy_load, depth_paf=None, coverage=None,
+                                  coverage_bin_size=DEFAULT_BIN_SIZE,
+                                  low_coverage=DEFAULT_LOW_COVERAGE, work_dir=None,
+                                  resume=False, tmp_dir=settings.tmp_dir)
+
+
+def get_sample_name(output):
+    name = pathlib.Path(output).name
+    for extension in ['.gz', '.gfa']:
+        if name.endswith(extension) and len(name) > len(extension):
+            name = name[:-len(extension)]
+    return name
+
+
+def load_manifest(filename, log_dir=None):
+    if not pathlib.Path(filename).is_file():
+        sys.exit(f'Error: manifest file {filename} not found')
+    samples = []
+    with open(filename, 'rt') as manifest:
+        for line_number, line in enumerate(manifest, start=1):
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            parts = line.split('\t')
+            if len(parts) != 3:
+                sys.exit(f'Error: line {line_number} of {filename} does not have three '
+                         f'tab-delimited columns (reads, assembly and output)')
+            reads, assembly, output = parts
+            if not pathlib.Path(reads).is_file():
+                sys.exit(f'Error: reads file {reads} (line {line_number}) not found')
+            if not pathlib.Path(assembly).is_file():
+                sys.exit(f'Error: assembly file {assembly} (line {line_number}) not found')
+            samples.append(BatchSample(reads, assembly, output, log_dir))
+    if not samples:
+        sys.exit(f'Error: no assemblies found in {filename}')
+    log_filenames = set()
+    for sample in samples:
+        if sample.log_filename in log_filenames:
+            sys.exit(f'Error: more than one assembly in {filename} is named {sample.name} - '
+                     f'output filenames must be unique')
+        log_filenames.add(sample.log_filename)
+    if log_dir is not None:
+        pathlib.Path(log_dir).mkdir(parents=True, exist_ok=True)
+    return samples
+
+
+def polish_sample(threads, sample, settings):
+    """
+    Polishes one assembly, with its log output and metrics going to its own files. A failure is
+    recorded in the sample's log instead of stopping the batch. Returns whether the assembly was
+    polished and how long it took.
+    """
+    start = time.perf_counter()
+    collection = metrics.Metrics()
+    success = False
+    try:
+        with open(sample.log_filename, 'wt') as log_file:
+            with log_to_file(log_file), metrics.collect_metrics(collection):
+                try:
+                    run_minipolish(sample.get_args(threads, settings), check_tools=False)
+                    success = True
+                except SystemExit as e:
+                    log(str(e.code))
+                except Exception:
+                    log(traceback.format_exc())
+        metrics.save_metrics(sample.metrics_filename, collection)
+    except OSError as e:  # e.g. the log's directory doesn't exist, so the error goes here instead
+        log(f'{sample.name}: {e}')
+        success = False
+    elapsed = time.perf_counter() - start
+    log(f'{sample.name}: {"done" if success else red("failed")} ({elapsed:.1f} s)')
+    return success, elapsed
+
+
+def check_args(args):
+    if args.threads < 1:
+        sys.exit('Error: --threads must be at least 1')
+    if args.job_threads is None:
+        args.job_threads = min(DEFAULT_JOB_THREADS, args.threads)
+    if args.job_threads < 1:
+        sys.exit('Error: --job_threads must be at least 1')
+    if args.job_threads > args.threads:
+        sys.exit('Error: --job_threads cannot be larger than --threads')
+    check_polishing_settings(args)
+
+
+if __name__ == '__main__':
+    main()
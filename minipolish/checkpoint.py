@@ -0,0 +1,139 @@
+"""
+This module contains functions for saving Minipolish's progress to a work directory after each
+stage, so an interrupted run can be resumed (with --resume) instead of starting over.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import os
+import pickle
+import random
+import sys
+
+from .log import log, section_header, explanation
+from .version import __version__
+
+
+CHECKPOINT_FILENAME = 'checkpoint.pickle'
+READ_INDEX_FILENAME = 'read_index.pickle'
+FINGERPRINT_CHUNK_SIZE = 1048576
+
+
+class Checkpoint(object):
+    """
+    Everything needed to pick up a run where it left off: the completed stages, the graph as it
+    was after the last of them, the read index, the random number generator (used for rotating
+    circular contigs), the contigs which have converged (with --convergence), the index of the
+    subsampled reads (with --max_depth) and fingerprints of the input files and settings. Each
+    run has its own random number generator so runs in the same process (batch mode) don't affect
+    each other.
+
+    If no work directory is given, checkpoints are disabled and saving does nothing.
+    """
+    def __init__(self, work_dir, fingerprint):
+        self.filename = None if work_dir is None else work_dir / CHECKPOINT_FILENAME
+        self.read_index_filename = None if work_dir is None else work_dir / READ_INDEX_FILENAME
+        self.fingerprint = fingerprint
+        self.completed_stages = []
+        self.graph = None
+        self.read_index = None
+        self.rng = random.Random(0)
+        self.converged = set()
+        self.subsampled_reads = None
+        self.random_state = None
+
+    def is_done(self, stage):
+        return stage in self.completed_stages
+
+    def save(self, stage, graph, read_index):
+        """
+        Records a stage as complete. The read index doesn't change during a run, so it's only
+        saved (to its own file) with the first checkpoint.
+        """
+        if self.filename is None:
+            return
+        if self.read_index is None:
+            save_pickle(read_index, self.read_index_filename)
+            self.read_index = read_index
+        if stage not in self.completed_stages:
+            self.completed_stages.append(stage)
+        self.graph = graph
+        self.random_state = self.rng.getstate()
+        save_pickle({'version': __version__, 'fingerprint': self.fingerprint,
+                     'completed_stages': self.completed_stages, 'graph': self.graph,
+                     'random_state': self.random_state, 'converged': self.converged,
+                     'subsampled_reads': self.subsampled_reads}, self.filename)
+
+    def load(self):
+        section_header('Resuming from checkpoint')
+        explanation('Loading the progress of a previous run from the work directory. Stages '
+                    'which were completed in that run will be skipped.')
+        log(self.filename)
+        if not self.filename.is_file() or not self.read_index_filename.is_file():
+            sys.exit(f'Error: no checkpoint found in {self.filename.parent}')
+        with open(self.filename, 'rb') as checkpoint_file:
+            data = pickle.load(checkpoint_file)
+        if data['version'] != __version__:
+            sys.exit(f'Error: checkpoint was made by Minipolish v{data["version"]} - cannot '
+                     f'resume with v{__version__}')
+        if data['fingerprint'] != self.fingerprint:
+            sys.exit('Error: the input files or settings have changed since the checkpoint was '
+                     'made - cannot resume')
+        self.completed_stages = data['completed_stages']
+        self.graph = data['graph']
+        with open(self.read_index_filename, 'rb') as read_index_file:
+            self.read_index = pickle.load(read_index_file)
+        self.random_state = data['random_state']
+        self.rng.setstate(self.random_state)
+        self.converged = data['converged']
+        self.subsampled_reads = data['subsampled_reads']
+        log(f'  completed stages: {", ".join(self.completed_stages)}')
+        log()
+
+
+def save_pickle(obj, filename):
+    """
+    The object is written to a temporary file and then moved into place, so a run killed
+    mid-write can't leave a broken checkpoint behind.
+    """
+    temp_filename = filename.with_name(filename.name + '.tmp')
+    with open(temp_filename, 'wb') as pickle_file:
+        pickle.dump(obj, pickle_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, filename)
+
+
+def get_fingerprint(args):
+    """
+    Describes the inputs and the settings which affect the result, so we can refuse to resume
+    if they've changed. Hashing whole read files (often many GB) would take as long as a stage,
+    so files are identified by their size plus a hash of their first and last chunks.
+    """
+    return {'reads': get_file_fingerprint(args.reads),
+            'assembly': get_file_fingerprint(args.assembly),
+            'minimap2_preset': args.minimap2_preset,
+            'skip_initial': args.skip_initial,
+            'batch_initial': args.batch_initial,
+            'convergence': args.convergence,
+            'window_size': args.window_size,
+            'max_depth': args.max_depth}
+
+
+def get_file_fingerprint(filename):
+    size = os.path.getsize(filename)
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        sha256.update(f.read(FINGERPRINT_CHUNK_SIZE))
+        if size > FINGERPRINT_CHUNK_SIZE:
+            f.seek(max(FINGERPRINT_CHUNK_SIZE, size - FINGERPRINT_CHUNK_SIZE))
+            sha256.update(f.read())
+    return size, sha256.hexdigest()
@@ -0,0 +1,138 @@
+"""
+This module contains a class for building up each contig's read depth along its length (in bins
+of a fixed size) as the depth alignments stream in, so a depth histogram and low-coverage regions
+can be reported without a second pass over the alignments.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import array
+import collections
+import itertools
+
+from .metrics import timed
+
+
+DEFAULT_BIN_SIZE = 100
+DEFAULT_LOW_COVERAGE = 0.25  # bins below this fraction of their contig's mean depth are reported
+
+
+class CoverageCounter(object):
+    """
+    Each contig gets two arrays with one value per bin, so memory use is set by the bin size (a
+    bin size of 1 gives exact per-base depth):
+      * edge_bases: bases from alignments which start or end in the bin
+      * full_bins: a difference array counting the alignments which span the whole bin - an
+        alignment adds one at the first bin it fully covers and subtracts one after the last,
+        so adding an alignment takes the same time however long it is.
+    A bin's depth is its aligned bases (edge bases plus bin size times its running full-bin
+    count) divided by its length.
+    """
+    def __init__(self, contig_lengths, bin_size=DEFAULT_BIN_SIZE):
+        self.bin_size = bin_size
+        self.contig_lengths = dict(contig_lengths)
+        self.edge_bases, self.full_bins = {}, {}
+        for name, length in self.contig_lengths.items():
+            bin_count = (length + bin_size - 1) // bin_size
+            self.edge_bases[name] = array.array('q', bytes(8 * bin_count))
+            self.full_bins[name] = array.array('q', bytes(8 * (bin_count + 1)))
+
+    def add_alignment(self, ref_name, ref_start, ref_end):
+        ref_end = min(ref_end, self.contig_lengths[ref_name])
+        if ref_end <= ref_start:
+            return
+        bin_size = self.bin_size
+        first_bin, last_bin = ref_start // bin_size, (ref_end - 1) // bin_size
+        edge_bases = self.edge_bases[ref_name]
+        if first_bin == last_bin:
+            edge_bases[first_bin] += ref_end - ref_start
+            return
+        edge_bases[first_bin] += (first_bin + 1) * bin_size - ref_start
+        edge_bases[last_bin] += ref_end - last_bin * bin_size
+        if last_bin > first_bin + 1:
+            full_bins = self.full_bins[ref_name]
+            full_bins[first_bin + 1] += 1
+            full_bins[last_bin] -= 1
+
+    def iterate_bins(self, name):
+        """
+        Yields (start, end, depth) for each of the contig's bins.
+        """
+        bin_size, length = self.bin_size, self.contig_lengths[name]
+        full_counts = itertools.accumulate(self.full_bins[name])
+        for i, (edge_bases, full_count) in enumerate(zip(self.edge_bases[name], full_counts)):
+            start, end = i * bin_size, min((i + 1) * bin_size, length)
+            yield start, end, (edge_bases + full_count * bin_size) / (end - start)
+
+    def get_mean_depth(self, name):
+        length = self.contig_lengths[name]
+        if length == 0:
+            return 0.0
+        return sum((end - start) * depth for start, end, depth in self.iterate_bins(name)) / length
+
+    def get_histogram(self):
+        """
+        Returns a sorted list of (depth, bases), where depth is rounded down to a whole number and
+        bases is the total length of the bins with that depth.
+        """
+        histogram = collections.Counter()
+        for name in self.contig_lengths:
+            for start, end, depth in self.iterate_bins(name):
+                histogram[int(depth)] += end - start
+        return sorted(histogram.items())
+
+    def get_low_coverage_regions(self, low_coverage=DEFAULT_LOW_COVERAGE):
+        """
+        Returns (contig name, start, end, depth) for each run of adjacent bins with less than the
+        given fraction of their contig's mean depth.
+        """
+        regions = []
+        for name in sorted(self.contig_lengths):
+            threshold = low_coverage * self.get_mean_depth(name)
+            region_start, region_end, region_bases = None, None, 0.0
+            for start, end, depth in self.iterate_bins(name):
+                if depth < threshold:
+                    if region_start is None:
+                        region_start, region_bases = start, 0.0
+                    region_end = end
+                    region_bases += (end - start) * depth
+                elif region_start is not None:
+                    regions.append((name, region_start, region_end,
+                                    region_bases / (region_end - region_start)))
+                    region_start = None
+            if region_start is not None:
+                regions.append((name, region_start, region_end,
+                                region_bases / (region_end - region_start)))
+        return regions
+
+    @timed
+    def save(self, prefix, low_coverage=DEFAULT_LOW_COVERAGE):
+        """
+        Saves three TSV files: the depth of each bin (PREFIX_bins.tsv), the depth histogram
+        (PREFIX_histogram.tsv) and the low-coverage regions (PREFIX_low_coverage.tsv). Returns
+        the low-coverage regions.
+        """
+        with open(f'{prefix}_bins.tsv', 'wt') as bins:
+            bins.write('contig\tstart\tend\tdepth\n')
+            for name in sorted(self.contig_lengths):
+                for start, end, depth in self.iterate_bins(name):
+                    bins.write(f'{name}\t{start}\t{end}\t{depth:.3f}\n')
+        with open(f'{prefix}_histogram.tsv', 'wt') as histogram:
+            histogram.write('depth\tbases\n')
+            for depth, bases in self.get_histogram():
+                histogram.write(f'{depth}\t{bases}\n')
+        regions = self.get_low_coverage_regions(low_coverage)
+        with open(f'{prefix}_low_coverage.tsv', 'wt') as low:
+            low.write('contig\tstart\tend\tdepth\n')
+            for name, start, end, depth in regions:
+                low.write(f'{name}\t{start}\t{end}\t{depth:.3f}\n')
+        return regions
@@ -0,0 +1,168 @@
+"""
+This module contains functions for reading (and writing) gzipped files as fast as the system
+allows. Python's gzip module is single-threaded and fairly slow, so if a faster option is
+available it is used instead: the python-isal package (in-process), or an igzip/pigz executable
+(through a pipe).
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gzip
+import io
+import shutil
+import subprocess
+import sys
+
+try:
+    from isal import igzip as isal_gzip
+except ImportError:
+    isal_gzip = None
+
+
+# External decompressors, in order of preference, and the command to decompress to stdout.
+EXTERNAL_DECOMPRESSORS = {'igzip': ['igzip', '-dc'],
+                          'pigz': ['pigz', '-dc']}
+
+_backend = None
+
+
+def get_gzip_backend():
+    """
+    Returns the backend used for reading gzipped files: 'isal', 'igzip', 'pigz' or 'gzip' (Python's
+    gzip module). The choice is made once and then reused.
+    """
+    global _backend
+    if _backend is None:
+        _backend = find_gzip_backend()
+    return _backend
+
+
+def find_gzip_backend():
+    if isal_gzip is not None:
+        return 'isal'
+    for name, command in EXTERNAL_DECOMPRESSORS.items():
+        if shutil.which(command[0]) is not None:
+            return name
+    return 'gzip'
+
+
+def set_gzip_backend(backend):
+    global _backend
+    assert backend in ['isal', 'gzip'] or backend in EXTERNAL_DECOMPRESSORS
+    _backend = backend
+
+
+def open_gzip(filename, mode='rt'):
+    """
+    A drop-in replacement for gzip.open, but defaulting to text mode (like the built-in open).
+    Only reading uses the faster backends - writing always uses Python's gzip module.
+    """
+    if 'r' not in mode:
+        return gzip.open(filename, mode)
+    backend = get_gzip_backend()
+    if backend == 'isal':
+        return isal_gzip.open(filename, mode)
+    if backend in EXTERNAL_DECOMPRESSORS:
+        return ExternalDecompressor(EXTERNAL_DECOMPRESSORS[backend], filename, mode)
+    return gzip.open(filename, mode)
+
+
+class ExternalDecompressor(object):
+    """
+    A read-only file object for a gzipped file, which is decompressed by an external program and
+    read through a pipe.
+    """
+    def __init__(self, command, filename, mode='rt'):
+        self.filename = filename
+        self.process = subprocess.Popen(command + [str(filename)], stdout=subprocess.PIPE)
+        if 'b' in mode:
+            self.stream = self.process.stdout
+        else:
+            self.stream = io.TextIOWrapper(self.process.stdout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    def __next__(self):
+        return next(self.stream)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def readline(self, size=-1):
+        return self.stream.readline(size)
+
+    def close(self):
+        if self.stream.closed:
+            return
+        finished = self.process.poll() is not None or not self.stream.read(1)
+        self.stream.close()
+        if not finished:  # the caller stopped reading early, so the decompressor isn't needed
+            self.process.terminate()
+        rc = self.process.wait()
+        if finished and rc != 0:
+            sys.exit(f'Error: failed to decompress {self.filename}')
+
+
+def open_gzip_for_writing(filename, threads=1):
+    """
+    Opens a gzipped file for binary writing. pigz is preferred as it compresses in parallel, then
+    python-isal, then Python's gzip module (at pigz/gzip's default level, which is much faster
+    than the module's default).
+    """
+    if shutil.which('pigz') is not None:
+        return ExternalCompressor(['pigz', '-p', str(threads), '-c'], filename)
+    if isal_gzip is not None:
+        return isal_gzip.open(filename, 'wb')
+    return gzip.open(filename, 'wb', compresslevel=6)
+
+
+class ExternalCompressor(object):
+    """
+    A write-only binary file object for a gzipped file, which is compressed by an external program
+    reading from a pipe.
+    """
+    def __init__(self, command, filename):
+        self.filename = filename
+        self.out_file = open(filename, 'wb')
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=self.out_file)
+        self.stream = self.process.stdin
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, data):
+        return self.stream.write(data)
+
+    def writelines(self, lines):
+        self.stream.writelines(lines)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        if self.stream.closed:
+            return
+        self.stream.close()
+        rc = self.process.wait()
+        self.out_file.close()
+        if rc != 0:
+            sys.exit(f'Error: failed to compress {self.filename}')
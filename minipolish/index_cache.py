@@ -0,0 +1,75 @@
+"""
+This module contains a class for building minimap2 indexes (.mmi files) and reusing them when
+minimap2 is run again on the same target sequences.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import os
+import subprocess
+import sys
+import time
+
+from .log import log
+from .metrics import run_process, timed
+
+
+MAX_CACHED_INDEXES = 2
+
+
+class IndexCache(object):
+    """
+    Indexes are keyed by a hash of the target FASTA's contents and the minimap2 preset, so an
+    index is only reused when it would be identical to a freshly built one. Only the most
+    recently used indexes are kept, as each can be large.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @timed
+    def get_index(self, fasta_filename, minimap2_preset, threads):
+        index_filename = self.cache_dir / (get_file_hash(fasta_filename)[:16] + '_' +
+                                           minimap2_preset.replace(':', '_') + '.mmi')
+        if index_filename.is_file():
+            os.utime(index_filename)
+            log(f'  index:      {index_filename} (cached)')
+            return index_filename
+
+        temp_filename = index_filename.with_name(index_filename.name + '.tmp')
+        command = ['minimap2', '-x', minimap2_preset, '-t', str(threads), '-d', str(temp_filename),
+                   str(fasta_filename)]
+        index_log = self.cache_dir / 'minimap2_index.log'
+        start = time.perf_counter()
+        with open(index_log, 'w') as stderr:
+            rc = run_process(command, 'minimap2 (index)', subprocess.DEVNULL, stderr)
+        if rc != 0:
+            sys.exit('Error: minimap2 failed to build an index')
+        os.replace(temp_filename, index_filename)
+        log(f'  index:      {index_filename} (built in {time.perf_counter() - start:.1f} s)')
+        self.remove_old_indexes()
+        return index_filename
+
+    def remove_old_indexes(self):
+        indexes = sorted(self.cache_dir.glob('*.mmi'), key=lambda f: f.stat().st_mtime,
+                         reverse=True)
+        for old_index in indexes[MAX_CACHED_INDEXES:]:
+            old_index.unlink()
+
+
+def get_file_hash(filename):
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1048576), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -13,22 +13,82 @@ details. You should have received a copy of the GNU General Public License along
 If not, see <http://www.gnu.org/licenses/>.
 """
 
+import contextlib
 import os
 import textwrap
+import threading
 import sys
 
 
+# When a thread is running a job in parallel with others, its log output is collected here so it
+# can be written in one piece (instead of interleaving with other threads' output). A thread can
+# also send its log output to a file instead of stderr (used for per-assembly logs in batch mode).
+_thread_local = threading.local()
+
+
 def log(message='', end='\n'):
-    print(message, file=sys.stderr, flush=True, end=end)
+    write_to_stderr(message, end)
 
 
 def warning(message='', end='\n'):
-    print(red(f'Warning: {message}'), file=sys.stderr, flush=True, end=end)
+    write_to_stderr(red(f'Warning: {message}'), end)
+
+
+def write_to_stderr(message, end):
+    buffer = getattr(_thread_local, 'buffer', None)
+    if buffer is not None:
+        buffer.append(f'{message}{end}')
+    else:
+        print(message, file=get_log_file(), flush=True, end=end)
+
+
+@contextlib.contextmanager
+def buffered_log():
+    """
+    Within this context, log output from the current thread is collected into a list instead of
+    being printed. The caller can then print it all at once with log_buffer.
+    """
+    _thread_local.buffer = []
+    try:
+        yield _thread_local.buffer
+    finally:
+        _thread_local.buffer = None
+
+
+def log_buffer(buffer):
+    print(''.join(buffer), file=get_log_file(), flush=True, end='')
+
+
+def get_log_file():
+    """
+    Returns where the current thread's log output goes: stderr unless log_to_file is in effect.
+    """
+    log_file = getattr(_thread_local, 'log_file', None)
+    return sys.stderr if log_file is None else log_file
+
+
+@contextlib.contextmanager
+def log_to_file(log_file):
+    """
+    Within this context, log output from the current thread is written to the given (open, text
+    mode) file instead of stderr, and it isn't buffered even if the thread's output otherwise
+    would be. Passing None leaves the log output where it was.
+    """
+    if log_file is None:
+        yield
+        return
+    previous_file = getattr(_thread_local, 'log_file', None)
+    previous_buffer = getattr(_thread_local, 'buffer', None)
+    _thread_local.log_file, _thread_local.buffer = log_file, None
+    try:
+        yield
+    finally:
+        _thread_local.log_file, _thread_local.buffer = previous_file, previous_buffer
 
 
 def section_header(text):
     log()
-    print(bold_yellow_underline(text), file=sys.stderr, flush=True)
+    write_to_stderr(bold_yellow_underline(text), '\n')
 
 
 END_FORMATTING = '\033[0m'
@@ -0,0 +1,238 @@
+"""
+This module contains functions for measuring where a Minipolish run spends its time and memory:
+wall time, CPU time and peak RSS for each stage, each child process (minimap2/Racon) and some
+Python-side functions. The results can be saved as JSON or TSV with --metrics.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import contextlib
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from .version import __version__
+
+
+class Metrics(object):
+    """
+    The measurements for one run. Normally there is just the one (module-level) collection, but
+    batch mode gives each assembly its own, so they can be saved separately.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = []
+        self.processes = []
+        self.functions = collections.OrderedDict()  # function name -> [call count, total time]
+        self.current_stage = None
+
+    def clear(self):
+        with self.lock:
+            self.stages.clear()
+            self.processes.clear()
+            self.functions.clear()
+            self.current_stage = None
+
+
+_default_metrics = Metrics()
+_thread_local = threading.local()
+
+
+def get_metrics():
+    """
+    Returns the collection that the current thread's measurements go to.
+    """
+    current = getattr(_thread_local, 'metrics', None)
+    return _default_metrics if current is None else current
+
+
+@contextlib.contextmanager
+def collect_metrics(collection):
+    """
+    Within this context, measurements made in the current thread go to the given collection
+    instead of the default one. Passing None leaves them where they were.
+    """
+    previous = getattr(_thread_local, 'metrics', None)
+    if collection is not None:
+        _thread_local.metrics = collection
+    try:
+        yield collection
+    finally:
+        _thread_local.metrics = previous
+
+
+def reset():
+    _default_metrics.clear()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Measures a stage of the run: wall time, CPU time used by Minipolish itself and by its child
+    processes, and the peak RSS so far (of Minipolish and of its largest child).
+    """
+    m = get_metrics()
+    m.current_stage = name
+    start_wall = time.perf_counter()
+    start_self, start_children = get_cpu_times()
+    try:
+        yield
+    finally:
+        end_self, end_children = get_cpu_times()
+        with m.lock:
+            m.stages.append({'name': name,
+                             'wall_time': time.perf_counter() - start_wall,
+                             'cpu_time': end_self - start_self,
+                             'children_cpu_time': end_children - start_children,
+                             'peak_rss_mb': get_peak_rss_mb(resource_self()),
+                             'children_peak_rss_mb': get_peak_rss_mb(resource_children())})
+        m.current_stage = None
+
+
+def timed(function):
+    """
+    A decorator which adds up the calls to and time spent in a Python-side function.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            m = get_metrics()
+            with m.lock:
+                totals = m.functions.setdefault(function.__name__, [0, 0.0])
+                totals[0] += 1
+                totals[1] += elapsed
+    return wrapper
+
+
+def run_process(command, name, stdout=None, stderr=None):
+    """
+    A replacement for subprocess.call which also records the process's resource usage.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=stdout, stderr=stderr)
+    return wait_for_process(process, name, command, start)
+
+
+def wait_for_process(process, name, command, start):
+    """
+    Waits for a process (started at the given perf_counter time) to finish, records its resource
+    usage and returns its exit code. Resource usage is only available if the process hasn't
+    already been waited for (e.g. by Popen.poll).
+    """
+    if hasattr(os, 'wait4') and process.returncode is None:
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = get_exit_code(status)
+        user_time, system_time = usage.ru_utime, usage.ru_stime
+        peak_rss_mb = get_peak_rss_mb(usage)
+    else:
+        process.wait()
+        user_time, system_time, peak_rss_mb = None, None, None
+    m = get_metrics()
+    with m.lock:
+        m.processes.append({'stage': m.current_stage, 'name': name,
+                            'command': ' '.join(str(c) for c in command),
+                            'wall_time': time.perf_counter() - start,
+                            'user_time': user_time, 'system_time': system_time,
+                            'peak_rss_mb': peak_rss_mb, 'exit_code': process.returncode})
+    return process.returncode
+
+
+def get_exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def get_cpu_times():
+    """
+    Returns the CPU time (user + system) used so far by this process and by its finished child
+    processes.
+    """
+    times = os.times()
+    return times.user + times.system, times.children_user + times.children_system
+
+
+def resource_self():
+    return None if resource is None else resource.getrusage(resource.RUSAGE_SELF)
+
+
+def resource_children():
+    return None if resource is None else resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def get_peak_rss_mb(usage):
+    if usage is None:
+        return None
+    if sys.platform == 'darwin':  # macOS gives ru_maxrss in bytes, Linux in kilobytes
+        return usage.ru_maxrss / 1048576
+    return usage.ru_maxrss / 1024
+
+
+def get_report(collection=None):
+    m = get_metrics() if collection is None else collection
+    with m.lock:
+        return {'version': __version__,
+                'command': ' '.join(sys.argv),
+                'stages': list(m.stages),
+                'processes': list(m.processes),
+                'functions': [{'name': name, 'calls': calls, 'time': total_time}
+                              for name, (calls, total_time) in m.functions.items()]}
+
+
+def save_metrics(filename, collection=None):
+    """
+    Saves the metrics (by default, the current thread's collection) as JSON, or as TSV (one row
+    per stage, process or function) if the filename ends in .tsv.
+    """
+    report = get_report(collection)
+    if str(filename).endswith('.tsv'):
+        columns = ['type', 'name', 'stage', 'wall_time', 'cpu_time', 'peak_rss_mb', 'calls']
+        rows = []
+        for s in report['stages']:
+            rows.append(['stage', s['name'], s['name'], s['wall_time'],
+                         s['cpu_time'] + s['children_cpu_time'], s['peak_rss_mb'], ''])
+        for p in report['processes']:
+            cpu_time = None if p['user_time'] is None else p['user_time'] + p['system_time']
+            rows.append(['process', p['name'], p['stage'], p['wall_time'], cpu_time,
+                         p['peak_rss_mb'], ''])
+        for f in report['functions']:
+            rows.append(['function', f['name'], '', f['time'], '', '', f['calls']])
+        with open(filename, 'wt') as tsv:
+            tsv.write('\t'.join(columns) + '\n')
+            for row in rows:
+                tsv.write('\t'.join(format_tsv_value(v) for v in row) + '\n')
+    else:
+        with open(filename, 'wt') as json_file:
+            json.dump(report, json_file, indent=2)
+            json_file.write('\n')
+
+
+def format_tsv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f'{value:.3f}'
+    return str(value)
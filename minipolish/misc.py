@@ -12,13 +12,20 @@ details. You should have received a copy of the GNU General Public License along
 If not, see <http://www.gnu.org/licenses/>.
 """
 
+import array
 import gzip
+import itertools
 import multiprocessing
+import operator
 import os
 import shutil
 import subprocess
 import sys
 
+from .decompress import open_gzip
+from .metrics import timed
+from .tool_cache import get_cached_version, save_cached_version
+
 
 def get_compression_type(filename):
     """
@@ -46,7 +53,7 @@ def get_compression_type(filename):
 
 def get_open_func(filename):
     if get_compression_type(filename) == 'gz':
-        return gzip.open
+        return open_gzip
     else:  # plain text
         return open
 
@@ -74,90 +81,203 @@ def get_sequence_file_type(filename):
         raise ValueError('File is neither FASTA or FASTQ')
 
 
+# Sequence files are read in chunks of this size (or larger, if a line doesn't fit).
+SEQUENCE_CHUNK_SIZE = 1048576
+
+
+def iterate_sequence_batches(filename, file_type, positions=False,
+                             chunk_size=SEQUENCE_CHUNK_SIZE):
+    """
+    A fast bytes-based FASTQ/FASTA parser. The file is read in large chunks which are split into
+    records with C-level bytes and list operations, so there's very little Python work per line.
+    Yields one batch per chunk, each a dictionary of column name -> values like
+    iterate_paf_batches:
+      * 'name', 'sequence', 'quality': lists of bytes ('quality' is None for FASTA)
+      * 'start', 'end': arrays of each record's byte positions in the uncompressed file (None
+        unless positions is True, as working them out is a large part of the parsing time)
+    FASTA sequences have their line breaks removed but keep their case.
+    """
+    with get_open_func(filename)(filename, 'rb') as seq_file:
+        if file_type == 'FASTQ':
+            batches = iterate_fastq_batches(seq_file, positions, chunk_size)
+        else:
+            batches = iterate_fasta_batches(seq_file, positions, chunk_size)
+        for batch in batches:
+            if batch is None:
+                sys.exit(f'Error: {filename} ends with an incomplete record')
+            yield batch
+
+
+def iterate_fastq_batches(fastq, positions, chunk_size):
+    lines = [b'']  # lines not yet parsed, the last of which may continue in the next chunk
+    position, bytes_read, read_size = 0, 0, chunk_size
+    while True:
+        chunk = fastq.read(read_size)
+        bytes_read += len(chunk)
+        new_lines = chunk.split(b'\n')
+        new_lines[0] = lines.pop() + new_lines[0]
+        lines += new_lines
+        partial = lines.pop() if chunk else b''
+        if not chunk:
+            while lines and not lines[-1]:  # blank lines at the end of the file
+                lines.pop()
+        batch, parsed_count, position = parse_fastq_lines(lines, position, positions)
+        if batch['name']:
+            if positions and not chunk:  # the file may not end in a newline
+                batch['end'][-1] = min(batch['end'][-1], bytes_read)
+            yield batch
+        del lines[:parsed_count]
+        if not chunk:
+            if any(line.strip() for line in lines):
+                yield None
+            return
+        lines.append(partial)
+
+        # A line which doesn't fit in a chunk gets a bigger read next time, so very long reads
+        # don't need many small reads (each of which recopies the line so far).
+        read_size = chunk_size if len(new_lines) > 1 else max(chunk_size, len(lines[-1]))
+
+
+def parse_fastq_lines(lines, position, positions):
+    """
+    Parses as many FASTQ records as possible from a list of complete lines, returning them, the
+    number of lines used and the file position after them. Most files have exactly four lines per
+    record, which lets the columns be taken with list slicing. Anything else (blank lines, Windows
+    line endings) goes to the slower parse_fastq_lines_one_by_one.
+    """
+    count = len(lines) // 4
+    headers, sequences = lines[0:count * 4:4], lines[1:count * 4:4]
+    pluses, qualities = lines[2:count * 4:4], lines[3:count * 4:4]
+    joined_headers = b'\n'.join(headers)
+    if not (joined_headers.startswith(b'@') and
+            joined_headers.count(b'\n@') == count - 1 and b'\r' not in joined_headers and
+            (pluses.count(b'+') == count or
+             all(map(bytes.startswith, pluses, itertools.repeat(b'+'))))):
+        return parse_fastq_lines_one_by_one(lines, position, positions)
+    names = list(map(operator.itemgetter(0), map(bytes.split, joined_headers[1:].split(b'\n@'))))
+    batch = {'name': names, 'sequence': sequences, 'quality': qualities,
+             'start': None, 'end': None}
+    if positions:
+        record_lengths = map(sum, zip(map(len, headers), map(len, sequences), map(len, pluses),
+                                      map(len, qualities), itertools.repeat(4)))
+        ends = array.array('Q', itertools.accumulate(itertools.chain([position], record_lengths)))
+        batch['start'], batch['end'] = ends[:-1], ends[1:]
+        position = ends[-1]
+    return batch, count * 4, position
+
+
+def parse_fastq_lines_one_by_one(lines, position, positions):
+    batch = {'name': [], 'sequence': [], 'quality': [],
+             'start': array.array('Q') if positions else None,
+             'end': array.array('Q') if positions else None}
+    i = 0
+    while i < len(lines):
+        if not lines[i].startswith(b'@'):  # not part of a record, e.g. a blank line
+            position += len(lines[i]) + 1
+            i += 1
+            continue
+        if i + 4 > len(lines):
+            break
+        header, sequence, plus, qualities = lines[i:i + 4]
+        batch['name'].append(header[1:].split(None, 1)[0])
+        batch['sequence'].append(sequence.strip())
+        batch['quality'].append(qualities.strip())
+        record_length = len(header) + len(sequence) + len(plus) + len(qualities) + 4
+        if positions:
+            batch['start'].append(position)
+            batch['end'].append(position + record_length)
+        position += record_length
+        i += 4
+    return batch, i, position
+
+
+def iterate_fasta_batches(fasta, positions, chunk_size):
+    buffer, buffer_start, read_size = b'', 0, chunk_size
+    while True:
+        chunk = fasta.read(read_size)
+        buffer = buffer + chunk if buffer else chunk
+        batch, parsed_to = parse_fasta_buffer(buffer, buffer_start, positions, not chunk)
+        if batch['name']:
+            yield batch
+        if not chunk:
+            return
+        buffer = buffer[parsed_to:]
+        buffer_start += parsed_to
+        read_size = chunk_size if batch['name'] else max(chunk_size, len(buffer))
+
+
+def parse_fasta_buffer(buffer, buffer_start, positions, at_end):
+    """
+    Parses the complete FASTA records in the buffer, returning them and the position up to which
+    the buffer was parsed. A record is only known to be complete when the next one starts, so the
+    last record is left for the next chunk (unless this is the end of the file).
+    """
+    pieces = buffer.split(b'\n>')  # each piece is one record, minus its leading '>'
+    if pieces[0].startswith(b'>'):
+        pieces[0] = pieces[0][1:]
+        parsed_to = 0
+    else:  # something before the first record
+        parsed_to = len(pieces.pop(0)) + 1
+    if not at_end and pieces:
+        pieces.pop()
+    records = list(map(bytes.partition, pieces, itertools.repeat(b'\n')))
+    batch = {'name': [header.split(None, 1)[0] for header, _, _ in records],
+             'sequence': [b''.join(seq.split()) for _, _, seq in records], 'quality': None,
+             'start': None, 'end': None}
+    ends = array.array('Q', itertools.accumulate(itertools.chain(
+        [parsed_to], map(operator.add, map(len, pieces), itertools.repeat(2)))))
+    parsed_to = min(ends[-1], len(buffer))  # the last record may have no newline after it
+    if positions:
+        ends[-1] = parsed_to
+        batch['start'] = array.array('Q', (buffer_start + e for e in ends[:-1]))
+        batch['end'] = array.array('Q', (buffer_start + e for e in ends[1:]))
+    return batch, parsed_to
+
+
 def iterate_fastq(filename):
     if get_sequence_file_type(filename) != 'FASTQ':
         sys.exit('Error: {} is not FASTQ format'.format(filename))
-    with get_open_func(filename)(filename, 'rt') as fastq:
-        for line in fastq:
-            line = line.strip()
-            if len(line) == 0:
-                continue
-            if not line.startswith('@'):
-                continue
-            name = line[1:].split()[0]
-            sequence = next(fastq).strip()
-            _ = next(fastq)
-            qualities = next(fastq).strip()
-            yield name, sequence, qualities
+    for batch in iterate_sequence_batches(filename, 'FASTQ'):
+        yield from zip(map(bytes.decode, batch['name']), map(bytes.decode, batch['sequence']),
+                       map(bytes.decode, batch['quality']))
 
 
 def iterate_fasta(filename):
     if get_sequence_file_type(filename) != 'FASTA':
         sys.exit('Error: {} is not FASTA format'.format(filename))
-    with get_open_func(filename)(filename, 'rt') as fasta_file:
-        name = ''
-        sequence = []
-        for line in fasta_file:
-            line = line.strip()
-            if not line:
-                continue
-            if line[0] == '>':  # Header line = start of new contig
-                if name:
-                    name_parts = name.split(maxsplit=1)
-                    contig_name = name_parts[0]
-                    yield contig_name, ''.join(sequence)
-                    sequence = []
-                name = line[1:]
-            else:
-                sequence.append(line.upper())
-        if name:
-            name_parts = name.split(maxsplit=1)
-            contig_name = name_parts[0]
-            yield contig_name, ''.join(sequence)
+    for batch in iterate_sequence_batches(filename, 'FASTA'):
+        yield from zip(map(bytes.decode, batch['name']),
+                       (seq.upper().decode() for seq in batch['sequence']))
 
 
+@timed
 def count_reads(filename):
-    count = 0
-    if get_sequence_file_type(filename) == 'FASTA':
-        for _ in iterate_fasta(filename):
-            count += 1
-    elif get_sequence_file_type(filename) == 'FASTQ':
-        for _ in iterate_fastq(filename):
-            count += 1
-    else:
+    file_type = get_sequence_file_type(filename)
+    if file_type != 'FASTA' and file_type != 'FASTQ':
         sys.exit('Error: {} is not FASTA/FASTQ format'.format(filename))
-    return count
+    return sum(len(batch['name']) for batch in iterate_sequence_batches(filename, file_type))
 
 
 def load_fasta(fasta_filename):
-    if get_compression_type(fasta_filename) == 'gz':
-        open_func = gzip.open
-    else:  # plain text
-        open_func = open
-    fasta_seqs = []
-    with open_func(fasta_filename, 'rt') as fasta_file:
-        name = ''
-        sequence = []
-        for line in fasta_file:
-            line = line.strip()
-            if not line:
-                continue
-            if line[0] == '>':  # Header line = start of new contig
-                if name:
-                    fasta_seqs.append((name.split()[0], ''.join(sequence)))
-                    sequence = []
-                name = line[1:]
-            else:
-                sequence.append(line)
-        if name:
-            fasta_seqs.append((name.split()[0], ''.join(sequence)))
-    return fasta_seqs
+    return list(read_fasta(fasta_filename))
 
 
+def read_fasta(fasta_filename):
+    """
+    Yields (name, sequence) for each record in a FASTA file. Unlike iterate_fasta, this doesn't
+    check the file type or change the sequence's case.
+    """
+    for batch in iterate_sequence_batches(fasta_filename, 'FASTA'):
+        yield from zip(map(bytes.decode, batch['name']), map(bytes.decode, batch['sequence']))
+
+
+@timed
 def count_fasta_bases(fasta_filename):
-    return sum(len(seq) for _, seq in load_fasta(fasta_filename))
+    return sum(sum(map(len, batch['sequence']))
+               for batch in iterate_sequence_batches(fasta_filename, 'FASTA'))
 
 
+@timed
 def count_lines(filename):
     with open(filename, 'rt') as file_to_count:
         num_lines = sum(1 for _ in file_to_count)
@@ -179,30 +299,36 @@ def weighted_average(nums, weights):
     return sum(num * (weights[i] / weight_sum) for i, num in enumerate(nums))
 
 
-def racon_path_and_version(racon_path):
-    found_racon_path = shutil.which(racon_path)
-    if found_racon_path is None:
-        return racon_path, '', 'not found'
-    command = [found_racon_path]
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    out, _ = process.communicate()
-    out = out.decode().lower()
-    if 'racon' not in out or 'options' not in out:
-        return found_racon_path, '-', 'bad'
-    return found_racon_path, racon_or_minimap2_version(found_racon_path), 'good'
+def racon_path_and_version(racon_path, use_cache=False):
+    return tool_path_and_version('racon', racon_path, use_cache)
+
 
+def minimap2_path_and_version(minimap2_path, use_cache=False):
+    return tool_path_and_version('minimap2', minimap2_path, use_cache)
 
-def minimap2_path_and_version(minimap2_path):
-    found_minimap2_path = shutil.which(minimap2_path)
-    if found_minimap2_path is None:
-        return minimap2_path, '', 'not found'
-    command = [found_minimap2_path]
+
+def tool_path_and_version(tool_name, tool_path, use_cache=False):
+    """
+    Finds a tool (racon or minimap2), checks that it runs and gets its version. Versions are saved
+    to the tool cache, and if use_cache is True, a cached version (for an unchanged binary) is used
+    instead of running the tool.
+    """
+    found_tool_path = shutil.which(tool_path)
+    if found_tool_path is None:
+        return tool_path, '', 'not found'
+    if use_cache:
+        version = get_cached_version(tool_name, found_tool_path)
+        if version is not None:
+            return found_tool_path, version, 'good'
+    command = [found_tool_path]
     process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
     out, _ = process.communicate()
     out = out.decode().lower()
-    if 'minimap2' not in out or 'options' not in out:
-        return found_minimap2_path, '-', 'bad'
-    return found_minimap2_path, racon_or_minimap2_version(found_minimap2_path), 'good'
+    if tool_name not in out or 'options' not in out:
+        return found_tool_path, '-', 'bad'
+    version = racon_or_minimap2_version(found_tool_path)
+    save_cached_version(tool_name, found_tool_path, version)
+    return found_tool_path, version, 'good'
 
 
 def racon_or_minimap2_version(tool_path):
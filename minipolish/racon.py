@@ -12,59 +12,137 @@ details. You should have received a copy of the GNU General Public License along
 If not, see <http://www.gnu.org/licenses/>.
 """
 
+import concurrent.futures
 import edlib
+import errno
+import os
 import subprocess
 import sys
+import time
 
+from .alignment import iterate_minimap2_output
 from .log import log
-from .misc import count_reads, load_fasta, count_fasta_bases, count_lines
+from .metrics import run_process, wait_for_process, timed
+from .misc import count_reads, read_fasta, count_lines, iterate_fasta_batches, \
+    SEQUENCE_CHUNK_SIZE
 
 
 RACON_PATCH_SIZE = 250
 
+# When alignments are filtered to each read's own sequences, minimap2 is asked for all secondary
+# alignments (its defaults only report up to 5, within 80% of the primary's score), so a read's
+# alignment to its own sequence isn't lost when it aligns better elsewhere.
+FILTERED_SECONDARY_OPTIONS = ['-N', '50', '-p', '0']
 
-def run_racon(name, read_filename, unpolished_filename, threads, tmp_dir, minimap2_preset):
+
+def run_racon(name, read_filename, unpolished_filename, threads, tmp_dir, minimap2_preset,
+              read_count=None, allowed_alignments=None, stream_alignments=False,
+              index_cache=None, read_subsampler=None, unpolished_seqs=None, align_to=None):
+    """
+    Aligns reads to the unpolished sequences with minimap2 and then polishes them with Racon. If
+    the read count is already known (e.g. from a ReadIndex), it can be given to save a pass over
+    the read file.
+
+    If allowed_alignments (a dictionary of read name -> sequence names) is given, alignments are
+    filtered so each read is only used to polish the sequences it is allowed to align to. Since
+    the wanted alignment may not be a read's best, minimap2 reports more secondary alignments in
+    this case.
+
+    If stream_alignments is True, minimap2's alignments are passed to Racon through a named pipe
+    instead of a PAF file, so they never touch the disk.
+
+    If an IndexCache is given, minimap2 uses a prebuilt index of the unpolished sequences (built
+    now, or reused if these exact sequences were indexed before).
+
+    If a ReadSubsampler is given, it is shown each alignment (before any filtering).
+
+    If align_to is given (a FASTA of the unpolished sequences plus others), the reads are aligned
+    to all of its sequences, but only alignments to the unpolished sequences go to Racon. This
+    keeps reads which belong to the other sequences (e.g. other copies of a repeat) from being
+    used to polish these ones.
+
+    The unpolished sequences (a dictionary of name -> sequence, matching the unpolished FASTA)
+    can be given if they are already in memory, which saves reading the FASTA back in. Racon's
+    output is parsed as it runs, so the polished sequences never go to disk.
+    """
     if name is None:
         name = unpolished_filename
-    read_count = count_reads(read_filename)
+    if unpolished_seqs is None:
+        unpolished_seqs = get_unpolished_sequences(unpolished_filename)
+    if read_count is None:
+        read_count = count_reads(read_filename)
     if read_count < 1:
         log(f'Skipping Racon for {name} (not enough reads)')
-        return get_unpolished_sequences(unpolished_filename)
+        return dict(unpolished_seqs)
 
     log(f'Running Racon on {name}:')
     log(f'  reads:      {read_filename} ({read_count:,} reads)')
 
-    unpolished_base_count = count_fasta_bases(unpolished_filename)
+    unpolished_base_count = sum(len(seq) for seq in unpolished_seqs.values())
     log(f'  input:      {unpolished_filename} ({unpolished_base_count:,} bp)')
 
-    # Align with minimap2
-    command = ['minimap2', '-t', str(threads), '-x', minimap2_preset,
-               unpolished_filename, read_filename]
-    alignments = tmp_dir / (name + '.paf')
+    allowed_targets = None
+    if align_to is None:
+        align_to = unpolished_filename
+    else:
+        allowed_targets = set(unpolished_seqs)
+        log(f'  align to:   {align_to}')
+    if index_cache is None:
+        minimap2_target = align_to
+    else:
+        minimap2_target = index_cache.get_index(align_to, minimap2_preset, threads)
+    minimap2_command = ['minimap2', '-t', str(threads), '-x', minimap2_preset]
+    if allowed_alignments is not None:
+        minimap2_command += FILTERED_SECONDARY_OPTIONS
+    minimap2_command += [minimap2_target, read_filename]
     minimap2_log = tmp_dir / (name + '_minimap2.log')
-    with open(alignments, 'wt') as stdout, open(minimap2_log, 'w') as stderr:
-        rc = subprocess.call(command, stdout=stdout, stderr=stderr)
-    if rc != 0:
-        sys.exit('Error: minimap2 failed')
-    alignment_count = count_lines(alignments)
-    log(f'  alignments: {alignments} ({alignment_count:,} alignments)')
-    if alignment_count == 0:
-        sys.exit(f'\nError: minimap2 produced no alignments for {name}.')
-
-    # Polish with Racon
-    polished_filename = tmp_dir / (name + '_polished.fasta')
-    command = ['racon', '-t', str(threads), read_filename, str(alignments), unpolished_filename]
+    alignments = tmp_dir / (name + '.paf')
+    racon_command = ['racon', '-t', str(threads), read_filename, str(alignments),
+                     unpolished_filename]
     racon_log = tmp_dir / (name + '_racon.log')
-    with open(polished_filename, 'wt') as stdout, open(racon_log, 'w') as stderr:
-        rc = subprocess.call(command, stdout=stdout, stderr=stderr)
+
+    if stream_alignments:
+        alignment_count, polished_seqs, rc = \
+            run_minimap2_into_racon(name, minimap2_command, minimap2_log, racon_command,
+                                    racon_log, alignments, allowed_alignments, read_subsampler,
+                                    allowed_targets)
+        log(f'  alignments: {alignment_count:,} alignments (streamed to Racon)')
+        if rc != 0:  # Racon may have quit before reading any alignments, so check this first
+            sys.exit('Error: racon failed')
+        if alignment_count == 0:
+            sys.exit(f'\nError: minimap2 produced no alignments for {name}.')
+
+    else:
+        # Align with minimap2
+        with open(alignments, 'wt') as stdout, open(minimap2_log, 'w') as stderr:
+            rc = run_process(minimap2_command, f'minimap2 ({name})', stdout, stderr)
+        if rc != 0:
+            sys.exit('Error: minimap2 failed')
+        filtering = allowed_alignments is not None or allowed_targets is not None
+        if filtering or read_subsampler is not None:  # one pass to filter, subsample and count
+            filtered = tmp_dir / (name + '_filtered.paf') if filtering else None
+            alignment_count = filter_alignments(alignments, filtered, allowed_alignments,
+                                                allowed_targets, read_subsampler)
+            if filtering:
+                alignments = filtered
+                racon_command[4] = str(alignments)
+        else:
+            alignment_count = count_lines(alignments)
+        log(f'  alignments: {alignments} ({alignment_count:,} alignments)')
+        if alignment_count == 0:
+            sys.exit(f'\nError: minimap2 produced no alignments for {name}.')
+
+        # Polish with Racon
+        polished_seqs, rc = run_racon_process(racon_command, f'racon ({name})', racon_log)
+
     if rc != 0:
         sys.exit('Error: racon failed')
-    polished_base_count = count_fasta_bases(polished_filename)
-    log(f'  output:     {polished_filename} ({polished_base_count:,} bp)')
+    polished_base_count = sum(len(seq) for seq in polished_seqs.values())
+    log(f'  output:     {polished_base_count:,} bp')
     if polished_base_count == 0:
         sys.exit(f'\nError: Racon produced an empty output for {name}.')
 
-    fixed_seqs = fix_sequence_ends(unpolished_filename, polished_filename)
+    fixed_seqs = fix_sequence_ends(unpolished_seqs, polished_seqs, threads)
     fixed_base_count = sum(len(seq) for seq in fixed_seqs.values())
     if fixed_base_count > polished_base_count:
         log(f'  fix ends:   {polished_base_count:,} bp -> {fixed_base_count:,} bp')
@@ -72,28 +150,172 @@ def run_racon(name, read_filename, unpolished_filename, threads, tmp_dir, minima
     return fixed_seqs
 
 
-def fix_sequence_ends(before_fasta, after_fasta):
+def run_racon_process(racon_command, name, racon_log):
     """
-    Racon can sometimes drop the ends of sequences when polishing, so this function does some
-    alignments and patches this up when it happens.
+    Runs Racon and parses the polished sequences from its stdout as they come. Returns a
+    dictionary of name -> polished sequence and Racon's exit code.
+    """
+    with open(racon_log, 'w') as stderr:
+        racon_start = time.perf_counter()
+        racon = subprocess.Popen(racon_command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            polished_seqs = read_polished_sequences(racon.stdout)
+        except BaseException:
+            racon.kill()
+            raise
+        finally:
+            racon.stdout.close()
+        rc = wait_for_process(racon, name, racon_command, racon_start)
+    return polished_seqs, rc
+
+
+def read_polished_sequences(racon_stdout):
+    """
+    Parses Racon's FASTA output into a dictionary of name -> sequence. Racon adds tags after each
+    name (e.g. LN:i:), but only the first word of the header is used.
+    """
+    polished_seqs = {}
+    for batch in iterate_fasta_batches(racon_stdout, False, SEQUENCE_CHUNK_SIZE):
+        polished_seqs.update(zip(map(bytes.decode, batch['name']),
+                                 map(bytes.decode, batch['sequence'])))
+    return polished_seqs
+
+
+def run_minimap2_into_racon(name, minimap2_command, minimap2_log, racon_command, racon_log,
+                            fifo, allowed_alignments, read_subsampler=None,
+                            allowed_targets=None):
+    """
+    Runs minimap2 and Racon at the same time, with minimap2's alignments going to Racon through
+    a named pipe (at the path Racon expects the PAF file). The alignments are counted (and
+    filtered, if necessary) as they pass through, and Racon's output is parsed (in another
+    thread) as it comes. Returns the alignment count, the polished sequences and Racon's exit
+    code.
     """
-    before_contigs = load_fasta(before_fasta)
-    after_contigs = load_fasta(after_fasta)
+    if fifo.exists():  # left behind by an interrupted run in the same work directory
+        fifo.unlink()
+    os.mkfifo(fifo)
+    alignment_count = 0
+    with open(racon_log, 'w') as stderr, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        racon_start = time.perf_counter()
+        racon = subprocess.Popen(racon_command, stdout=subprocess.PIPE, stderr=stderr)
+        output = executor.submit(read_polished_sequences, racon.stdout)
+        try:
+            fifo_fd = open_fifo_for_writing(fifo, racon)
+            if fifo_fd is not None:
+                with open(fifo_fd, 'wt') as paf:
+                    for line in iterate_minimap2_output(minimap2_command, minimap2_log,
+                                                        name=f'minimap2 ({name})'):
+                        if read_subsampler is not None:
+                            read_subsampler.add_alignment(line)
+                        if (allowed_alignments is None and allowed_targets is None) or \
+                                is_allowed_alignment(line, allowed_alignments, allowed_targets):
+                            paf.write(line)
+                            alignment_count += 1
+        except BrokenPipeError:  # Racon quit early - its exit code will say why
+            pass
+        except BaseException:
+            racon.kill()
+            raise
+        finally:
+            fifo.unlink()
+        try:
+            polished_seqs = output.result()
+        finally:
+            racon.stdout.close()
+        rc = wait_for_process(racon, f'racon ({name})', racon_command, racon_start)
+    return alignment_count, polished_seqs, rc
 
+
+def open_fifo_for_writing(fifo, reader_process):
+    """
+    Opens a named pipe for writing once the reader has opened it, returning its file descriptor.
+    Returns None if the reader process exits before opening the pipe (so we don't block
+    forever).
+    """
+    while True:
+        try:
+            fd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            if e.errno != errno.ENXIO:  # ENXIO means no reader yet
+                raise
+            if reader_process.poll() is not None:
+                return None
+            time.sleep(0.01)
+            continue
+        os.set_blocking(fd, True)
+        return fd
+
+
+@timed
+def filter_alignments(in_filename, out_filename, allowed_alignments, allowed_targets=None,
+                      read_subsampler=None):
+    """
+    Copies PAF lines to a new file, keeping only those where the read is allowed to align to the
+    reference, and returns how many were kept. If a ReadSubsampler is given, it is shown every
+    alignment (before filtering) in the same pass. Without an output file (or any filters), the
+    alignments are just counted and shown to the subsampler.
+    """
+    filtering = allowed_alignments is not None or allowed_targets is not None
+    count = 0
+    with open(in_filename, 'rt') as in_file, \
+            open(out_filename if out_filename is not None else os.devnull, 'wt') as out_file:
+        for line in in_file:
+            if read_subsampler is not None:
+                read_subsampler.add_alignment(line)
+            if not filtering or is_allowed_alignment(line, allowed_alignments, allowed_targets):
+                if out_filename is not None:
+                    out_file.write(line)
+                count += 1
+    return count
+
+
+def is_allowed_alignment(paf_line, allowed_alignments, allowed_targets=None):
+    """
+    Checks whether a PAF line's read (column 1) is allowed to align to its reference (column 6).
+    Either check can be skipped: allowed_alignments (read name -> sequence names) limits each
+    read to its own sequences, and allowed_targets (sequence names) limits all reads.
+    """
+    parts = paf_line.split('\t', 6)
+    if len(parts) <= 5:
+        return False
+    if allowed_targets is not None and parts[5] not in allowed_targets:
+        return False
+    return allowed_alignments is None or parts[5] in allowed_alignments.get(parts[0], ())
+
+
+@timed
+def fix_sequence_ends(before_seqs, after_seqs, threads=1):
+    """
+    Racon can sometimes drop the ends of sequences when polishing, so this function does some
+    alignments and patches this up when it happens. The alignments for different contigs are
+    independent, so they are spread over multiple threads.
+
+    The sequences are given as dictionaries of name -> sequence, and the result is in the same
+    order as before_seqs.
+    """
     # There should be a one-to-one relationship between the before and after contig names, with the
     # caveat that a contig may be missing in the after group.
-    before_names = [x[0] for x in before_contigs]
-    after_names = [x[0] for x in after_contigs]
-    assert all(a in before_names for a in after_names)
-
+    assert all(name in before_seqs for name in after_seqs)
+    names, matched_before_seqs, matched_after_seqs = [], [], []
     fixed_seqs = {}
-    for before_name, before_seq in before_contigs:
-        if before_name not in after_names:
-            fixed_seq = ''
-        else:
-            after_seq = [x for x in after_contigs if x[0] == before_name][0][1]
-            fixed_seq = fix_sequence_ends_one_pair(before_seq, after_seq)
-        fixed_seqs[before_name] = fixed_seq
+    for before_name, before_seq in before_seqs.items():
+        after_seq = after_seqs.get(before_name)
+        fixed_seqs[before_name] = ''
+        if after_seq is not None:
+            names.append(before_name)
+            matched_before_seqs.append(before_seq)
+            matched_after_seqs.append(after_seq)
+
+    if threads > 1 and len(names) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(fix_sequence_ends_one_pair, matched_before_seqs,
+                                        matched_after_seqs))
+    else:
+        results = [fix_sequence_ends_one_pair(b, a)
+                   for b, a in zip(matched_before_seqs, matched_after_seqs)]
+    for name, fixed_seq in zip(names, results):
+        fixed_seqs[name] = fixed_seq
     return fixed_seqs
 
 
@@ -121,4 +343,30 @@ def fix_sequence_ends_one_pair(before_seq, after_seq):
 
 
 def get_unpolished_sequences(unpolished_filename):
-    return {name: seq for name, seq in load_fasta(unpolished_filename)}
+    return dict(read_fasta(unpolished_filename))
+
+
+@timed
+def get_converged_sequences(before_seqs, after_seqs, convergence, threads=1):
+    """
+    Returns the names of the sequences which a polishing round changed by less than the given
+    fraction of their length (measured by edit distance). Since we only need to know whether the
+    distance is under the limit, edlib can stop early for sequences which changed more.
+    """
+    names = [n for n, seq in after_seqs.items() if n in before_seqs and len(seq) > 0]
+    before = [before_seqs[n] for n in names]
+    after = [after_seqs[n] for n in names]
+    limits = [int(len(seq) * convergence) for seq in before]
+    if threads > 1 and len(names) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(has_converged, before, after, limits))
+    else:
+        results = [has_converged(b, a, k) for b, a, k in zip(before, after, limits)]
+    return set(n for n, converged in zip(names, results) if converged)
+
+
+def has_converged(before_seq, after_seq, max_changes):
+    if abs(len(before_seq) - len(after_seq)) > max_changes:
+        return False
+    result = edlib.align(after_seq, before_seq, mode='NW', task='distance', k=max_changes)
+    return result['editDistance'] != -1
@@ -0,0 +1,84 @@
+"""
+This module contains a class for indexing a long-read file (FASTA or FASTQ, optionally gzipped) in
+a single pass, so the rest of Minipolish doesn't need to re-read the file just to count its reads.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import array
+import sys
+
+from .log import log, section_header, explanation
+from .misc import get_compression_type, get_open_func, get_sequence_file_type, \
+    iterate_sequence_batches
+
+
+class ReadIndex(object):
+    """
+    Holds the format, compression, read count, total bases and per-read byte offsets of a read
+    file. Offsets are in the uncompressed stream, so for gzipped files they refer to positions
+    in the decompressed data.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.compression = get_compression_type(filename)
+        self.file_type = get_sequence_file_type(filename)
+        self.names = []
+        self.offsets = array.array('Q')  # start of each record, plus the end of the last one
+        self.base_count = 0
+        if self.file_type != 'FASTQ' and self.file_type != 'FASTA':
+            sys.exit('Error: {} is not FASTA/FASTQ format'.format(filename))
+        end = 0
+        for batch in iterate_sequence_batches(filename, self.file_type, positions=True):
+            self.names.extend(map(bytes.decode, batch['name']))
+            self.offsets.extend(batch['start'])
+            self.base_count += sum(map(len, batch['sequence']))
+            end = batch['end'][-1]
+        self.offsets.append(end)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def read_count(self):
+        return len(self.names)
+
+    def get_extension(self):
+        return '.fastq' if self.file_type == 'FASTQ' else '.fasta'
+
+    def get_record_span(self, i):
+        """
+        Returns the (start, end) byte positions of the i-th record in the uncompressed file.
+        """
+        return self.offsets[i], self.offsets[i + 1]
+
+    def iterate_records(self):
+        """
+        Yields (read name, raw record bytes) for each read, in file order. The raw record is
+        exactly as it appears in the (uncompressed) file, so it can be written elsewhere without
+        any parsing or reformatting.
+        """
+        with get_open_func(self.filename)(self.filename, 'rb') as read_file:
+            read_file.read(self.offsets[0])  # skip anything before the first record
+            for i, name in enumerate(self.names):
+                yield name, read_file.read(self.offsets[i + 1] - self.offsets[i])
+
+
+def load_read_index(filename):
+    section_header('Indexing reads')
+    explanation('The reads are scanned once to get their count, size and file positions, which '
+                'are then reused throughout polishing.')
+    log(filename)
+    read_index = ReadIndex(filename)
+    log(f'  {read_index.read_count:,} reads ({read_index.base_count:,} bp)')
+    log()
+    return read_index
@@ -0,0 +1,163 @@
+"""
+This module contains classes for writing reads out to per-segment files (for the initial
+polishing round) without opening and closing a file for every read.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import gzip
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+BLOCK_SIZE = 1048576  # per-segment reads are buffered in memory until they reach this size
+MAX_BUFFERED_BYTES = 268435456  # when all buffers together reach this size, they are flushed
+
+_concurrent_runs = 1
+
+
+class ReadSplitter(object):
+    """
+    Writes reads to one file per segment. Reads are buffered in memory and written in large
+    blocks, and the output files are kept in a pool of open handles (least recently used handles
+    are closed when the pool is full) so we stay well within the open file limit.
+    """
+    def __init__(self, tmp_dir, extension, compress=False, max_open_files=None):
+        self.tmp_dir = tmp_dir
+        self.extension = extension + '.gz' if compress else extension
+        self.compress = compress
+        if max_open_files is None:
+            max_open_files = get_max_open_files()
+        self.max_open_files = max(1, max_open_files)
+        self.buffers = collections.defaultdict(list)
+        self.buffer_sizes = collections.Counter()
+        self.total_buffered = 0
+        self.handles = collections.OrderedDict()  # segment name -> open file, in LRU order
+        self.created = set()  # segment names whose file has been created (later opens append)
+        self.read_counts = collections.Counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_filename(self, seg_name):
+        return self.tmp_dir / (seg_name + self.extension)
+
+    def add_read(self, seg_name, record):
+        self.buffers[seg_name].append(record)
+        self.buffer_sizes[seg_name] += len(record)
+        self.total_buffered += len(record)
+        self.read_counts[seg_name] += 1
+        if self.buffer_sizes[seg_name] >= BLOCK_SIZE:
+            self.flush(seg_name)
+        elif self.total_buffered >= MAX_BUFFERED_BYTES:
+            self.flush_all()
+
+    def flush(self, seg_name):
+        if not self.buffers[seg_name]:
+            return
+        self.get_handle(seg_name).write(b''.join(self.buffers[seg_name]))
+        self.total_buffered -= self.buffer_sizes[seg_name]
+        del self.buffers[seg_name]
+        del self.buffer_sizes[seg_name]
+
+    def flush_all(self):
+        for seg_name in list(self.buffers.keys()):
+            self.flush(seg_name)
+
+    def get_handle(self, seg_name):
+        if seg_name in self.handles:
+            self.handles.move_to_end(seg_name)
+            return self.handles[seg_name]
+        while len(self.handles) >= self.max_open_files:
+            _, oldest = self.handles.popitem(last=False)
+            oldest.close()
+        mode = 'ab' if seg_name in self.created else 'wb'
+        filename = self.get_filename(seg_name)
+        handle = gzip.open(filename, mode, compresslevel=1) if self.compress \
+            else open(filename, mode)
+        self.created.add(seg_name)
+        self.handles[seg_name] = handle
+        return handle
+
+    def close(self):
+        self.flush_all()
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+
+
+class CombinedReadWriter(object):
+    """
+    Writes each read once to a single file and keeps a manifest of where each read is in that
+    file and which segments it belongs to, as an alternative to thousands of per-segment files.
+    """
+    def __init__(self, filename, manifest_filename, compress=False):
+        self.filename = filename
+        self.manifest_filename = manifest_filename
+        self.file = gzip.open(filename, 'wb', compresslevel=1) if compress \
+            else open(filename, 'wb')
+        self.manifest = []  # (read name, byte offset, byte length, segment names)
+        self.offset = 0
+        self.seg_read_counts = collections.Counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def read_count(self):
+        return len(self.manifest)
+
+    def add_read(self, read_name, seg_names, record):
+        self.file.write(record)
+        self.manifest.append((read_name, self.offset, len(record), seg_names))
+        self.offset += len(record)
+        self.seg_read_counts.update(seg_names)
+
+    def close(self):
+        self.file.close()
+        with open(self.manifest_filename, 'wt') as manifest:
+            for read_name, offset, length, seg_names in self.manifest:
+                manifest.write(f'{read_name}\t{offset}\t{length}\t{",".join(seg_names)}\n')
+
+
+def get_max_open_files():
+    """
+    Returns how many files the splitter should keep open at once: half of the soft open file
+    limit, leaving plenty of room for everything else (e.g. subprocess pipes). The open file
+    limit is per process, so when several Minipolish runs share this process (batch mode), that
+    half is split between them.
+    """
+    if resource is None:
+        max_open_files = 256
+    else:
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft_limit == resource.RLIM_INFINITY:
+            max_open_files = 1024
+        else:
+            max_open_files = soft_limit // 2
+    return max(1, max_open_files // _concurrent_runs)
+
+
+def set_concurrent_runs(count):
+    global _concurrent_runs
+    assert count >= 1
+    _concurrent_runs = count
@@ -0,0 +1,81 @@
+"""
+This module contains functions for running many small jobs (e.g. per-segment polishing) at the
+same time, while sharing out a fixed thread budget between them.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import concurrent.futures
+
+from .log import buffered_log, log_buffer, log_to_file, get_log_file
+from .metrics import collect_metrics, get_metrics
+
+
+def allocate_threads(costs, total_threads):
+    """
+    Splits a thread budget between jobs in proportion to their cost. Every job gets at least one
+    thread and no job gets more than the whole budget. Small jobs therefore end up with a single
+    thread each (and many of them run at once), while big jobs get a larger share.
+    """
+    total_cost = sum(costs)
+    if total_cost <= 0:
+        return [1 for _ in costs]
+    return [min(total_threads, max(1, round(total_threads * c / total_cost))) for c in costs]
+
+
+def run_with_thread_budget(jobs, total_threads, costs=None):
+    """
+    Runs jobs in parallel without exceeding the thread budget. Each job is a (threads, function,
+    args) tuple, and the function will be called with the job's thread count as its first
+    argument followed by args. If costs are given, the most costly jobs are started first so they
+    aren't left running alone at the end, otherwise jobs are started in the order given. Each
+    job's log output is printed in one piece when it finishes. Jobs log to the same place as the
+    calling thread and record metrics in its collection.
+
+    Returns the jobs' results in the same order as the jobs.
+    """
+    results = [None] * len(jobs)
+    pending = list(enumerate(jobs))
+    if costs is not None:
+        pending.sort(key=lambda job: costs[job[0]], reverse=True)
+    running = {}
+    free_threads = total_threads
+    log_file, collection = get_log_file(), get_metrics()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=total_threads) as executor:
+        while pending or running:
+            while pending and pending[0][1][0] <= free_threads:
+                i, (threads, function, args) = pending.pop(0)
+                free_threads -= threads
+                future = executor.submit(run_job_with_buffered_log, function, threads, args,
+                                         log_file, collection)
+                running[future] = (i, threads)
+            done, _ = concurrent.futures.wait(running,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                i, threads = running.pop(future)
+                free_threads += threads
+                result, log_output = future.result()
+                log_buffer(log_output)
+                results[i] = result
+    return results
+
+
+def run_job_with_buffered_log(function, threads, args, log_file=None, collection=None):
+    log_output = []
+    with log_to_file(log_file), collect_metrics(collection):
+        try:
+            with buffered_log() as log_output:
+                result = function(threads, *args)
+        except BaseException:  # make sure a failing job's log output (e.g. its error) isn't lost
+            log_buffer(log_output)
+            raise
+    return result, log_output
@@ -0,0 +1,99 @@
+"""
+This module contains functions for choosing where Minipolish's temporary files go. Unless the user
+says otherwise, a RAM-backed filesystem (/dev/shm) is used when it has plenty of room, as the
+intermediate files are written and read back quickly and never need to touch a (possibly slow,
+shared) disk.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+
+from .misc import get_compression_type
+from .windowed_racon import WINDOW_OVERLAP
+
+
+SHM_DIR = '/dev/shm'
+SCRATCH_HEADROOM = 2  # /dev/shm is only used if it (and free memory) has twice the space needed
+GZIP_RATIO = 3  # a rough guess at how much gzipped reads expand
+PAF_RATIO = 0.1  # a generous guess at a round's PAF size, relative to the (uncompressed) reads
+INDEX_RATIO = 10  # a minimap2 index takes roughly this many bytes per base of its target
+
+
+def choose_scratch_dir(tmp_dir, reads, assembly, rounds=2, window_size=None):
+    """
+    Returns the directory in which to make the temporary directory: the user's choice if they gave
+    one, otherwise /dev/shm if it has room, otherwise None (the system's default, which respects
+    the TMPDIR environment variable).
+    """
+    if tmp_dir is not None:
+        os.makedirs(tmp_dir, exist_ok=True)
+        return tmp_dir
+    if os.environ.get('TMPDIR'):
+        return None
+    space_needed = estimate_scratch_space(reads, assembly, rounds, window_size)
+    if has_room(SHM_DIR, space_needed * SCRATCH_HEADROOM):
+        return SHM_DIR
+    return None
+
+
+def estimate_scratch_space(reads, assembly, rounds=2, window_size=None):
+    """
+    The biggest temporary files are copies of the reads (per-segment reads for the initial round,
+    and subsampled reads for full rounds), the alignments and minimap2 indexes made for each
+    round (the initial round plus the full rounds) and copies of the assembly. Since none of
+    these are deleted until the run ends, they are all counted. With windowed polishing, each
+    round also splits the reads (plus the window overlaps) between its jobs, but those files are
+    deleted at the end of the round, so only one round's worth is counted.
+    """
+    read_size, assembly_size = get_uncompressed_size(reads), get_uncompressed_size(assembly)
+    paf_size = read_size * PAF_RATIO * (rounds + 1)
+    index_size = assembly_size * INDEX_RATIO * (rounds + 1)
+    window_read_size = 0 if window_size is None else \
+        read_size * (1 + WINDOW_OVERLAP / window_size)
+    return read_size + assembly_size + int(paf_size) + index_size + int(window_read_size)
+
+
+def get_uncompressed_size(filename):
+    size = os.path.getsize(filename)
+    if get_compression_type(filename) == 'gz':
+        size *= GZIP_RATIO
+    return size
+
+
+def has_room(directory, space_needed):
+    """
+    Files in /dev/shm take up memory, so there must be enough free memory as well as free space.
+    """
+    if not os.path.isdir(directory) or not os.access(directory, os.W_OK):
+        return False
+    try:
+        free_space = shutil.disk_usage(directory).free
+    except OSError:
+        return False
+    return free_space >= space_needed and get_available_memory() >= space_needed
+
+
+def get_available_memory():
+    """
+    Returns the available memory in bytes (from /proc/meminfo on Linux), or 0 if it can't be
+    found.
+    """
+    try:
+        with open('/proc/meminfo', 'rt') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
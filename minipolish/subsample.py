@@ -0,0 +1,84 @@
+"""
+This module contains a class for choosing a subset of the reads which gives each contig up to a
+maximum depth, so polishing rounds after the first don't have to use every read of a very deep
+read set.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+
+from .log import log
+from .metrics import timed
+from .read_index import ReadIndex
+
+
+class ReadSubsampler(object):
+    """
+    Alignments are given one at a time (as minimap2 makes them for a polishing round), and only
+    each read's longest alignment is kept. Each read then counts towards the depth of the contig
+    it aligned best to, and each contig gets its longest-aligned reads until it reaches the
+    maximum depth. Contigs with less depth than that keep all of their reads.
+    """
+    def __init__(self, max_depth):
+        self.max_depth = max_depth
+        self.best_alignments = {}  # read name -> (aligned length, contig name)
+        self.contig_lengths = {}
+
+    def add_alignment(self, paf_line):
+        parts = paf_line.split('\t', 9)
+        if len(parts) < 10:
+            return
+        read_name, contig_name = parts[0], parts[5]
+        aligned_length = int(parts[8]) - int(parts[7])
+        best = self.best_alignments.get(read_name)
+        if best is None or aligned_length > best[0]:
+            self.best_alignments[read_name] = (aligned_length, contig_name)
+        self.contig_lengths[contig_name] = int(parts[6])
+
+    @timed
+    def choose_reads(self):
+        """
+        Returns the names of the chosen reads.
+        """
+        contig_reads = collections.defaultdict(list)
+        for read_name, (aligned_length, contig_name) in self.best_alignments.items():
+            contig_reads[contig_name].append((aligned_length, read_name))
+        chosen = set()
+        for contig_name, reads in contig_reads.items():
+            target_bases = self.max_depth * self.contig_lengths[contig_name]
+            total_bases = 0
+            for aligned_length, read_name in sorted(reads, reverse=True):
+                if total_bases >= target_bases:
+                    break
+                chosen.add(read_name)
+                total_bases += aligned_length
+        return chosen
+
+
+@timed
+def save_read_subset(read_index, read_names, tmp_dir):
+    """
+    Saves the chosen reads (in their original order and format) to a new file in the temp
+    directory, and returns an index of that file.
+    """
+    subset_filename = tmp_dir / ('subsampled_reads' + read_index.get_extension())
+    with open(subset_filename, 'wb') as subset_file:
+        for read_name, record in read_index.iterate_records():
+            if read_name in read_names:
+                subset_file.write(record)
+    subset_index = ReadIndex(subset_filename)
+    log(f'Subsampled reads: {subset_filename} ({subset_index.read_count:,} of '
+        f'{read_index.read_count:,} reads, {subset_index.base_count:,} of '
+        f'{read_index.base_count:,} bp)')
+    log()
+    return subset_index
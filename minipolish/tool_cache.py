@@ -0,0 +1,91 @@
+"""
+This module contains functions for remembering the versions of the tools Minipolish runs
+(minimap2 and Racon), so later runs can skip running the tools just to check them (with
+--skip_tool_check).
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import pathlib
+
+
+TOOL_CACHE_FILENAME = 'tools.json'
+
+
+def get_tool_cache_filename():
+    """
+    The cache lives in the user's cache directory ($XDG_CACHE_HOME, usually ~/.cache).
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or pathlib.Path.home() / '.cache'
+    return pathlib.Path(cache_home) / 'minipolish' / TOOL_CACHE_FILENAME
+
+
+def get_tool_key(tool_path):
+    """
+    A cached version is only used if the tool's binary is the same one that was checked: same
+    path (after following links), modification time and size.
+    """
+    real_path = os.path.realpath(tool_path)
+    stat = os.stat(real_path)
+    return real_path, stat.st_mtime_ns, stat.st_size
+
+
+def load_tool_cache(cache_filename):
+    try:
+        with open(cache_filename, 'rt') as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def get_cached_version(tool_name, tool_path, cache_filename=None):
+    """
+    Returns the tool's cached version, or None if it isn't cached or the binary has changed.
+    """
+    if cache_filename is None:
+        cache_filename = get_tool_cache_filename()
+    try:
+        real_path, mtime, size = get_tool_key(tool_path)
+    except OSError:
+        return None
+    entry = load_tool_cache(cache_filename).get(real_path)
+    if not isinstance(entry, dict):
+        return None
+    if entry.get('tool') != tool_name or entry.get('mtime') != mtime or \
+            entry.get('size') != size:
+        return None
+    return entry.get('version')
+
+
+def save_cached_version(tool_name, tool_path, version, cache_filename=None):
+    """
+    Adds the tool's version to the cache. The cache is just a speed-up, so if it can't be written
+    (e.g. a read-only home directory), it is left alone.
+    """
+    if cache_filename is None:
+        cache_filename = get_tool_cache_filename()
+    cache_filename = pathlib.Path(cache_filename)
+    try:
+        real_path, mtime, size = get_tool_key(tool_path)
+        cache = load_tool_cache(cache_filename)
+        cache[real_path] = {'tool': tool_name, 'mtime': mtime, 'size': size, 'version': version}
+        cache_filename.parent.mkdir(parents=True, exist_ok=True)
+        temp_filename = cache_filename.with_name(f'{cache_filename.name}.{os.getpid()}.tmp')
+        with open(temp_filename, 'wt') as cache_file:
+            json.dump(cache, cache_file, indent=2)
+            cache_file.write('\n')
+        os.replace(temp_filename, cache_filename)
+    except OSError:
+        pass
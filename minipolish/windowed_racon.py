@@ -0,0 +1,264 @@
+"""
+This module contains functions for polishing long contigs in overlapping windows. Each window is
+polished by its own Racon job, so the jobs can run in parallel (even when the assembly is a single
+huge contig) and each Racon only holds one window's reads and alignments in memory. The polished
+windows are then stitched back together in the middle of their overlaps.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import edlib
+import math
+import sys
+
+from .alignment import iterate_minimap2_output
+from .log import log
+from .metrics import timed
+from .racon import fix_sequence_ends, get_unpolished_sequences, run_racon_process
+from .read_splitter import ReadSplitter
+from .scheduler import allocate_threads, run_with_thread_budget
+
+
+WINDOW_OVERLAP = 10000
+MIN_WINDOW_SIZE = 5 * WINDOW_OVERLAP
+MIN_WINDOW_ALIGNMENT = 500  # shorter pieces of alignments (after clipping to a window) are dropped
+STITCH_PROBE_SIZE = 500
+
+
+def run_windowed_racon(name, read_index, unpolished_filename, threads, tmp_dir, minimap2_preset,
+                       window_size, index_cache=None, read_subsampler=None,
+                       overlap=WINDOW_OVERLAP, unpolished_seqs=None, align_to=None,
+                       keep_files=False):
+    """
+    Polishes the sequences in the unpolished FASTA, like run_racon, but contigs longer than the
+    window size are split into overlapping windows which are polished by separate Racon jobs. The
+    remaining (shorter) contigs are polished together in one more job.
+
+    The reads are aligned to the whole contigs in one minimap2 run, and each alignment is then
+    clipped to the windows it overlaps. Returns a dictionary of name -> polished sequence (empty
+    for sequences which couldn't be polished). If a ReadSubsampler is given, it is shown each
+    (unclipped) alignment. As with run_racon, the unpolished sequences can be given if they are
+    already in memory, and align_to can give a larger set of sequences for minimap2.
+
+    Each job's reads, alignments and sequences add up to more than a full copy of the reads, so
+    they are deleted once the round is done, unless keep_files is True (e.g. for --work_dir).
+    """
+    if unpolished_seqs is None:
+        unpolished_seqs = get_unpolished_sequences(unpolished_filename)
+    log(f'Running Racon on {name} (in windows):')
+    log(f'  reads:      {read_index.filename} ({read_index.read_count:,} reads)')
+    log(f'  input:      {unpolished_filename} '
+        f'({sum(len(seq) for seq in unpolished_seqs.values()):,} bp)')
+
+    # Job 0 is for all of the short contigs, and there is one more job for each window.
+    jobs = [[]]
+    contig_windows = {}  # contig name -> list of (job index, window name, window start, end)
+    for contig_name, seq in unpolished_seqs.items():
+        if len(seq) <= window_size:
+            jobs[0].append((contig_name, seq))
+            continue
+        contig_windows[contig_name] = []
+        for i, (start, end) in enumerate(get_windows(len(seq), window_size, overlap)):
+            window_name = f'{contig_name}_window_{i + 1}'
+            contig_windows[contig_name].append((len(jobs), window_name, start, end))
+            jobs.append([(window_name, seq[start:end])])
+    job_names = [f'{name}_job_{i}' for i in range(len(jobs))]
+    log(f'  windows:    {len(contig_windows):,} contigs split into {len(jobs) - 1:,} windows, '
+        f'{len(jobs[0]):,} contigs polished whole')
+
+    allowed_targets = None
+    if align_to is None:
+        align_to = unpolished_filename
+    else:
+        allowed_targets = set(unpolished_seqs)
+        log(f'  align to:   {align_to}')
+    alignment_counts = split_alignments(name, read_index, align_to, threads, tmp_dir,
+                                        minimap2_preset, contig_windows, job_names, index_cache,
+                                        read_subsampler, allowed_targets)
+    if sum(alignment_counts.values()) == 0:
+        sys.exit(f'\nError: minimap2 produced no alignments for {name}.')
+
+    order = [i for i in range(len(jobs)) if jobs[i]]
+    costs = [sum(len(seq) for _, seq in jobs[i]) for i in order]
+    extension = read_index.get_extension()
+    racon_jobs = [(t, polish_job, (job_names[i], jobs[i], alignment_counts[job_names[i]],
+                                   extension, tmp_dir))
+                  for i, t in zip(order, allocate_threads(costs, threads))]
+    job_results = dict(zip(order, run_with_thread_budget(racon_jobs, threads, costs)))
+    if not keep_files:
+        remove_job_files(job_names, extension, tmp_dir)
+
+    fixed_seqs = {}
+    for contig_name, seq in unpolished_seqs.items():
+        if contig_name in contig_windows:
+            windows = contig_windows[contig_name]
+            polished = [job_results[i][window_name] for i, window_name, _, _ in windows]
+            if all(len(p) == 0 for p in polished):
+                fixed_seqs[contig_name] = ''
+                continue
+            # A window without any reads keeps its unpolished sequence, so the contig stays whole.
+            polished = [p if p else seq[start:end]
+                        for p, (_, _, start, end) in zip(polished, windows)]
+            fixed_seqs[contig_name] = stitch_windows(polished,
+                                                     [(s, e) for _, _, s, e in windows])
+        else:
+            fixed_seqs[contig_name] = job_results[0][contig_name]
+    log(f'  output:     {sum(len(seq) for seq in fixed_seqs.values()):,} bp')
+    log()
+    return fixed_seqs
+
+
+def get_windows(length, window_size, overlap):
+    """
+    Returns (start, end) positions for evenly spaced windows, no bigger than the window size, which
+    cover a sequence of the given length and overlap their neighbours by the given amount.
+    """
+    if length <= window_size:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / (window_size - overlap))
+    step = math.ceil((length - overlap) / count)
+    return [(i * step, min(length, (i + 1) * step + overlap)) for i in range(count)]
+
+
+@timed
+def split_alignments(name, read_index, unpolished_filename, threads, tmp_dir, minimap2_preset,
+                     contig_windows, job_names, index_cache=None, read_subsampler=None,
+                     allowed_targets=None):
+    """
+    Aligns the reads to the unpolished contigs and saves each job's alignments (clipped to its
+    window) and reads to their own files. Returns the number of alignments for each job. If
+    allowed_targets is given, alignments to other contigs are dropped.
+    """
+    if index_cache is None:
+        minimap2_target = unpolished_filename
+    else:
+        minimap2_target = index_cache.get_index(unpolished_filename, minimap2_preset, threads)
+    command = ['minimap2', '-t', str(threads), '-x', minimap2_preset, minimap2_target,
+               read_index.filename]
+    minimap2_log = tmp_dir / (name + '_minimap2.log')
+    read_jobs = collections.defaultdict(set)  # read name -> indices of the jobs which use it
+    with ReadSplitter(tmp_dir, '.paf') as paf_splitter:
+        for line in iterate_minimap2_output(command, minimap2_log, name=f'minimap2 ({name})'):
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) < 12:
+                continue
+            if read_subsampler is not None:
+                read_subsampler.add_alignment(line)
+            if allowed_targets is not None and parts[5] not in allowed_targets:
+                continue
+            if parts[5] not in contig_windows:
+                paf_splitter.add_read(job_names[0], line.encode())
+                read_jobs[parts[0]].add(0)
+                continue
+            for job_index, window_name, start, end in contig_windows[parts[5]]:
+                clipped = clip_alignment(parts, window_name, start, end)
+                if clipped is not None:
+                    paf_splitter.add_read(job_names[job_index], clipped.encode())
+                    read_jobs[parts[0]].add(job_index)
+    log(f'  alignments: {sum(paf_splitter.read_counts.values()):,} alignments (after splitting '
+        f'into windows)')
+
+    with ReadSplitter(tmp_dir, '_reads' + read_index.get_extension()) as read_splitter:
+        for read_name, record in read_index.iterate_records():
+            for job_index in read_jobs.get(read_name, ()):
+                read_splitter.add_read(job_names[job_index], record)
+    return paf_splitter.read_counts
+
+
+def clip_alignment(parts, window_name, window_start, window_end):
+    """
+    Clips a PAF alignment (given as a list of columns) to a window of its reference, returning a
+    new PAF line with reference coordinates relative to the window, or None if too little of the
+    alignment is in the window. Without a CIGAR, the matching read positions are interpolated,
+    which is close enough for Racon (it does its own alignment of each read to the window).
+    """
+    ref_start, ref_end = int(parts[7]), int(parts[8])
+    clipped_start, clipped_end = max(ref_start, window_start), min(ref_end, window_end)
+    if clipped_end - clipped_start < MIN_WINDOW_ALIGNMENT:
+        return None
+    read_start, read_end = int(parts[2]), int(parts[3])
+    ref_span, read_span = ref_end - ref_start, read_end - read_start
+    start_offset = round((clipped_start - ref_start) / ref_span * read_span)
+    end_offset = round((clipped_end - ref_start) / ref_span * read_span)
+    if parts[4] == '+':
+        read_start, read_end = read_start + start_offset, read_start + end_offset
+    else:
+        read_start, read_end = read_end - end_offset, read_end - start_offset
+    fraction = (clipped_end - clipped_start) / ref_span
+    return '\t'.join([parts[0], parts[1], str(read_start), str(read_end), parts[4], window_name,
+                      str(window_end - window_start), str(clipped_start - window_start),
+                      str(clipped_end - window_start), str(round(int(parts[9]) * fraction)),
+                      str(round(int(parts[10]) * fraction)), parts[11]]) + '\n'
+
+
+def polish_job(threads, job_name, targets, alignment_count, extension, tmp_dir):
+    """
+    Runs Racon for one job (a window or the group of short contigs) and fixes any ends Racon
+    dropped. Returns a dictionary of target name -> polished sequence.
+    """
+    if alignment_count == 0:
+        return {target_name: '' for target_name, _ in targets}
+    unpolished_filename = tmp_dir / (job_name + '.fasta')
+    with open(unpolished_filename, 'wt') as fasta:
+        for target_name, seq in targets:
+            fasta.write(f'>{target_name}\n{seq}\n')
+    command = ['racon', '-t', str(threads), str(tmp_dir / (job_name + '_reads' + extension)),
+               str(tmp_dir / (job_name + '.paf')), str(unpolished_filename)]
+    polished_seqs, rc = run_racon_process(command, f'racon ({job_name})',
+                                          tmp_dir / (job_name + '_racon.log'))
+    if rc != 0:
+        sys.exit('Error: racon failed')
+    return fix_sequence_ends(dict(targets), polished_seqs, threads)
+
+
+def remove_job_files(job_names, extension, tmp_dir):
+    for job_name in job_names:
+        for suffix in ['_reads' + extension, '.paf', '.fasta']:
+            filename = tmp_dir / (job_name + suffix)
+            if filename.exists():
+                filename.unlink()
+
+
+def stitch_windows(polished_windows, window_positions):
+    """
+    Joins a contig's polished windows back together. The windows' (start, end) positions in the
+    unpolished contig give the size of each overlap.
+    """
+    seq = polished_windows[0]
+    for i in range(1, len(polished_windows)):
+        overlap = window_positions[i - 1][1] - window_positions[i][0]
+        seq = stitch_pair(seq, polished_windows[i], overlap)
+    return seq
+
+
+def stitch_pair(left_seq, right_seq, overlap):
+    """
+    Joins two polished sequences whose unpolished versions overlapped by the given amount. A
+    chunk from the middle of the overlap is taken from the right sequence and aligned to the end
+    of the left sequence, and the join is made at that spot - away from both sequences' ends,
+    where Racon is least reliable. Polishing can change the overlap's length a little, so the
+    alignment is done over a larger stretch of the left sequence.
+    """
+    probe_start = max(0, overlap // 2 - STITCH_PROBE_SIZE // 2)
+    probe = right_seq[probe_start:probe_start + STITCH_PROBE_SIZE]
+    tail_size = min(len(left_seq), 2 * overlap)
+    tail = left_seq[len(left_seq) - tail_size:]
+    expected_pos = tail_size - overlap + probe_start
+    result = edlib.align(probe, tail, mode='HW', task='locations')
+    if len(probe) == 0 or result['editDistance'] == -1 or \
+            result['editDistance'] > len(probe) // 4:
+        join_pos = expected_pos  # no good alignment, so join where the overlap should be
+    else:  # if the chunk aligns equally well in more than one spot, use the closest to expected
+        join_pos = min((start for start, _ in result['locations']),
+                       key=lambda start: abs(start - expected_pos))
+    return left_seq[:len(left_seq) - tail_size + join_pos] + right_seq[probe_start:]
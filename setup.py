@@ -44,7 +44,9 @@ setup(name='Minipolish',
       license='GPLv3',
       packages=['minipolish'],
       install_requires=['edlib'],
-      entry_points={"console_scripts": ['minipolish = minipolish.__main__:main']},
+      extras_require={'isal': ['isal']},
+      entry_points={"console_scripts": ['minipolish = minipolish.__main__:main',
+                                        'minipolish-batch = minipolish.batch:main']},
       include_package_data=True,
       zip_safe=False,
       python_requires='>=3.6')
@@ -14,7 +14,10 @@ details. You should have received a copy of the GNU General Public License along
 If not, see <http://www.gnu.org/licenses/>.
 """
 
+import pathlib
 import pytest
+import sys
+import tempfile
 
 import minipolish.alignment
 
@@ -51,3 +54,42 @@ def test_alignment_2():
     with pytest.raises(SystemExit) as e:
         _ = minipolish.alignment.Alignment('this is not PAF format')
     assert e.type == SystemExit
+
+
+def test_iterate_minimap2_output():
+    paf_line = 'read_name\t1000\t100\t900\t+\tref_name\t10000\t2000\t2800\t700\t850\t255'
+    command = [sys.executable, '-c', f'print("{paf_line}\\n" * 3, end="")']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        lines = list(minipolish.alignment.iterate_minimap2_output(
+            command, tmp_dir / 'minimap2.log', tmp_dir / 'alignments.paf'))
+        assert (tmp_dir / 'alignments.paf').read_text() == (paf_line + '\n') * 3
+    assert lines == [paf_line + '\n'] * 3
+
+
+def test_iterate_minimap2_output_fail():
+    command = [sys.executable, '-c', 'import sys; sys.exit(1)']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with pytest.raises(SystemExit) as e:
+            list(minipolish.alignment.iterate_minimap2_output(
+                command, pathlib.Path(tmp_dir) / 'minimap2.log'))
+    assert 'minimap2 failed' in str(e.value)
+
+
+def test_iterate_paf_batches():
+    paf_lines = ['read_1\t1000\t100\t900\t+\tref_1\t10000\t2000\t2800\t700\t850\t255\n',
+                 'read_2\t1000\t0\t1000\t-\tref_2\t5000\t10\t1010\t900\t1000\t60\n',
+                 'read_3\t2000\t0\t2000\t+\tref_1\t10000\t0\t2000\t1800\t2000\t60\n']
+    batches = list(minipolish.alignment.iterate_paf_batches(paf_lines, ['ref_name', 'ref_end'],
+                                                            batch_size=2))
+    assert len(batches) == 2
+    assert batches[0]['ref_name'] == ['ref_1', 'ref_2']
+    assert list(batches[0]['ref_end']) == [2800, 1010]
+    assert batches[1]['ref_name'] == ['ref_1']
+    assert list(batches[1]['ref_end']) == [2000]
+
+
+def test_iterate_paf_batches_bad_format():
+    with pytest.raises(SystemExit) as e:
+        list(minipolish.alignment.iterate_paf_batches(['this is not PAF format'], ['ref_end']))
+    assert e.type == SystemExit
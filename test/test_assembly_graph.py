@@ -14,6 +14,7 @@ details. You should have received a copy of the GNU General Public License along
 If not, see <http://www.gnu.org/licenses/>.
 """
 
+import gzip
 import pathlib
 import random
 import tempfile
@@ -42,6 +43,37 @@ def test_rotation_2():
     assert seg.sequence == 'CGAATATGGTTCGCATATAAGTGTACCCTG'
 
 
+def test_rotation_3():
+    seg = minipolish.assembly_graph.Segment('S\tutg000001c\tTCCAGCGTTG')
+    seg.rotate(7)
+    seg.rotate(5)
+    assert seg.sequence_bytes == b'TCCAGCGTTG'  # rotating doesn't touch the stored sequence
+    assert seg.rotation == 2
+    assert seg.sequence == 'CAGCGTTGTC'
+    seg.sequence = 'ACGT'
+    assert seg.rotation == 0
+    assert seg.sequence == 'ACGT'
+
+
+def test_sequence_is_only_stored_once():
+    seg = minipolish.assembly_graph.Segment('S\tutg000001c\tTCCAGCGTTG')
+    seg.rotate(2)
+    assert seg.sequence == 'CAGCGTTGTC'
+    seg.sequence = 'ACGTACGT'
+    assert seg.sequence == 'ACGTACGT'
+    assert seg.sequence_bytes == b'ACGTACGT'
+    assert not any(isinstance(v, str) and v == 'ACGTACGT' for v in vars(seg).values())
+
+
+def test_save_rotated_to_fasta():
+    seg = minipolish.assembly_graph.Segment('S\tutg000001c\tTCCAGCGTTG')
+    seg.rotate(3)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_fasta_filename = pathlib.Path(tmp_dir) / 'test.fasta'
+        seg.save_to_fasta(temp_fasta_filename)
+        assert temp_fasta_filename.read_text() == '>utg000001c\nAGCGTTGTCC\n'
+
+
 def test_canonical_link_str():
     link = minipolish.assembly_graph.Link('L\tutg000001c\t+\tutg000001c\t+\t0M')
     assert link.get_canonical_link_str() == 'utg000001c+utg000001c+'
@@ -143,6 +175,41 @@ def test_remove_segment():
     assert len(graph.links) == 2
 
 
+def test_remove_segment_adjacency():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_gfa_filename = str(pathlib.Path(tmp_dir) / 'test.gfa')
+        with open(temp_gfa_filename, 'wt') as temp_gfa:
+            temp_gfa.write('S\tutg000001l\tACGTACGACTACGACTG\n')
+            temp_gfa.write('S\tutg000002c\tACGTACGACTACGACTG\n')
+            temp_gfa.write('S\tutg000003l\tACGTACGACTACGACTG\n')
+            temp_gfa.write('L\tutg000001l\t+\tutg000002c\t+\t0M\n')
+            temp_gfa.write('L\tutg000002c\t+\tutg000003l\t-\t0M\n')
+        graph = minipolish.assembly_graph.load_gfa(temp_gfa_filename)
+    assert len(graph.get_links('utg000001l')) == 2
+    assert len(graph.get_links('utg000002c')) == 6  # 4 to other segments, 2 circularising
+    assert len(graph.get_links('utg000003l')) == 2
+    graph.remove_segment('utg000002c')
+    assert len(graph.links) == 0
+    assert graph.get_links('utg000001l') == []
+    assert graph.get_links('utg000002c') == []
+    assert graph.get_links('utg000003l') == []
+
+
+def test_hairpin_link():
+    """
+    A link from a segment to its own reverse complement is its own reverse link.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_gfa_filename = str(pathlib.Path(tmp_dir) / 'test.gfa')
+        with open(temp_gfa_filename, 'wt') as temp_gfa:
+            temp_gfa.write('S\tutg000001l\tACGTACGACTACGACTG\n')
+            temp_gfa.write('L\tutg000001l\t+\tutg000001l\t-\t0M\n')
+        graph = minipolish.assembly_graph.load_gfa(temp_gfa_filename)
+    assert list(graph.links) == [('utg000001l+', 'utg000001l-')]
+    graph.remove_segment('utg000001l')
+    assert len(graph.links) == 0
+
+
 def test_rotate_circular_sequence():
     random.seed(0)
     with tempfile.TemporaryDirectory() as tmp_dir:
@@ -162,3 +229,76 @@ def test_parse_a_line():
     segment_name, read_name = minipolish.assembly_graph.parse_a_line(a_line)
     assert segment_name == 'utg000001c'
     assert read_name == '1834c7d5-151e-d9af-fe1d-6bd9f68d355e'
+
+
+def test_load_gfa_gzipped():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_gfa_filename = str(pathlib.Path(tmp_dir) / 'test.gfa.gz')
+        with gzip.open(temp_gfa_filename, 'wt') as temp_gfa:
+            temp_gfa.write('S\tutg000001l\tACGTACGACTACGACTG\n')
+            temp_gfa.write('S\tutg000002l\tACGTACGACTACGACTG\n')
+            temp_gfa.write('L\tutg000001l\t+\tutg000002l\t+\t0M\n')
+        graph = minipolish.assembly_graph.load_gfa(temp_gfa_filename)
+    assert len(graph.segments) == 2
+    assert len(graph.links) == 2
+
+
+def test_print_to_stdout(capsysbinary):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_gfa_filename = str(pathlib.Path(tmp_dir) / 'test.gfa')
+        with open(temp_gfa_filename, 'wt') as temp_gfa:
+            temp_gfa.write('S\tutg000001c\tACGTACGACT\n')
+            temp_gfa.write('S\tutg000002l\tGGGCC\n')
+        graph = minipolish.assembly_graph.load_gfa(temp_gfa_filename)
+    graph.segments['utg000001c'].rotate(4)
+    graph.segments['utg000002l'].depth = 12.3456
+    graph.print_to_stdout()
+    assert capsysbinary.readouterr().out == (b'S\tutg000001c\tACGACTACGT\tdp:f:0.000\n'
+                                             b'S\tutg000002l\tGGGCC\tdp:f:12.346\n'
+                                             b'L\tutg000001c\t+\tutg000001c\t+\t0M\n'
+                                             b'L\tutg000001c\t-\tutg000001c\t-\t0M\n')
+
+
+def test_save_to_gfa():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_gfa_filename = pathlib.Path(tmp_dir) / 'test.gfa'
+        with open(temp_gfa_filename, 'wt') as temp_gfa:
+            temp_gfa.write('S\tutg000002l\tGGGCC\n')
+            temp_gfa.write('S\tutg000001l\tACGTACGACT\n')
+            temp_gfa.write('L\tutg000001l\t+\tutg000002l\t+\t0M\n')
+        graph = minipolish.assembly_graph.load_gfa(temp_gfa_filename)
+        expected = ('S\tutg000001l\tACGTACGACT\tdp:f:0.000\n'
+                    'S\tutg000002l\tGGGCC\tdp:f:0.000\n'
+                    'L\tutg000001l\t+\tutg000002l\t+\t0M\n'
+                    'L\tutg000002l\t-\tutg000001l\t-\t0M\n')
+        out_filename = pathlib.Path(tmp_dir) / 'out.gfa'
+        graph.save_to_gfa(out_filename)
+        assert out_filename.read_text() == expected
+        out_filename = pathlib.Path(tmp_dir) / 'out.gfa.gz'
+        graph.save_to_gfa(out_filename, threads=2)
+        with gzip.open(out_filename, 'rt') as gfa:
+            assert gfa.read() == expected
+
+
+def test_load_gfa_lazy():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_gfa_filename = str(pathlib.Path(tmp_dir) / 'test.gfa')
+        with open(temp_gfa_filename, 'wt') as temp_gfa:
+            temp_gfa.write('H\tVN:Z:1.0\n')
+            temp_gfa.write('S\tutg000001l\tACGTACGACT\tLN:i:10\trc:i:2\n')
+            temp_gfa.write('a\tutg000001l\t0\tread_1:1-100\t+\t10\n')
+            temp_gfa.write('a\tutg000001l\t5\tread_2:1-100\t-\t5\n')
+            temp_gfa.write('S\tutg000002c\tGGGCC\n')
+            temp_gfa.write('L\tutg000001l\t+\tutg000002c\t-\t0M\tSD:i:0\n')
+        graph = minipolish.assembly_graph.load_gfa(temp_gfa_filename, lazy_sequences=True)
+        seg_1, seg_2 = graph.segments['utg000001l'], graph.segments['utg000002c']
+        assert seg_1.sequence_location is not None
+        assert seg_1.get_length() == 10
+        assert seg_2.get_length() == 5
+        assert seg_1.read_names == ['read_1', 'read_2']
+        assert seg_1.sequence == 'ACGTACGACT'
+        assert seg_1.sequence_location is None
+        seg_2.rotate(2)
+        assert seg_2.sequence == 'GCCGG'
+    assert graph.links[('utg000001l+', 'utg000002c-')].cigar == '0M'
+    assert ('utg000002c+', 'utg000001l-') in graph.links
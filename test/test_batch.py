@@ -0,0 +1,136 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import json
+import pathlib
+import tempfile
+
+import minipolish.batch
+import minipolish.log
+import minipolish.metrics
+import minipolish.scheduler
+import pytest
+
+
+def test_get_sample_name():
+    assert minipolish.batch.get_sample_name('out/sample_1.gfa') == 'sample_1'
+    assert minipolish.batch.get_sample_name('sample_2.gfa.gz') == 'sample_2'
+    assert minipolish.batch.get_sample_name('sample_3') == 'sample_3'
+
+
+def test_load_manifest():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        (tmp_dir / 'reads.fastq').write_text('@read_1\nACGT\n+\nIIII\n')
+        (tmp_dir / 'assembly.gfa').write_text('S\tutg000001l\tACGT\n')
+        manifest = tmp_dir / 'manifest.tsv'
+        manifest.write_text(f'# reads\tassembly\toutput\n'
+                            f'{tmp_dir}/reads.fastq\t{tmp_dir}/assembly.gfa\t{tmp_dir}/a.gfa\n'
+                            f'\n'
+                            f'{tmp_dir}/reads.fastq\t{tmp_dir}/assembly.gfa\t{tmp_dir}/b.gfa.gz\n')
+        samples = minipolish.batch.load_manifest(manifest, tmp_dir / 'logs')
+        assert (tmp_dir / 'logs').is_dir()
+    assert [s.name for s in samples] == ['a', 'b']
+    assert samples[1].output == f'{tmp_dir}/b.gfa.gz'
+    assert samples[1].log_filename == tmp_dir / 'logs' / 'b.log'
+    assert samples[1].metrics_filename == tmp_dir / 'logs' / 'b.metrics.json'
+
+
+def test_load_manifest_errors():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        (tmp_dir / 'reads.fastq').write_text('@read_1\nACGT\n+\nIIII\n')
+        (tmp_dir / 'assembly.gfa').write_text('S\tutg000001l\tACGT\n')
+        manifest = tmp_dir / 'manifest.tsv'
+
+        manifest.write_text(f'{tmp_dir}/reads.fastq\t{tmp_dir}/assembly.gfa\n')
+        with pytest.raises(SystemExit) as e:
+            minipolish.batch.load_manifest(manifest)
+        assert 'line 1' in str(e.value)
+
+        manifest.write_text(f'{tmp_dir}/reads.fastq\t{tmp_dir}/missing.gfa\t{tmp_dir}/a.gfa\n')
+        with pytest.raises(SystemExit) as e:
+            minipolish.batch.load_manifest(manifest)
+        assert 'not found' in str(e.value)
+
+        manifest.write_text(f'{tmp_dir}/reads.fastq\t{tmp_dir}/assembly.gfa\t{tmp_dir}/a.gfa\n'
+                            f'{tmp_dir}/reads.fastq\t{tmp_dir}/assembly.gfa\t{tmp_dir}/a.gfa\n')
+        with pytest.raises(SystemExit) as e:
+            minipolish.batch.load_manifest(manifest)
+        assert 'must be unique' in str(e.value)
+
+        manifest.write_text('# nothing here\n')
+        with pytest.raises(SystemExit) as e:
+            minipolish.batch.load_manifest(manifest)
+        assert 'no assemblies' in str(e.value)
+
+
+def test_polish_sample_failure(capsys):
+    # The broken GFA stops this sample's run, which is recorded in its log instead of ending the
+    # whole batch.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        (tmp_dir / 'reads.fastq').write_text('@read_1\nACGT\n+\nIIII\n')
+        (tmp_dir / 'assembly.gfa').write_text('S\tutg000001l\n')
+        sample = minipolish.batch.BatchSample(str(tmp_dir / 'reads.fastq'),
+                                              str(tmp_dir / 'assembly.gfa'),
+                                              str(tmp_dir / 'polished.gfa'))
+        settings = minipolish.batch.get_arguments([str(tmp_dir / 'reads.fastq'), '-t', '1'])
+        success, _ = minipolish.batch.polish_sample(1, sample, settings)
+        log_text = sample.log_filename.read_text()
+        report = json.loads(sample.metrics_filename.read_text())
+    assert not success
+    assert 'ValueError' in log_text
+    assert [s['name'] for s in report['stages']] == ['load_graph']
+    assert 'polished: ' in capsys.readouterr().err
+
+
+def test_polish_sample_missing_output_dir(capsys):
+    # The sample's log can't be made, which should fail the sample, not the whole batch.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        (tmp_dir / 'reads.fastq').write_text('@read_1\nACGT\n+\nIIII\n')
+        (tmp_dir / 'assembly.gfa').write_text('S\tutg000001l\tACGT\n')
+        sample = minipolish.batch.BatchSample(str(tmp_dir / 'reads.fastq'),
+                                              str(tmp_dir / 'assembly.gfa'),
+                                              str(tmp_dir / 'missing' / 'polished.gfa'))
+        settings = minipolish.batch.get_arguments([str(tmp_dir / 'reads.fastq'), '-t', '1'])
+        success, _ = minipolish.batch.polish_sample(1, sample, settings)
+    assert not success
+    assert 'No such file or directory' in capsys.readouterr().err
+
+
+def test_log_and_metrics_follow_jobs():
+    # Jobs run by the scheduler should log to the same file and record metrics in the same
+    # collection as the thread which started them.
+    @minipolish.metrics.timed
+    def job(threads, value):
+        minipolish.log.log(f'job {value}')
+        return value
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_filename = pathlib.Path(tmp_dir) / 'test.log'
+        collection = minipolish.metrics.Metrics()
+        with open(log_filename, 'wt') as log_file:
+            with minipolish.log.log_to_file(log_file), \
+                    minipolish.metrics.collect_metrics(collection):
+                results = minipolish.scheduler.run_with_thread_budget(
+                    [(1, job, (1,)), (1, job, (2,))], 2)
+        log_lines = log_filename.read_text().splitlines()
+    assert results == [1, 2]
+    assert sorted(log_lines) == ['job 1', 'job 2']
+    assert minipolish.metrics.get_report(collection)['functions'][0]['calls'] == 2
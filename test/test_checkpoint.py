@@ -0,0 +1,80 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pathlib
+import tempfile
+
+import minipolish.assembly_graph
+import minipolish.checkpoint
+import minipolish.read_index
+import pytest
+
+
+def make_test_files(tmp_dir):
+    gfa_filename = tmp_dir / 'assembly.gfa'
+    reads_filename = tmp_dir / 'reads.fastq'
+    gfa_filename.write_text('S\tutg000001c\tACGTACGTACGTACGT\n')
+    reads_filename.write_text('@read_1\nACGT\n+\nIIII\n@read_2\nTGCA\n+\nIIII\n')
+    return gfa_filename, reads_filename
+
+
+def test_checkpoint_save_and_load():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        gfa_filename, reads_filename = make_test_files(tmp_dir)
+        graph = minipolish.assembly_graph.load_gfa(gfa_filename)
+        read_index = minipolish.read_index.ReadIndex(reads_filename)
+        fingerprint = {'reads': minipolish.checkpoint.get_file_fingerprint(reads_filename)}
+
+        checkpoint = minipolish.checkpoint.Checkpoint(tmp_dir, fingerprint)
+        checkpoint.rng.random()
+        checkpoint.converged.add('utg000001c')
+        graph.segments['utg000001c'].sequence = 'GGGGCCCC'
+        checkpoint.save('initial', graph, read_index)
+        checkpoint.save('round_1', graph, read_index)
+        expected_random_value = checkpoint.rng.random()
+
+        loaded = minipolish.checkpoint.Checkpoint(tmp_dir, fingerprint)
+        loaded.load()
+    assert loaded.completed_stages == ['initial', 'round_1']
+    assert loaded.is_done('round_1')
+    assert not loaded.is_done('round_2')
+    assert loaded.graph.segments['utg000001c'].sequence == 'GGGGCCCC'
+    assert loaded.read_index.names == ['read_1', 'read_2']
+    assert loaded.rng.random() == expected_random_value
+    assert loaded.converged == {'utg000001c'}
+
+
+def test_checkpoint_changed_inputs():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        gfa_filename, reads_filename = make_test_files(tmp_dir)
+        graph = minipolish.assembly_graph.load_gfa(gfa_filename)
+        read_index = minipolish.read_index.ReadIndex(reads_filename)
+        fingerprint = {'reads': minipolish.checkpoint.get_file_fingerprint(reads_filename)}
+        minipolish.checkpoint.Checkpoint(tmp_dir, fingerprint).save('initial', graph, read_index)
+
+        reads_filename.write_text('@read_1\nACGT\n+\nIIII\n')
+        fingerprint = {'reads': minipolish.checkpoint.get_file_fingerprint(reads_filename)}
+        with pytest.raises(SystemExit) as e:
+            minipolish.checkpoint.Checkpoint(tmp_dir, fingerprint).load()
+    assert 'have changed' in str(e.value)
+
+
+def test_checkpoint_disabled():
+    checkpoint = minipolish.checkpoint.Checkpoint(None, {})
+    checkpoint.save('initial', None, None)
+    assert not checkpoint.is_done('initial')
@@ -0,0 +1,95 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+
+import pathlib
+import random
+import tempfile
+
+import minipolish.coverage
+
+
+def per_base_depths(length, alignments):
+    depths = [0] * length
+    for start, end in alignments:
+        for i in range(start, min(end, length)):
+            depths[i] += 1
+    return depths
+
+
+def test_per_base_depth():
+    alignments = [(0, 10), (5, 6), (3, 8), (9, 10), (0, 1)]
+    counter = minipolish.coverage.CoverageCounter({'a': 10}, bin_size=1)
+    for start, end in alignments:
+        counter.add_alignment('a', start, end)
+    depths = [depth for _, _, depth in counter.iterate_bins('a')]
+    assert depths == per_base_depths(10, alignments)
+    assert counter.get_mean_depth('a') == 1.8
+
+
+def test_binned_depth_matches_per_base():
+    rng = random.Random(0)
+    length = 1003
+    alignments = [sorted(rng.sample(range(length + 1), 2)) for _ in range(200)]
+    expected = per_base_depths(length, alignments)
+    for bin_size in [1, 7, 100, 1003, 5000]:
+        counter = minipolish.coverage.CoverageCounter({'a': length}, bin_size)
+        for start, end in alignments:
+            counter.add_alignment('a', start, end)
+        for start, end, depth in counter.iterate_bins('a'):
+            assert abs(depth - sum(expected[start:end]) / (end - start)) < 1e-9
+        assert abs(counter.get_mean_depth('a') - sum(expected) / length) < 1e-9
+
+
+def test_histogram():
+    counter = minipolish.coverage.CoverageCounter({'a': 250, 'b': 100}, bin_size=100)
+    counter.add_alignment('a', 0, 200)
+    counter.add_alignment('a', 0, 150)
+    counter.add_alignment('b', 0, 100)
+    assert counter.get_histogram() == [(0, 50), (1, 200), (2, 100)]
+
+
+def test_low_coverage_regions():
+    counter = minipolish.coverage.CoverageCounter({'a': 1000, 'b': 500}, bin_size=100)
+    for _ in range(10):
+        counter.add_alignment('a', 0, 1000)
+        counter.add_alignment('b', 0, 500)
+    counter.add_alignment('a', 0, 300)
+    counter.add_alignment('a', 700, 1000)
+    for _ in range(9):
+        counter.add_alignment('a', 0, 300)
+        counter.add_alignment('a', 600, 1000)
+    regions = counter.get_low_coverage_regions(0.75)
+    assert [r[:3] for r in regions] == [('a', 300, 600)]
+    assert regions[0][3] == 10.0
+
+
+def test_save():
+    counter = minipolish.coverage.CoverageCounter({'a': 250}, bin_size=100)
+    counter.add_alignment('a', 0, 200)
+    counter.add_alignment('a', 0, 100)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        prefix = pathlib.Path(tmp_dir) / 'test'
+        regions = counter.save(prefix, 0.5)
+        bins = (pathlib.Path(tmp_dir) / 'test_bins.tsv').read_text()
+        histogram = (pathlib.Path(tmp_dir) / 'test_histogram.tsv').read_text()
+        low_coverage = (pathlib.Path(tmp_dir) / 'test_low_coverage.tsv').read_text()
+    assert bins == 'contig\tstart\tend\tdepth\n' \
+                   'a\t0\t100\t2.000\na\t100\t200\t1.000\na\t200\t250\t0.000\n'
+    assert histogram == 'depth\tbases\n0\t50\n1\t100\n2\t100\n'
+    assert low_coverage == 'contig\tstart\tend\tdepth\na\t200\t250\t0.000\n'
+    assert regions == [('a', 200, 250, 0.0)]
@@ -0,0 +1,90 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gzip
+import pathlib
+import shutil
+import tempfile
+
+import minipolish.decompress
+import pytest
+
+
+def make_gzipped_file(tmp_dir, line_count=1000):
+    filename = pathlib.Path(tmp_dir) / 'test.txt.gz'
+    with gzip.open(filename, 'wt') as f:
+        for i in range(line_count):
+            f.write(f'line_{i}\n')
+    return filename
+
+
+def test_gzip_backend():
+    assert minipolish.decompress.get_gzip_backend() in ['isal', 'igzip', 'pigz', 'gzip']
+
+
+def test_open_gzip_text_and_binary():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = make_gzipped_file(tmp_dir)
+        with minipolish.decompress.open_gzip(filename) as f:
+            lines = list(f)
+        with minipolish.decompress.open_gzip(filename, 'rb') as f:
+            data = f.read()
+    assert lines[0] == 'line_0\n'
+    assert len(lines) == 1000
+    assert data.startswith(b'line_0\nline_1\n')
+
+
+@pytest.mark.skipif(shutil.which('gzip') is None, reason='requires gzip executable')
+def test_external_decompressor():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = make_gzipped_file(tmp_dir)
+        with minipolish.decompress.ExternalDecompressor(['gzip', '-dc'], filename) as f:
+            lines = list(f)
+        with minipolish.decompress.ExternalDecompressor(['gzip', '-dc'], filename, 'rb') as f:
+            assert f.readline() == b'line_0\n'  # stopping early shouldn't be an error
+    assert len(lines) == 1000
+    assert lines[-1] == 'line_999\n'
+
+
+@pytest.mark.skipif(shutil.which('gzip') is None, reason='requires gzip executable')
+def test_external_decompressor_bad_file():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = pathlib.Path(tmp_dir) / 'test.txt.gz'
+        filename.write_bytes(b'\x1f\x8b\x08 this is not really gzipped')
+        with pytest.raises(SystemExit) as e:
+            with minipolish.decompress.ExternalDecompressor(['gzip', '-dc'], filename) as f:
+                list(f)
+    assert 'failed to decompress' in str(e.value)
+
+
+@pytest.mark.skipif(shutil.which('gzip') is None, reason='requires gzip executable')
+def test_external_compressor():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = pathlib.Path(tmp_dir) / 'test.txt.gz'
+        with minipolish.decompress.ExternalCompressor(['gzip', '-c'], filename) as f:
+            f.write(b'line_0\n')
+            f.writelines([b'line_1\n', memoryview(b'line_2\n')])
+        with gzip.open(filename, 'rb') as f:
+            assert f.read() == b'line_0\nline_1\nline_2\n'
+
+
+def test_open_gzip_for_writing():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = pathlib.Path(tmp_dir) / 'test.txt.gz'
+        with minipolish.decompress.open_gzip_for_writing(filename, threads=2) as f:
+            f.write(b'line_0\n')
+        with gzip.open(filename, 'rb') as f:
+            assert f.read() == b'line_0\n'
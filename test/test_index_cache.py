@@ -0,0 +1,51 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pathlib
+import tempfile
+
+import minipolish.index_cache
+
+
+def fake_minimap2_index(command, *args, **kwargs):
+    index_filename = command[command.index('-d') + 1]
+    pathlib.Path(index_filename).write_text('index')
+    fake_minimap2_index.count += 1
+    return 0
+
+
+def test_index_cache(monkeypatch):
+    fake_minimap2_index.count = 0
+    monkeypatch.setattr(minipolish.index_cache, 'run_process', fake_minimap2_index)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        cache = minipolish.index_cache.IndexCache(tmp_dir / 'indexes')
+        fasta_1, fasta_2 = tmp_dir / '1.fasta', tmp_dir / '2.fasta'
+        fasta_1.write_text('>utg000001l\nACGTACGT\n')
+        fasta_2.write_text('>utg000001l\nACGTACGA\n')
+
+        index_1 = cache.get_index(fasta_1, 'map-ont', 1)
+        assert cache.get_index(fasta_1, 'map-ont', 1) == index_1
+        assert fake_minimap2_index.count == 1
+
+        index_2 = cache.get_index(fasta_2, 'map-ont', 1)
+        index_3 = cache.get_index(fasta_2, 'lr:hq', 1)
+        assert len({index_1, index_2, index_3}) == 3
+        assert fake_minimap2_index.count == 3
+
+        # Only the two most recent indexes are kept.
+        assert not index_1.is_file()
+        assert index_2.is_file() and index_3.is_file()
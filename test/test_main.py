@@ -19,6 +19,7 @@ import tempfile
 
 import minipolish.__main__
 import minipolish.assembly_graph
+import minipolish.read_index
 import pytest
 
 
@@ -30,11 +31,63 @@ def test_initial_polish_skips_when_no_a_lines():
         gfa_filename.write_text('S\tutg000001l\tACGTACGT\n')
         reads_filename.write_text('@read_1\nACGT\n+\nIIII\n@read_2\nTGCA\n+\nIIII\n')
         graph = minipolish.assembly_graph.load_gfa(gfa_filename)
-        minipolish.__main__.initial_polish(graph, reads_filename, 1, tmp_dir, 'map-ont')
+        read_index = minipolish.read_index.ReadIndex(reads_filename)
+        minipolish.__main__.initial_polish(graph, read_index, 1, tmp_dir, 'map-ont')
     assert sorted(graph.segments.keys()) == ['utg000001l']
     assert graph.segments['utg000001l'].sequence == 'ACGTACGT'
 
 
+def test_batched_initial_polish_keeps_segment_with_missing_reads(monkeypatch):
+    def fake_run_racon(*args, unpolished_seqs=None, **kwargs):
+        # Racon gives nothing back for a segment without any reads.
+        return {name: seq + 'A' if name == 'utg000001l' else ''
+                for name, seq in unpolished_seqs.items()}
+    monkeypatch.setattr(minipolish.__main__, 'run_racon', fake_run_racon)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        gfa_filename = tmp_dir / 'assembly.gfa'
+        reads_filename = tmp_dir / 'reads.fastq'
+        gfa_filename.write_text('S\tutg000001l\tACGTACGT\n'
+                                'a\tutg000001l\t0\tread_1:1-4\t+\t4\n'
+                                'S\tutg000002l\tTTTTGGGG\n'
+                                'a\tutg000002l\t0\tread_3:1-4\t+\t4\n'
+                                'L\tutg000001l\t+\tutg000002l\t+\t0M\n')
+        reads_filename.write_text('@read_1\nACGT\n+\nIIII\n@read_2\nTGCA\n+\nIIII\n')
+        graph = minipolish.assembly_graph.load_gfa(gfa_filename)
+        read_index = minipolish.read_index.ReadIndex(reads_filename)
+        minipolish.__main__.batched_initial_polish(graph, read_index, 1, tmp_dir, 'map-ont')
+    assert sorted(graph.segments.keys()) == ['utg000001l', 'utg000002l']
+    assert graph.segments['utg000001l'].sequence == 'ACGTACGTA'
+    assert graph.segments['utg000002l'].sequence == 'TTTTGGGG'
+    assert ('utg000001l+', 'utg000002l+') in graph.links
+
+
+def test_full_polish_aligns_to_converged_contigs(monkeypatch):
+    calls = []
+
+    def fake_run_racon(name, read_filename, unpolished_filename, *args, unpolished_seqs=None,
+                       align_to=None, **kwargs):
+        calls.append((sorted(unpolished_seqs), align_to))
+        return dict(unpolished_seqs)
+    monkeypatch.setattr(minipolish.__main__, 'run_racon', fake_run_racon)
+    monkeypatch.setattr(minipolish.__main__, 'get_converged_sequences',
+                        lambda before_seqs, *args: {'utg000001l'} & set(before_seqs))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        gfa_filename = tmp_dir / 'assembly.gfa'
+        reads_filename = tmp_dir / 'reads.fastq'
+        gfa_filename.write_text('S\tutg000001l\tACGTACGT\nS\tutg000002l\tTTTTGGGG\n')
+        reads_filename.write_text('@read_1\nACGT\n+\nIIII\n@read_2\nTGCA\n+\nIIII\n')
+        graph = minipolish.assembly_graph.load_gfa(gfa_filename)
+        read_index = minipolish.read_index.ReadIndex(reads_filename)
+        minipolish.__main__.full_polish(graph, read_index, 1, 2, tmp_dir, 'map-ont',
+                                        convergence=0.001)
+        all_contigs = (tmp_dir / 'round_2.fasta').read_text()
+    assert calls == [(['utg000001l', 'utg000002l'], None),
+                     (['utg000002l'], tmp_dir / 'round_2.fasta')]
+    assert all_contigs == '>utg000001l\nACGTACGT\n>utg000002l\nTTTTGGGG\n'
+
+
 def test_pacbio_and_minimap2_preset_are_mutually_exclusive():
     with tempfile.TemporaryDirectory() as tmp_dir:
         tmp_dir = pathlib.Path(tmp_dir)
@@ -0,0 +1,62 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import pathlib
+import sys
+import tempfile
+
+import minipolish.metrics
+
+
+@minipolish.metrics.timed
+def double(x):
+    return x * 2
+
+
+def test_metrics_report():
+    minipolish.metrics.reset()
+    with minipolish.metrics.stage('test_stage'):
+        rc = minipolish.metrics.run_process([sys.executable, '-c', 'import sys; sys.exit(3)'],
+                                            'test_process')
+        assert double(2) == 4
+        assert double(3) == 6
+    assert rc == 3
+    report = minipolish.metrics.get_report()
+    assert [s['name'] for s in report['stages']] == ['test_stage']
+    assert report['stages'][0]['wall_time'] > 0.0
+    assert len(report['processes']) == 1
+    assert report['processes'][0]['name'] == 'test_process'
+    assert report['processes'][0]['stage'] == 'test_stage'
+    assert report['processes'][0]['exit_code'] == 3
+    assert report['functions'][0]['name'] == 'double'
+    assert report['functions'][0]['calls'] == 2
+
+
+def test_save_metrics():
+    minipolish.metrics.reset()
+    with minipolish.metrics.stage('test_stage'):
+        minipolish.metrics.run_process([sys.executable, '-c', ''], 'test_process')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        minipolish.metrics.save_metrics(tmp_dir / 'metrics.json')
+        minipolish.metrics.save_metrics(tmp_dir / 'metrics.tsv')
+        report = json.loads((tmp_dir / 'metrics.json').read_text())
+        tsv_lines = (tmp_dir / 'metrics.tsv').read_text().splitlines()
+    assert report['stages'][0]['name'] == 'test_stage'
+    assert tsv_lines[0].split('\t')[:3] == ['type', 'name', 'stage']
+    assert tsv_lines[1].split('\t')[:3] == ['stage', 'test_stage', 'test_stage']
+    assert tsv_lines[2].split('\t')[:3] == ['process', 'test_process', 'test_stage']
@@ -129,3 +129,75 @@ def test_get_sequence_file_type_3():
     with pytest.raises(SystemExit) as e:
         minipolish.misc.get_sequence_file_type('this_file_does_not_exist')
     assert e.type == SystemExit
+
+
+def test_iterate_sequence_batches_fastq():
+    fastq = '@read_1\nACGT\n+\nIIII\n\n@read_2 extra stuff\nGGCGA\n+\nIIIII\n@read_3\nT\n+\nI'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_filename = str(pathlib.Path(tmp_dir) / 'test.fastq')
+        with open(temp_filename, 'wt') as temp_fastq:
+            temp_fastq.write(fastq)
+        for chunk_size in [3, 10, 1000]:  # small chunks put record boundaries mid-chunk
+            batches = list(minipolish.misc.iterate_sequence_batches(temp_filename, 'FASTQ', True,
+                                                                     chunk_size=chunk_size))
+            records = [r for b in batches
+                       for r in zip(b['name'], b['sequence'], b['quality'], b['start'], b['end'])]
+            assert records == [(b'read_1', b'ACGT', b'IIII', 0, 20),
+                               (b'read_2', b'GGCGA', b'IIIII', 21, 55),
+                               (b'read_3', b'T', b'I', 55, 68)]
+
+
+def test_iterate_sequence_batches_fastq_regular():
+    fastq = ''.join(f'@read_{i} extra stuff\n{"ACGT" * i}\n+\n{"I" * 4 * i}\n' for i in range(1, 6))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_filename = str(pathlib.Path(tmp_dir) / 'test.fastq')
+        with open(temp_filename, 'wt') as temp_fastq:
+            temp_fastq.write(fastq)
+        for chunk_size in [5, 40, 1000]:
+            batches = list(minipolish.misc.iterate_sequence_batches(temp_filename, 'FASTQ', True,
+                                                                     chunk_size=chunk_size))
+            names = [n for b in batches for n in b['name']]
+            assert names == [f'read_{i}'.encode() for i in range(1, 6)]
+            assert [len(s) for b in batches for s in b['sequence']] == [4, 8, 12, 16, 20]
+            starts = [s for b in batches for s in b['start']]
+            ends = [e for b in batches for e in b['end']]
+            assert starts[1:] == ends[:-1]
+            assert ends[-1] == len(fastq)
+            assert fastq[starts[2]:ends[2]].startswith('@read_3')
+
+
+def test_iterate_sequence_batches_fasta():
+    fasta = 'junk\n>read_1\nACG\nAc\n\n>read_2 extra stuff\n>read_3\nGG\nCG'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_filename = str(pathlib.Path(tmp_dir) / 'test.fasta')
+        with open(temp_filename, 'wt') as temp_fasta:
+            temp_fasta.write(fasta)
+        for chunk_size in [2, 7, 1000]:
+            batches = list(minipolish.misc.iterate_sequence_batches(temp_filename, 'FASTA', True,
+                                                                     chunk_size=chunk_size))
+            assert all(b['quality'] is None for b in batches)
+            records = [r for b in batches for r in zip(b['name'], b['sequence'], b['start'],
+                                                       b['end'])]
+            assert records == [(b'read_1', b'ACGAc', 5, 21),
+                               (b'read_2', b'', 21, 41),
+                               (b'read_3', b'GGCG', 41, 54)]
+
+
+def test_iterate_sequence_batches_truncated():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_filename = str(pathlib.Path(tmp_dir) / 'test.fastq')
+        with open(temp_filename, 'wt') as temp_fastq:
+            temp_fastq.write('@read_1\nACGT\n+\nIIII\n@read_2\nGGCG\n')
+        with pytest.raises(SystemExit) as e:
+            list(minipolish.misc.iterate_sequence_batches(temp_filename, 'FASTQ'))
+    assert 'incomplete record' in str(e.value)
+
+
+def test_iterate_fastq():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_filename = str(pathlib.Path(tmp_dir) / 'test.fastq.gz')
+        with gzip.open(temp_filename, 'wt') as temp_fastq:
+            temp_fastq.write('@read_1\nACGT\n+\nIIII\n')
+            temp_fastq.write('@read_2 extra stuff\nggcg\n+\nIIII\n')
+        reads = list(minipolish.misc.iterate_fastq(temp_filename))
+    assert reads == [('read_1', 'ACGT', 'IIII'), ('read_2', 'ggcg', 'IIII')]
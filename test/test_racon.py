@@ -15,10 +15,12 @@ If not, see <http://www.gnu.org/licenses/>.
 """
 
 import pathlib
+import sys
 import tempfile
 
 import minipolish.racon
 import minipolish.misc
+import minipolish.subsample
 import pytest
 
 
@@ -67,7 +69,7 @@ def test_run_racon_one_read_exits_on_no_alignments(monkeypatch):
         unpolished_filename = tmp_dir / 'segment.fasta'
         read_filename.write_text('@read_1\nACGT\n+\nIIII\n')
         unpolished_filename.write_text('>segment\nACGTACGT\n')
-        monkeypatch.setattr(minipolish.racon.subprocess, 'call', lambda *args, **kwargs: 0)
+        monkeypatch.setattr(minipolish.racon, 'run_process', lambda *args, **kwargs: 0)
         with pytest.raises(SystemExit) as e:
             minipolish.racon.run_racon('segment', read_filename, unpolished_filename, 1,
                                        tmp_dir, 'map-ont')
@@ -82,9 +84,156 @@ def test_run_racon_no_alignments_exits(monkeypatch):
         unpolished_filename = tmp_dir / 'segment.fasta'
         read_filename.write_text('@read_1\nACGT\n+\nIIII\n@read_2\nTGCA\n+\nIIII\n')
         unpolished_filename.write_text('>segment\nACGTACGT\n')
-        monkeypatch.setattr(minipolish.racon.subprocess, 'call', lambda *args, **kwargs: 0)
+        monkeypatch.setattr(minipolish.racon, 'run_process', lambda *args, **kwargs: 0)
         with pytest.raises(SystemExit) as e:
             minipolish.racon.run_racon('segment', read_filename, unpolished_filename, 1,
                                        tmp_dir, 'map-ont')
     assert e.type == SystemExit
     assert 'produced no alignments' in str(e.value)
+
+
+def test_run_racon_stream_racon_fails(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        read_filename = tmp_dir / 'reads.fastq'
+        unpolished_filename = tmp_dir / 'segment.fasta'
+        read_filename.write_text('@read_1\nACGT\n+\nIIII\n@read_2\nTGCA\n+\nIIII\n')
+        unpolished_filename.write_text('>segment\nACGTACGT\n')
+        monkeypatch.setattr(minipolish.racon, 'run_minimap2_into_racon',
+                            lambda *args, **kwargs: (0, {}, 1))
+        with pytest.raises(SystemExit) as e:
+            minipolish.racon.run_racon('segment', read_filename, unpolished_filename, 1,
+                                       tmp_dir, 'map-ont', stream_alignments=True)
+    assert 'racon failed' in str(e.value)
+
+
+def test_run_racon_allowed_alignments_secondary_options(monkeypatch):
+    minimap2_commands = []
+
+    def fake_run_minimap2_into_racon(name, minimap2_command, *args):
+        minimap2_commands.append(minimap2_command)
+        return 0, {}, 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        read_filename = tmp_dir / 'reads.fastq'
+        unpolished_filename = tmp_dir / 'segment.fasta'
+        read_filename.write_text('@read_1\nACGT\n+\nIIII\n@read_2\nTGCA\n+\nIIII\n')
+        unpolished_filename.write_text('>segment\nACGTACGT\n')
+        monkeypatch.setattr(minipolish.racon, 'run_minimap2_into_racon',
+                            fake_run_minimap2_into_racon)
+        for allowed_alignments in [None, {'read_1': {'segment'}}]:
+            with pytest.raises(SystemExit):
+                minipolish.racon.run_racon('segment', read_filename, unpolished_filename, 1,
+                                           tmp_dir, 'map-ont', stream_alignments=True,
+                                           allowed_alignments=allowed_alignments)
+    assert '-p' not in minimap2_commands[0]
+    assert minimap2_commands[1][5:9] == ['-N', '50', '-p', '0']
+
+
+def test_filter_alignments():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        in_filename, out_filename = tmp_dir / 'in.paf', tmp_dir / 'out.paf'
+        in_filename.write_text('read_1\t100\t0\t100\t+\tutg000001l\t500\t0\t100\t90\t100\t60\n'
+                               'read_1\t100\t0\t100\t+\tutg000002l\t500\t0\t100\t90\t100\t60\n'
+                               'read_2\t100\t0\t100\t+\tutg000002l\t500\t0\t100\t90\t100\t60\n'
+                               'read_3\t100\t0\t100\t+\tutg000002l\t500\t0\t100\t90\t100\t60\n')
+        allowed = {'read_1': ['utg000001l'], 'read_2': ['utg000001l', 'utg000002l']}
+        count = minipolish.racon.filter_alignments(in_filename, out_filename, allowed)
+        kept = [line.split('\t')[:6:5] for line in out_filename.read_text().splitlines()]
+    assert kept == [['read_1', 'utg000001l'], ['read_2', 'utg000002l']]
+    assert count == 2
+
+
+def test_filter_alignments_allowed_targets():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        in_filename, out_filename = tmp_dir / 'in.paf', tmp_dir / 'out.paf'
+        in_filename.write_text('read_1\t100\t0\t100\t+\tutg000001l\t500\t0\t100\t90\t100\t60\n'
+                               'read_1\t100\t0\t100\t+\tutg000002l\t500\t0\t100\t90\t100\t60\n'
+                               'read_2\t100\t0\t100\t+\tutg000003l\t500\t0\t100\t90\t100\t60\n')
+        minipolish.racon.filter_alignments(in_filename, out_filename, None,
+                                           {'utg000001l', 'utg000003l'})
+        kept = [line.split('\t')[:6:5] for line in out_filename.read_text().splitlines()]
+    assert kept == [['read_1', 'utg000001l'], ['read_2', 'utg000003l']]
+
+
+def test_filter_alignments_subsample_and_count():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        in_filename = tmp_dir / 'in.paf'
+        in_filename.write_text('read_1\t100\t0\t100\t+\tutg000001l\t500\t0\t100\t90\t100\t60\n'
+                               'read_2\t100\t0\t50\t+\tutg000002l\t500\t0\t50\t45\t50\t60\n')
+        subsampler = minipolish.subsample.ReadSubsampler(1.0)
+        count = minipolish.racon.filter_alignments(in_filename, None, None,
+                                                   read_subsampler=subsampler)
+    assert count == 2
+    assert subsampler.best_alignments == {'read_1': (100, 'utg000001l'),
+                                          'read_2': (50, 'utg000002l')}
+
+
+def test_run_minimap2_into_racon():
+    paf_line = 'read_1\t100\t0\t100\t+\tutg000001l\t500\t0\t100\t90\t100\t60'
+    minimap2_command = [sys.executable, '-c', f'print("{paf_line}\\n" * 5, end="")']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        fifo = tmp_dir / 'test.paf'
+        racon_command = [sys.executable, '-c',
+                         f'print(">utg000001l\\n" + str(len(open("{fifo}").readlines())))']
+        alignment_count, polished_seqs, rc = minipolish.racon.run_minimap2_into_racon(
+            'test', minimap2_command, tmp_dir / 'minimap2.log', racon_command,
+            tmp_dir / 'racon.log', fifo, None)
+        assert not fifo.exists()
+    assert alignment_count == 5
+    assert polished_seqs == {'utg000001l': '5'}
+    assert rc == 0
+
+
+def test_run_minimap2_into_racon_racon_fails():
+    minimap2_command = [sys.executable, '-c', 'print("")']
+    racon_command = [sys.executable, '-c', 'import sys; sys.exit(1)']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        _, polished_seqs, rc = minipolish.racon.run_minimap2_into_racon(
+            'test', minimap2_command, tmp_dir / 'minimap2.log', racon_command,
+            tmp_dir / 'racon.log', tmp_dir / 'test.paf', None)
+    assert polished_seqs == {}
+    assert rc == 1
+
+
+def test_run_racon_process():
+    racon_command = [sys.executable, '-c',
+                     'print(">utg000001l LN:i:8 RC:i:5 XC:f:1.000000\\nACGTACGT\\n'
+                     '>utg000002l LN:i:4 RC:i:2 XC:f:1.000000\\nTTTT")']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        polished_seqs, rc = minipolish.racon.run_racon_process(racon_command, 'racon (test)',
+                                                               tmp_dir / 'racon.log')
+    assert polished_seqs == {'utg000001l': 'ACGTACGT', 'utg000002l': 'TTTT'}
+    assert rc == 0
+
+
+def test_fix_sequence_ends():
+    before_seqs = {'test_1': load_seq('test_1_before'), 'missing': 'ACGTACGT',
+                   'test_2': load_seq('test_2_before')}
+    after_seqs = {'test_2': load_seq('test_2_after'), 'test_1': load_seq('test_1_after')}
+    for threads in [1, 2]:
+        fixed_seqs = minipolish.racon.fix_sequence_ends(before_seqs, after_seqs, threads)
+        assert list(fixed_seqs.keys()) == ['test_1', 'missing', 'test_2']
+        assert fixed_seqs['test_1'] == load_seq('test_1_fixed')
+        assert fixed_seqs['missing'] == ''
+        assert fixed_seqs['test_2'] == load_seq('test_2_fixed')
+    assert len(after_seqs) == 2
+
+
+def test_get_converged_sequences():
+    before_seqs = {'same': 'ACGT' * 250, 'few_changes': 'ACGT' * 250,
+                   'many_changes': 'ACGT' * 250, 'removed': 'ACGT' * 250}
+    after_seqs = {'same': 'ACGT' * 250, 'few_changes': 'ACGA' + 'ACGT' * 248 + 'ACG',
+                  'many_changes': 'AGGT' * 250, 'removed': ''}
+    for threads in [1, 2]:
+        converged = minipolish.racon.get_converged_sequences(before_seqs, after_seqs, 0.01,
+                                                             threads)
+        assert converged == {'same', 'few_changes'}
+    assert minipolish.racon.get_converged_sequences(before_seqs, after_seqs, 0.0) == {'same'}
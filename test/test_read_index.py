@@ -0,0 +1,65 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gzip
+import pathlib
+import tempfile
+
+import minipolish.read_index
+
+
+def test_read_index_fastq():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_filename = str(pathlib.Path(tmp_dir) / 'test.fastq')
+        with open(temp_filename, 'wt') as temp_fastq:
+            temp_fastq.write('@read_1\nACGT\n+\nIIII\n')
+            temp_fastq.write('@read_2 extra stuff\nGGCGA\n+\nIIIII\n')
+        read_index = minipolish.read_index.ReadIndex(temp_filename)
+    assert read_index.file_type == 'FASTQ'
+    assert read_index.compression == 'plain'
+    assert read_index.read_count == 2
+    assert read_index.base_count == 9
+    assert read_index.names == ['read_1', 'read_2']
+    assert read_index.get_record_span(0) == (0, 20)
+    assert read_index.get_record_span(1) == (20, 54)
+
+
+def test_read_index_fasta_gzipped():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_filename = str(pathlib.Path(tmp_dir) / 'test.fasta.gz')
+        with gzip.open(temp_filename, 'wt') as temp_fasta:
+            temp_fasta.write('>read_1\nACGAT\nCGACT\n')
+            temp_fasta.write('>read_2 extra stuff\nGGCGC\nTCG\n')
+        read_index = minipolish.read_index.ReadIndex(temp_filename)
+    assert read_index.file_type == 'FASTA'
+    assert read_index.compression == 'gz'
+    assert read_index.read_count == 2
+    assert read_index.base_count == 18
+    assert read_index.names == ['read_1', 'read_2']
+    assert read_index.get_record_span(0) == (0, 20)
+    assert read_index.get_record_span(1) == (20, 50)
+
+
+def test_read_index_iterate_records():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_filename = str(pathlib.Path(tmp_dir) / 'test.fastq.gz')
+        with gzip.open(temp_filename, 'wt') as temp_fastq:
+            temp_fastq.write('@read_1\nACGT\n+\nIIII\n')
+            temp_fastq.write('@read_2 extra stuff\nGGCGA\n+\nIIIII\n')
+        read_index = minipolish.read_index.ReadIndex(temp_filename)
+        records = list(read_index.iterate_records())
+    assert records == [('read_1', b'@read_1\nACGT\n+\nIIII\n'),
+                       ('read_2', b'@read_2 extra stuff\nGGCGA\n+\nIIIII\n')]
@@ -0,0 +1,75 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gzip
+import pathlib
+import tempfile
+
+import minipolish.read_splitter
+
+
+def test_read_splitter_1():
+    """
+    Tests with a pool of only one open file, so files have to be closed and reopened for appending.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        with minipolish.read_splitter.ReadSplitter(tmp_dir, '_reads.fasta',
+                                                   max_open_files=1) as splitter:
+            splitter.add_read('utg000001l', b'>read_1\nACGT\n')
+            splitter.add_read('utg000002l', b'>read_2\nGGCC\n')
+            splitter.flush_all()
+            splitter.add_read('utg000001l', b'>read_3\nTTAA\n')
+        assert (tmp_dir / 'utg000001l_reads.fasta').read_bytes() == \
+            b'>read_1\nACGT\n>read_3\nTTAA\n'
+        assert (tmp_dir / 'utg000002l_reads.fasta').read_bytes() == b'>read_2\nGGCC\n'
+    assert splitter.read_counts == {'utg000001l': 2, 'utg000002l': 1}
+
+
+def test_read_splitter_2():
+    """
+    Tests compressed output.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        with minipolish.read_splitter.ReadSplitter(tmp_dir, '_reads.fastq',
+                                                   compress=True) as splitter:
+            splitter.add_read('utg000001l', b'@read_1\nACGT\n+\nIIII\n')
+            splitter.flush_all()
+            splitter.add_read('utg000001l', b'@read_2\nGGCC\n+\nIIII\n')
+        assert splitter.extension == '_reads.fastq.gz'
+        with gzip.open(tmp_dir / 'utg000001l_reads.fastq.gz', 'rb') as f:
+            assert f.read() == b'@read_1\nACGT\n+\nIIII\n@read_2\nGGCC\n+\nIIII\n'
+
+
+def test_combined_read_writer():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        filename, manifest_filename = tmp_dir / 'reads.fasta', tmp_dir / 'manifest.tsv'
+        with minipolish.read_splitter.CombinedReadWriter(filename, manifest_filename) as writer:
+            writer.add_read('read_1', ['utg000001l'], b'>read_1\nACGT\n')
+            writer.add_read('read_2', ['utg000001l', 'utg000002l'], b'>read_2\nGGCCA\n')
+        assert writer.read_count == 2
+        assert filename.read_bytes() == b'>read_1\nACGT\n>read_2\nGGCCA\n'
+        assert manifest_filename.read_text() == 'read_1\t0\t13\tutg000001l\n' \
+                                                'read_2\t13\t14\tutg000001l,utg000002l\n'
+
+
+def test_get_max_open_files_shared(monkeypatch):
+    monkeypatch.setattr(minipolish.read_splitter, '_concurrent_runs', 1)
+    max_open_files = minipolish.read_splitter.get_max_open_files()
+    minipolish.read_splitter.set_concurrent_runs(4)
+    assert minipolish.read_splitter.get_max_open_files() == max(1, max_open_files // 4)
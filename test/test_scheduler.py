@@ -0,0 +1,70 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+
+import minipolish.scheduler
+import pytest
+
+
+def test_allocate_threads_1():
+    threads = minipolish.scheduler.allocate_threads([900, 50, 50], 16)
+    assert threads == [14, 1, 1]
+
+
+def test_allocate_threads_2():
+    threads = minipolish.scheduler.allocate_threads([0, 0], 8)
+    assert threads == [1, 1]
+
+
+def test_run_with_thread_budget_1():
+    in_use, max_in_use, lock = [0], [0], threading.Lock()
+
+    def job(threads, value):
+        with lock:
+            in_use[0] += threads
+            max_in_use[0] = max(max_in_use[0], in_use[0])
+        with lock:
+            in_use[0] -= threads
+        return value * 2
+
+    jobs = [(3, job, (1,)), (2, job, (2,)), (1, job, (3,)), (1, job, (4,))]
+    results = minipolish.scheduler.run_with_thread_budget(jobs, 4)
+    assert results == [2, 4, 6, 8]
+    assert max_in_use[0] <= 4
+
+
+def test_run_with_thread_budget_costs():
+    started, lock = [], threading.Lock()
+
+    def job(threads, value):
+        with lock:
+            started.append(value)
+        return value
+
+    jobs = [(1, job, (i,)) for i in range(4)]
+    results = minipolish.scheduler.run_with_thread_budget(jobs, 1, costs=[5, 20, 1, 10])
+    assert results == [0, 1, 2, 3]
+    assert started == [1, 3, 0, 2]
+
+
+def test_run_with_thread_budget_2():
+    def job(threads):
+        raise SystemExit('Error: job failed')
+
+    with pytest.raises(SystemExit) as e:
+        minipolish.scheduler.run_with_thread_budget([(1, job, ())], 2)
+    assert 'job failed' in str(e.value)
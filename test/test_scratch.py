@@ -0,0 +1,81 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import gzip
+import pathlib
+import tempfile
+
+import minipolish.scratch
+
+
+def make_inputs(tmp_dir):
+    reads, assembly = tmp_dir / 'reads.fastq.gz', tmp_dir / 'assembly.gfa'
+    with gzip.open(reads, 'wt') as f:
+        f.write('@read_1\nACGT\n+\nIIII\n')
+    assembly.write_text('S\tutg000001l\tACGT\n')
+    return reads, assembly
+
+
+def test_estimate_scratch_space():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        reads, assembly = make_inputs(pathlib.Path(tmp_dir))
+        space = minipolish.scratch.estimate_scratch_space(reads, assembly, rounds=2)
+        read_size = reads.stat().st_size * minipolish.scratch.GZIP_RATIO
+        assembly_size = assembly.stat().st_size
+        assert space == read_size + assembly_size + \
+            int(read_size * minipolish.scratch.PAF_RATIO * 3) + \
+            assembly_size * minipolish.scratch.INDEX_RATIO * 3
+
+
+def test_estimate_scratch_space_windowed():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        reads, assembly = make_inputs(pathlib.Path(tmp_dir))
+        space = minipolish.scratch.estimate_scratch_space(reads, assembly, rounds=2)
+        windowed_space = minipolish.scratch.estimate_scratch_space(reads, assembly, rounds=2,
+                                                                   window_size=50000)
+        assert windowed_space > space
+
+
+def test_choose_scratch_dir_user_choice():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        reads, assembly = make_inputs(tmp_dir)
+        scratch_dir = minipolish.scratch.choose_scratch_dir(tmp_dir / 'scratch', reads, assembly)
+        assert scratch_dir == tmp_dir / 'scratch'
+        assert scratch_dir.is_dir()
+
+
+def test_choose_scratch_dir_auto(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        reads, assembly = make_inputs(tmp_dir)
+        monkeypatch.delenv('TMPDIR', raising=False)
+        monkeypatch.setattr(minipolish.scratch, 'SHM_DIR', str(tmp_dir))
+
+        monkeypatch.setattr(minipolish.scratch, 'get_available_memory', lambda: 10 ** 12)
+        assert minipolish.scratch.choose_scratch_dir(None, reads, assembly) == str(tmp_dir)
+
+        monkeypatch.setattr(minipolish.scratch, 'get_available_memory', lambda: 0)
+        assert minipolish.scratch.choose_scratch_dir(None, reads, assembly) is None
+
+        monkeypatch.setattr(minipolish.scratch, 'get_available_memory', lambda: 10 ** 12)
+        monkeypatch.setenv('TMPDIR', str(tmp_dir))
+        assert minipolish.scratch.choose_scratch_dir(None, reads, assembly) is None
+
+
+def test_has_room():
+    assert not minipolish.scratch.has_room('/this/directory/does/not/exist', 0)
@@ -0,0 +1,58 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import pathlib
+import tempfile
+
+import minipolish.read_index
+import minipolish.subsample
+
+
+def paf_line(read_name, contig_name, contig_length, start, end):
+    return f'{read_name}\t1000\t0\t{end - start}\t+\t{contig_name}\t{contig_length}\t{start}\t' \
+           f'{end}\t{end - start}\t{end - start}\t60\n'
+
+
+def test_choose_reads():
+    subsampler = minipolish.subsample.ReadSubsampler(2.0)
+    # A deep contig (1 kbp, 4x) which should be cut down to its longest reads...
+    subsampler.add_alignment(paf_line('read_1', 'deep', 1000, 0, 1000))
+    subsampler.add_alignment(paf_line('read_2', 'deep', 1000, 0, 900))
+    subsampler.add_alignment(paf_line('read_3', 'deep', 1000, 0, 800))
+    subsampler.add_alignment(paf_line('read_4', 'deep', 1000, 0, 700))
+    subsampler.add_alignment(paf_line('read_5', 'deep', 1000, 0, 600))
+    # ...and a shallow contig (1x) which should keep all of its reads.
+    subsampler.add_alignment(paf_line('read_6', 'shallow', 2000, 0, 1000))
+    subsampler.add_alignment(paf_line('read_7', 'shallow', 2000, 1000, 2000))
+    # read_4 aligns better to the shallow contig, so it counts there.
+    subsampler.add_alignment(paf_line('read_4', 'shallow', 2000, 0, 750))
+    assert subsampler.choose_reads() == {'read_1', 'read_2', 'read_3', 'read_4', 'read_6',
+                                         'read_7'}
+
+
+def test_save_read_subset():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        reads_filename = tmp_dir / 'reads.fastq'
+        reads_filename.write_text('@read_1\nACGT\n+\nIIII\n@read_2\nTGCA\n+\nIIII\n'
+                                  '@read_3\nAACC\n+\nIIII\n')
+        read_index = minipolish.read_index.ReadIndex(reads_filename)
+        subset_index = minipolish.subsample.save_read_subset(read_index, {'read_3', 'read_1'},
+                                                             tmp_dir)
+        assert subset_index.filename.read_text() == '@read_1\nACGT\n+\nIIII\n' \
+                                                    '@read_3\nAACC\n+\nIIII\n'
+    assert subset_index.names == ['read_1', 'read_3']
@@ -0,0 +1,71 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import pathlib
+import tempfile
+
+import minipolish.misc
+import minipolish.tool_cache
+
+
+def test_cached_version():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        tool = tmp_dir / 'racon'
+        tool.write_text('binary')
+        cache = tmp_dir / 'cache' / 'tools.json'
+        assert minipolish.tool_cache.get_cached_version('racon', tool, cache) is None
+        minipolish.tool_cache.save_cached_version('racon', tool, '1.5.0', cache)
+        assert minipolish.tool_cache.get_cached_version('racon', tool, cache) == '1.5.0'
+        assert minipolish.tool_cache.get_cached_version('minimap2', tool, cache) is None
+
+        tool.write_text('new binary')  # a changed binary needs checking again
+        assert minipolish.tool_cache.get_cached_version('racon', tool, cache) is None
+
+
+def test_broken_cache():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        tool = tmp_dir / 'racon'
+        tool.write_text('binary')
+        cache = tmp_dir / 'tools.json'
+        cache.write_text('not JSON')
+        assert minipolish.tool_cache.get_cached_version('racon', tool, cache) is None
+        minipolish.tool_cache.save_cached_version('racon', tool, '1.5.0', cache)
+        assert minipolish.tool_cache.get_cached_version('racon', tool, cache) == '1.5.0'
+
+
+def test_tool_path_and_version(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_dir / 'cache'))
+        runs = tmp_dir / 'runs.txt'
+        tool = tmp_dir / 'racon'
+        tool.write_text(f'#!/bin/sh\necho run >> {runs}\n'
+                        f'if [ "$1" = "--version" ]; then echo v1.5.0; '
+                        f'else echo "usage: racon [options]"; fi\n')
+        tool.chmod(0o755)
+
+        assert minipolish.misc.racon_path_and_version(str(tool)) == (str(tool), '1.5.0', 'good')
+        assert len(runs.read_text().splitlines()) == 2
+        assert minipolish.misc.racon_path_and_version(str(tool), use_cache=True) == \
+            (str(tool), '1.5.0', 'good')
+        assert len(runs.read_text().splitlines()) == 2  # the tool wasn't run again
+        assert (tmp_dir / 'cache' / 'minipolish' / 'tools.json').is_file()
+        assert os.path.realpath(tool) in (tmp_dir / 'cache' / 'minipolish' /
+                                          'tools.json').read_text()
@@ -0,0 +1,92 @@
+"""
+This module contains some tests for Minipolish. To run them, execute `python3 -m pytest` from the
+root Minipolish directory.
+
+Copyright 2019 Ryan Wick (rrwick@gmail.com)
+https://github.com/rrwick/Minipolish
+
+This file is part of Minipolish. Minipolish is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Minipolish is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Minipolish.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import pathlib
+import random
+import tempfile
+
+import minipolish.windowed_racon
+
+
+def random_seq(length, seed=0):
+    rng = random.Random(seed)
+    return ''.join(rng.choice('ACGT') for _ in range(length))
+
+
+def test_get_windows_1():
+    assert minipolish.windowed_racon.get_windows(1000, 2000, 100) == [(0, 1000)]
+
+
+def test_get_windows_2():
+    windows = minipolish.windowed_racon.get_windows(10000, 3000, 1000)
+    assert windows == [(0, 2800), (1800, 4600), (3600, 6400), (5400, 8200), (7200, 10000)]
+
+
+def test_get_windows_3():
+    for length in [3001, 9999, 12345, 100000]:
+        windows = minipolish.windowed_racon.get_windows(length, 3000, 1000)
+        assert windows[0][0] == 0
+        assert windows[-1][1] == length
+        assert all(end - start <= 3000 for start, end in windows)
+        assert all(a[1] - b[0] >= 1000 for a, b in zip(windows, windows[1:]))
+
+
+def test_clip_alignment():
+    parts = 'read_1\t2000\t100\t1100\t+\tutg000001l\t50000\t9500\t10500\t900\t1000\t60'.split('\t')
+    clipped = minipolish.windowed_racon.clip_alignment(parts, 'w2', 9000, 19000)
+    assert clipped.split('\t') == \
+        ['read_1', '2000', '100', '1100', '+', 'w2', '10000', '500', '1500', '900', '1000', '60\n']
+    clipped = minipolish.windowed_racon.clip_alignment(parts, 'w1', 0, 10000)
+    assert clipped.split('\t')[2:9] == ['100', '600', '+', 'w1', '10000', '9500', '10000']
+    assert minipolish.windowed_racon.clip_alignment(parts, 'w1', 0, 9600) is None
+
+
+def test_clip_alignment_reverse_strand():
+    parts = 'read_1\t2000\t100\t1100\t-\tutg000001l\t50000\t9500\t10500\t900\t1000\t60'.split('\t')
+    clipped = minipolish.windowed_racon.clip_alignment(parts, 'w1', 0, 10000)
+    assert clipped.split('\t')[2:4] == ['600', '1100']
+    clipped = minipolish.windowed_racon.clip_alignment(parts, 'w2', 10000, 20000)
+    assert clipped.split('\t')[2:4] == ['100', '600']
+
+
+def test_stitch_windows():
+    seq = random_seq(10000)
+    windows = minipolish.windowed_racon.get_windows(len(seq), 3000, 1000)
+    polished = [seq[start:end] for start, end in windows]
+    assert minipolish.windowed_racon.stitch_windows(polished, windows) == seq
+
+
+def test_stitch_pair():
+    # Polishing added a base to the left window before the overlap and removed one from the right
+    # window after it, so the join has to be found by alignment.
+    seq = random_seq(5000)
+    left, right = seq[:3000], seq[2000:]
+    left = left[:1000] + 'A' + left[1000:]
+    right = right[:2000] + right[2001:]
+    stitched = minipolish.windowed_racon.stitch_pair(left, right, 1000)
+    assert stitched == seq[:1000] + 'A' + seq[1000:4000] + seq[4001:]
+
+
+def test_remove_job_files():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+        for filename in ['round_1_job_0_reads.fastq', 'round_1_job_0.paf', 'round_1_job_0.fasta',
+                         'round_1_job_1.fasta', 'round_1.fasta']:
+            (tmp_dir / filename).write_text('')
+        minipolish.windowed_racon.remove_job_files(['round_1_job_0', 'round_1_job_1'], '.fastq',
+                                                   tmp_dir)
+        assert [f.name for f in tmp_dir.iterdir()] == ['round_1.fasta']